@@ -10,6 +10,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.core.exceptions import ObjectDoesNotExist
 import requests
+from transcriptions import http_client
 import random
 import logging
 import time
@@ -76,7 +77,7 @@ class RequestOTPView(APIView):
         }
 
         try:
-            webhook_response = requests.post(
+            webhook_response = http_client.post(
                 webhook_url,
                 json=webhook_payload,
                 headers={"Content-Type": "application/json"},
@@ -95,7 +96,7 @@ class RequestOTPView(APIView):
 
         # Send OTP via WhatsApp API
         try:
-            response = requests.post(
+            response = http_client.post(
                 "https://backend.bitz-itc.com/api/whatsapp/whatsapp/send/",
                 json={
                     "recipient": whatsapp_number,
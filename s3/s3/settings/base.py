@@ -133,8 +133,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'transcriptions.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
 }
 
+# Largest page a list endpoint returns for ?page_size=
+API_MAX_PAGE_SIZE = 1000
+
 # JWT Settings
 from datetime import timedelta
 
@@ -39,6 +39,7 @@ class TrainingSessionRetrieveUpdateView(generics.RetrieveUpdateAPIView):
 class TrainingProgressListCreateView(generics.ListCreateAPIView):
     serializer_class = TrainingProgressSerializer
     permission_classes = [GPUOnlyPermission]  
+    keyset = ("step", "unique_id")  # Pages in step order
 
     def get_queryset(self):
         session_id = self.kwargs["session_id"]
@@ -72,6 +73,7 @@ class EvaluationMetricListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = EvaluationMetricSerializer
     permission_classes = [GPUOnlyPermission]  # Only GPU posts evaluation results
+    keyset = ("step", "unique_id")  # Pages in step order
 
     def get_queryset(self):
         session_id = self.kwargs["session_id"]
@@ -0,0 +1,71 @@
+import logging
+import audioread
+import librosa
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+
+def _from_soundfile(path):
+    info = sf.info(path)
+    if info.samplerate <= 0 or info.frames <= 0:
+        raise ValueError("header has no length")
+    return {
+        "duration": info.frames / info.samplerate,
+        "sample_rate": info.samplerate,
+        "channels": info.channels,
+        "frames": info.frames,
+    }
+
+
+def _from_audioread(path):
+    with audioread.audio_open(path) as f:
+        if f.samplerate <= 0 or not f.duration:
+            raise ValueError("header has no length")
+        return {
+            "duration": f.duration,
+            "sample_rate": f.samplerate,
+            "channels": f.channels,
+            "frames": int(round(f.duration * f.samplerate)),
+        }
+
+
+def _from_decode(path):
+    y, sr = librosa.load(path, sr=None, mono=False)
+    frames = y.shape[-1]
+    return {
+        "duration": frames / sr,
+        "sample_rate": sr,
+        "channels": 1 if y.ndim == 1 else y.shape[0],
+        "frames": frames,
+    }
+
+
+def probe_audio(path):
+    """
+    Duration (seconds), sample rate, channel count and frame count of an
+    audio file, read from its container header.
+
+    libsndfile's header is tried first, then audioread's; the file is only
+    decoded in full when neither gives a usable length. ``source`` says which
+    one answered.
+    """
+    for source, probe in (
+        ("soundfile", _from_soundfile),
+        ("audioread", _from_audioread),
+    ):
+        try:
+            metadata = probe(path)
+        except Exception as e:
+            logger.debug(f"{source} could not read the header of {path}: {e}")
+            continue
+        metadata["source"] = source
+        return metadata
+
+    metadata = _from_decode(path)
+    metadata["source"] = "decode"
+    return metadata
+
+
+def probe_duration(path):
+    return probe_audio(path)["duration"]
@@ -0,0 +1,199 @@
+import os
+import platform
+import resource
+import time
+import librosa
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+NOISE_BLOCK_SAMPLES = 1 << 20
+
+
+def synthetic_call(seconds, sr=16000, seed=0, noise_floor=0.002):
+    """
+    Deterministic call-centre-like audio: syllable-like tone bursts with
+    log-normal loudness, short gaps within phrases and occasional longer
+    pauses, over a Gaussian noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    audio = np.empty(int(seconds * sr), dtype=np.float32)
+    for start in range(0, len(audio), NOISE_BLOCK_SAMPLES):
+        stop = min(start + NOISE_BLOCK_SAMPLES, len(audio))
+        audio[start:stop] = rng.normal(0, noise_floor, stop - start)
+
+    position = 0
+    while position < len(audio):
+        syllable = int(rng.uniform(0.08, 0.4) * sr)
+        n = min(syllable, len(audio) - position)
+        t = np.arange(n) / sr
+        amplitude = 0.05 * rng.lognormal(0, 1.0)
+        tone = amplitude * np.hanning(n) * np.sin(2 * np.pi * rng.uniform(100, 300) * t)
+        audio[position : position + n] += tone.astype(np.float32)
+        pause = rng.uniform(0.3, 2.0) if rng.random() < 0.15 else rng.uniform(0, 0.05)
+        position += syllable + int(pause * sr)
+    return audio
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _init_benchmark_worker():
+    import django
+
+    django.setup()
+
+
+def run_case(
+    path,
+    output_dir,
+    streaming=False,
+    sr=16000,
+    min_chunk_length_ms=3000,
+    max_chunk_length_ms=7000,
+    frame_length_ms=30,
+    overlap_ms=2000,
+    writer_threads=4,
+):
+    """Time each chunker stage on one file; meant to run in a fresh process."""
+    from transcriptions.utils import (
+        adjust_to_frame_length,
+        analyze_frames,
+        boundaries_from_analysis,
+        iter_audio_blocks,
+        iter_chunk_audio,
+        samples_per_ms,
+        save_chunk,
+        stream_frame_analysis,
+        streamed_length,
+    )
+
+    frame_length_samples = samples_per_ms(sr, frame_length_ms)
+    boundary_args = (
+        samples_per_ms(
+            sr, adjust_to_frame_length(min_chunk_length_ms, frame_length_ms)
+        ),
+        samples_per_ms(
+            sr, adjust_to_frame_length(max_chunk_length_ms, frame_length_ms)
+        ),
+        frame_length_samples,
+        samples_per_ms(sr, overlap_ms),
+    )
+    # Pay one-time import and JIT costs on a short file before timing.
+    warm_up_path = os.path.join(output_dir, "warm_up.wav")
+    sf.write(warm_up_path, synthetic_call(2, sr), sr)
+    warm_up, _ = librosa.load(warm_up_path, sr=sr)
+    analyze_frames(warm_up, frame_length_samples)
+    for block in iter_audio_blocks(warm_up_path, sr):
+        save_chunk(block, sr, (0, len(block)), 0, output_dir, "warm_up", "wav")
+
+    stages = {}
+    started = time.perf_counter()
+    if streaming:
+        # Decoding and feature extraction are interleaved block by block.
+        analysis = stream_frame_analysis(
+            iter_audio_blocks(path, sr), streamed_length(path, sr), frame_length_samples
+        )
+        stages["decode_and_features"] = time.perf_counter() - started
+    else:
+        y, _ = librosa.load(path, sr=sr)
+        stages["decode"] = time.perf_counter() - started
+        started = time.perf_counter()
+        analysis = analyze_frames(y, frame_length_samples)
+        stages["features"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = boundaries_from_analysis(analysis, *boundary_args)
+    stages["boundaries"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if streaming:
+        for i, samples in iter_chunk_audio(iter_audio_blocks(path, sr), chunks):
+            save_chunk(samples, sr, (0, len(samples)), i, output_dir, "bench", "wav")
+    else:
+        with ThreadPoolExecutor(max_workers=writer_threads) as executor:
+            futures = [
+                executor.submit(save_chunk, y, sr, chunk, i, output_dir, "bench", "wav")
+                for i, chunk in enumerate(chunks)
+            ]
+            for future in futures:
+                future.result()
+    stages["write"] = time.perf_counter() - started
+
+    return {
+        "stages": stages,
+        "chunks": len(chunks),
+        "samples": analysis["n_samples"],
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def run_benchmark(
+    durations, workdir, seed=0, noise_floor=0.002, repeat=1, **case_options
+):
+    """
+    Benchmark the chunker on synthetic recordings of each duration (seconds).
+
+    Every run happens in a freshly spawned process so peak RSS is per run,
+    not the high-water mark of the whole benchmark. The fastest of
+    ``repeat`` runs is reported.
+    """
+    sr = case_options.get("sr", 16000)
+    os.makedirs(workdir, exist_ok=True)
+    cases = []
+    for duration in durations:
+        path = os.path.join(workdir, f"synthetic_{duration:g}s_{seed}.wav")
+        if not os.path.exists(path):
+            sf.write(path, synthetic_call(duration, sr, seed, noise_floor), sr)
+        output_dir = os.path.join(workdir, f"chunks_{duration:g}s")
+        os.makedirs(output_dir, exist_ok=True)
+
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=get_context("spawn"),
+                initializer=_init_benchmark_worker,
+            ) as executor:
+                runs.append(
+                    executor.submit(run_case, path, output_dir, **case_options).result()
+                )
+        best = min(runs, key=lambda run: sum(run["stages"].values()))
+
+        total = sum(best["stages"].values())
+        audio_seconds = best["samples"] / sr
+        cases.append(
+            {
+                "duration_s": duration,
+                "audio_seconds": round(audio_seconds, 3),
+                "stages_s": {k: round(v, 4) for k, v in best["stages"].items()},
+                "total_s": round(total, 4),
+                "real_time_factor": round(total / audio_seconds, 6),
+                "stage_real_time_factor": {
+                    k: round(v / audio_seconds, 6) for k, v in best["stages"].items()
+                },
+                "chunks": best["chunks"],
+                "chunks_per_s": round(best["chunks"] / total, 2) if total else None,
+                "peak_rss_mb": best["peak_rss_mb"],
+            }
+        )
+
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+        },
+        "parameters": {
+            "seed": seed,
+            "noise_floor": noise_floor,
+            "repeat": repeat,
+            **case_options,
+        },
+        "cases": cases,
+    }
@@ -0,0 +1,155 @@
+import csv
+from datetime import datetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from transcriptions.models import AudioFile, CaseRecord
+
+CASE_IMPORT_BATCH_SIZE = getattr(settings, "CASE_IMPORT_BATCH_SIZE", 2000)
+
+CASE_RECORD_FIELDS = [
+    "date",
+    "talk_time",
+    "case_id",
+    "narrative",
+    "plan",
+    "main_category",
+    "sub_category",
+    "gbv",
+]
+
+
+def parse_case_row(row):
+    """CaseRecord field values of one exported CSV row."""
+    return {
+        "date": timezone.make_aware(datetime.strptime(row["DATE"], "%d %b %Y %H:%M")),
+        "talk_time": datetime.strptime(row["TALKTIME"], "%H:%M").time(),
+        "case_id": int(row["CASEID"]),
+        "narrative": row["NARRATIVE"],
+        "plan": row["PLAN"],
+        "main_category": row["MAIN CATEGORY"],
+        "sub_category": row["SUB CATEGORY"],
+        "gbv": row["GBV"].strip().lower() == "yes",
+    }
+
+
+def _import_batch(rows, project=None):
+    """
+    Upsert the CaseRecords of one batch of CSV rows in one transaction.
+
+    Returns ``(created, updated, rejects)`` where rejects are ``(row, reason)``.
+    """
+    rejects = []
+    parsed = {}
+    for row in rows:
+        try:
+            # A later row for the same audio_id replaces an earlier one.
+            parsed[row["UNIQUEID"]] = (row, parse_case_row(row))
+        except (KeyError, ValueError) as e:
+            rejects.append((row, f"Invalid row: {e!r}"))
+
+    audio_files = AudioFile.objects.filter(audio_id__in=list(parsed))
+    if project is not None:
+        audio_files = audio_files.filter(project=project)
+    # audio_id -> (AudioFile pk, project pk), without building model instances
+    audio_by_id = {}
+    ambiguous = set()
+    for audio_id, pk, project_id in audio_files.values_list(
+        "audio_id", "unique_id", "project_id"
+    ):
+        if audio_id in audio_by_id:
+            ambiguous.add(audio_id)
+        audio_by_id[audio_id] = (pk, project_id)
+
+    existing = set(
+        CaseRecord.objects.filter(
+            audio_id__in=[pk for pk, _ in audio_by_id.values()]
+        ).values_list("audio_id", flat=True)
+    )
+
+    records = []
+    created = 0
+    for audio_id, (row, values) in parsed.items():
+        if audio_id in ambiguous:
+            rejects.append((row, "Several AudioFiles have this audio_id"))
+            continue
+        if audio_id not in audio_by_id:
+            rejects.append((row, "No AudioFile with this audio_id"))
+            continue
+        audio_pk, project_id = audio_by_id[audio_id]
+        if audio_pk not in existing:
+            created += 1
+        records.append(
+            CaseRecord(project_id=project_id, audio_id_id=audio_pk, **values)
+        )
+
+    # New and existing records go through one INSERT ... ON CONFLICT/ON
+    # DUPLICATE KEY UPDATE on the unique audio_id: bulk_update's CASE WHEN
+    # statements are far slower at this size. Existing rows keep their
+    # unique_id, project and created_at.
+    unique_fields = (
+        ["audio_id"]
+        if connection.features.supports_update_conflicts_with_target
+        else None
+    )
+    with transaction.atomic():
+        CaseRecord.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=CASE_RECORD_FIELDS + ["updated_at"],
+        )
+    return created, len(records) - created, rejects
+
+
+def import_case_records(
+    csv_path,
+    rejects_path,
+    project=None,
+    batch_size=CASE_IMPORT_BATCH_SIZE,
+    on_batch=None,
+):
+    """
+    Stream a case export CSV into CaseRecords, ``batch_size`` rows at a time.
+
+    Each batch costs a constant number of queries (one AudioFile lookup,
+    one CaseRecord lookup and one bulk upsert) and commits on its own. Rows that cannot be imported are written to ``rejects_path``
+    with a REJECT_REASON column. ``on_batch`` gets each batch's counts.
+    Returns the totals.
+    """
+    totals = {"rows": 0, "created": 0, "updated": 0, "rejected": 0}
+    with open(csv_path, newline="", encoding="utf-8") as csvfile, open(
+        rejects_path, "w", newline="", encoding="utf-8"
+    ) as rejects_file:
+        reader = csv.DictReader(csvfile, delimiter=",")
+        rejects_writer = csv.DictWriter(
+            rejects_file,
+            fieldnames=(reader.fieldnames or []) + ["REJECT_REASON"],
+            extrasaction="ignore",
+        )
+        rejects_writer.writeheader()
+
+        def flush(rows):
+            created, updated, rejects = _import_batch(rows, project)
+            for row, reason in rejects:
+                rejects_writer.writerow({**row, "REJECT_REASON": reason})
+            batch = {
+                "rows": len(rows),
+                "created": created,
+                "updated": updated,
+                "rejected": len(rejects),
+            }
+            for key, value in batch.items():
+                totals[key] += value
+            if on_batch:
+                on_batch(batch)
+
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) >= batch_size:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+    return totals
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import time
+import librosa
+import soundfile as sf
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import connections, transaction
+from transcriptions.models import AudioFile, ProcessedAudioFile
+from transcriptions.pcm_cache import PCM_SAMPLE_RATE, load_pcm
+from transcriptions.tracking import open_reviews
+
+CLEAN_BATCH_SIZE = getattr(settings, "CLEAN_BATCH_SIZE", 200)
+CLEAN_TOP_DB = getattr(settings, "CLEAN_TOP_DB", 20)
+CLEAN_LOG_PATH = getattr(
+    settings,
+    "CLEAN_LOG_PATH",
+    os.path.join(settings.MEDIA_ROOT, "logs", "clean_audio_files.jsonl"),
+)
+
+
+def cleaned_file_name(unique_id, input_file):
+    """
+    Stable output name for an AudioFile: cleaning the same file again
+    overwrites its output instead of adding another one. The file keeps the
+    source's stem, which later stages use as ``audio_id``; a folder per
+    AudioFile keeps same-named sources of different projects apart.
+    """
+    digest = hashlib.sha256(str(unique_id).encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    return f"processed/{digest}/{stem}.wav"
+
+
+def clean_audio_file(unique_id, input_file, top_db=CLEAN_TOP_DB, sr=PCM_SAMPLE_RATE):
+    """
+    Trim leading and trailing silence from one file into MEDIA_ROOT/processed.
+
+    Touches no database rows, so it can run in a pool worker. Errors are
+    returned rather than raised.
+    """
+    started = time.monotonic()
+    result = {"unique_id": str(unique_id)}
+    try:
+        y = load_pcm(input_file, sr)
+        y_cleaned, _ = librosa.effects.trim(y, top_db=top_db)
+        name = cleaned_file_name(unique_id, input_file)
+        output_path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # Write then rename so a crash never leaves a truncated output behind.
+        tmp_path = f"{output_path}.{os.getpid()}.tmp.wav"
+        sf.write(tmp_path, y_cleaned, sr)
+        os.replace(tmp_path, output_path)
+        result.update(
+            status="success",
+            processed_file=name,
+            file_size=os.path.getsize(output_path),
+            duration=len(y_cleaned) / sr,
+        )
+    except Exception as e:
+        result.update(status="error", message=str(e) or repr(e))
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def save_cleaned_files(results):
+    """
+    Register one batch of cleaning results: one ProcessedAudioFile per
+    output (unless it is already registered) and ``is_cleaned`` set on the
+    sources, in a single transaction. ``is_processed`` is left to the GPU
+    preprocessing it stands for.
+
+    bulk_create sends no post_save, so the REVIEW tasks the signal would
+    open are opened here. New files are not approved yet, so no diarization
+    is due.
+    """
+    projects = dict(
+        AudioFile.objects.filter(
+            pk__in=[result["unique_id"] for result in results]
+        ).values_list("unique_id", "project_id")
+    )
+    registered = set(
+        ProcessedAudioFile.objects.filter(
+            processed_file__in=[result["processed_file"] for result in results]
+        ).values_list("processed_file", flat=True)
+    )
+    with transaction.atomic():
+        created = ProcessedAudioFile.objects.bulk_create(
+            [
+                ProcessedAudioFile(
+                    project_id=projects[result["unique_id"]],
+                    processed_file=result["processed_file"],
+                    file_size=result["file_size"],
+                    duration=result["duration"],
+                )
+                for result in results
+                if result["processed_file"] not in registered
+                and result["unique_id"] in projects
+            ]
+        )
+        AudioFile.objects.filter(pk__in=list(projects)).update(is_cleaned=True)
+        open_reviews(created)
+
+
+def load_uncommitted_results(log_path):
+    """
+    Successful results in a cleaning log whose batch never committed, e.g.
+    because the run was killed, keyed by AudioFile id.
+    """
+    pending = {}
+    try:
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["event"] == "file" and entry["status"] == "success":
+                    pending[entry["unique_id"]] = entry
+                elif entry["event"] == "commit":
+                    for unique_id in entry["unique_ids"]:
+                        pending.pop(unique_id, None)
+    except FileNotFoundError:
+        pass
+    return {
+        unique_id: entry
+        for unique_id, entry in pending.items()
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, entry["processed_file"]))
+    }
+
+
+def clean_all_audio(
+    workers=None,
+    project=None,
+    limit=None,
+    batch_size=CLEAN_BATCH_SIZE,
+    top_db=CLEAN_TOP_DB,
+    resume=False,
+    log_path=CLEAN_LOG_PATH,
+    on_result=None,
+):
+    """
+    Clean every AudioFile not cleaned yet (optionally one
+    project's, up to ``limit``) across a pool of ``workers`` processes.
+
+    At most ``workers * 2`` files are in flight. Results are committed
+    ``batch_size`` at a time, so a crash loses at most one uncommitted
+    batch. Every result and every commit is appended to the JSON lines log
+    at ``log_path``; with ``resume`` the previous log is kept and outputs it
+    recorded but never committed are registered without being cleaned
+    again, as long as they are within ``project`` and ``limit`` too.
+    Returns the per-file results.
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    queryset = AudioFile.objects.filter(is_cleaned=False).order_by("created_at")
+    if project is not None:
+        queryset = queryset.filter(project=project)
+
+    recovered = load_uncommitted_results(log_path) if resume else {}
+    if recovered:
+        eligible = {
+            str(pk)
+            for pk in queryset.filter(pk__in=list(recovered)).values_list(
+                "unique_id", flat=True
+            )
+        }
+        recovered = {
+            unique_id: entry
+            for unique_id, entry in recovered.items()
+            if unique_id in eligible
+        }
+        if limit:
+            recovered = dict(list(recovered.items())[:limit])
+        queryset = queryset.exclude(pk__in=list(recovered))
+    if limit:
+        queryset = queryset[: max(limit - len(recovered), 0)]
+    pending = [
+        (str(pk), os.path.join(settings.MEDIA_ROOT, name))
+        for pk, name in queryset.values_list("unique_id", "audio_file")
+    ]
+    pending.reverse()
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+    uncommitted = []
+
+    with open(log_path, "a" if resume else "w") as log:
+
+        def write_log(entry):
+            log.write(json.dumps({"time": time.time(), **entry}) + "\n")
+            log.flush()
+
+        def commit():
+            if uncommitted:
+                save_cleaned_files(uncommitted)
+                write_log(
+                    {
+                        "event": "commit",
+                        "unique_ids": [result["unique_id"] for result in uncommitted],
+                    }
+                )
+                uncommitted.clear()
+
+        def record(result, logged=False):
+            results.append(result)
+            if not logged:
+                write_log({"event": "file", **result})
+            if on_result:
+                on_result(result)
+            if result["status"] == "success":
+                uncommitted.append(result)
+                if len(uncommitted) >= batch_size:
+                    commit()
+
+        write_log(
+            {
+                "event": "start",
+                "files": len(pending),
+                "recovered": len(recovered),
+                "workers": workers,
+            }
+        )
+        for result in recovered.values():
+            record(result, logged=True)
+
+        # Forked workers must not share the parent's database sockets.
+        connections.close_all()
+
+        while pending:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = {}
+                broken = False
+                while (pending or in_flight) and not broken:
+                    while pending and len(in_flight) < workers * 2:
+                        unique_id, path = pending.pop()
+                        future = executor.submit(
+                            clean_audio_file, unique_id, path, top_db
+                        )
+                        in_flight[future] = unique_id
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        unique_id = in_flight.pop(future)
+                        try:
+                            record(future.result())
+                        except BrokenProcessPool:
+                            broken = True
+                            record(
+                                {
+                                    "unique_id": unique_id,
+                                    "status": "error",
+                                    "message": "Worker process terminated abruptly",
+                                }
+                            )
+                for unique_id in in_flight.values():
+                    record(
+                        {
+                            "unique_id": unique_id,
+                            "status": "error",
+                            "message": "Worker process terminated abruptly",
+                        }
+                    )
+
+        commit()
+        write_log({"event": "finish", "files": len(results)})
+
+    return results
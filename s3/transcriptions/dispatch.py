@@ -0,0 +1,506 @@
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from transcriptions import http_client
+from transcriptions.models import AudioFile, GpuDispatch, ProcessingTask
+
+logger = logging.getLogger(__name__)
+
+GPU_SERVER_BASE_URL = getattr(settings, "GPU_SERVER_BASE_URL", "")
+# (connect, read) seconds; defaults to the shared client's
+GPU_DISPATCH_TIMEOUT = getattr(
+    settings, "GPU_DISPATCH_TIMEOUT", http_client.HTTP_CLIENT_TIMEOUT
+)
+GPU_DISPATCH_WORKERS = getattr(settings, "GPU_DISPATCH_WORKERS", 8)
+GPU_DISPATCH_BATCH_SIZE = getattr(settings, "GPU_DISPATCH_BATCH_SIZE", 200)
+GPU_DISPATCH_MAX_ATTEMPTS = getattr(settings, "GPU_DISPATCH_MAX_ATTEMPTS", 8)
+GPU_DISPATCH_BACKOFF_BASE = getattr(settings, "GPU_DISPATCH_BACKOFF_BASE", 5)
+GPU_DISPATCH_BACKOFF_MAX = getattr(settings, "GPU_DISPATCH_BACKOFF_MAX", 3600)
+GPU_DISPATCH_LEASE = getattr(settings, "GPU_DISPATCH_LEASE", 300)
+# With GPU_PREPROCESS_BATCHING, preprocess requests of a project are sent
+# together to /audio/preprocess/batch/, up to GPU_PREPROCESS_BATCH_SIZE paths
+# per request, after waiting GPU_PREPROCESS_BATCH_WINDOW seconds for more to
+# arrive. Only enable it for a GPU server that serves that endpoint (so far
+# only gpu_stub does): a 404 is not retried, so every preprocess job would be
+# dead-lettered.
+GPU_PREPROCESS_BATCHING = getattr(settings, "GPU_PREPROCESS_BATCHING", False)
+GPU_PREPROCESS_BATCH_SIZE = getattr(settings, "GPU_PREPROCESS_BATCH_SIZE", 100)
+GPU_PREPROCESS_BATCH_WINDOW = getattr(settings, "GPU_PREPROCESS_BATCH_WINDOW", 2.0)
+# A stage is only given more work while fewer than GPU_STAGE_CONCURRENCY
+# files of it are in flight: being sent, or accepted by the GPU server and
+# neither reported complete nor older than GPU_STAGE_HOLD_SECONDS.
+GPU_STAGE_CONCURRENCY = getattr(
+    settings, "GPU_STAGE_CONCURRENCY", {"preprocess": 200, "diarize": 8, "chunk": 8}
+)
+GPU_STAGE_HOLD_SECONDS = getattr(
+    settings, "GPU_STAGE_HOLD_SECONDS", {"preprocess": 120, "diarize": 600, "chunk": 300}
+)
+# Pause after a 429/503 without a Retry-After header
+GPU_THROTTLE_SECONDS = getattr(settings, "GPU_THROTTLE_SECONDS", 30)
+
+STAGES = ("preprocess", "diarize", "chunk")
+
+# GpuDispatch.priority; lower is sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 50
+PRIORITY_BACKFILL = 100
+
+STAGE_URLS = {
+    "preprocess": f"{GPU_SERVER_BASE_URL}/audio/preprocess/",
+    "preprocess_batch": f"{GPU_SERVER_BASE_URL}/audio/preprocess/batch/",
+    "diarize": f"{GPU_SERVER_BASE_URL}/audio/diarize/",
+    "chunk": f"{GPU_SERVER_BASE_URL}/audio/chunk/",
+}
+
+# The preprocessing service answers 202 once it has queued the job.
+ACCEPTED_STATUSES = {
+    "preprocess": {202},
+    "preprocess_batch": {202},
+    "diarize": set(range(200, 300)),
+    "chunk": set(range(200, 300)),
+}
+
+# Client errors that no retry will fix go straight to the dead letters.
+RETRYABLE_CLIENT_ERRORS = {408, 425}
+# The GPU server is full: the stage is paused and nothing counts as an attempt.
+THROTTLE_STATUSES = {429, 503}
+
+
+def preprocess_payload(audio_file):
+    """Preprocessing request for one AudioFile."""
+    return {
+        "audio_path": audio_file.gpu_path,
+        "noise_reduction": 0.3,  # Default value, can be customized
+        "normalize": True,  # Default value, can be customized
+        "project_id": str(audio_file.project_id),
+    }
+
+
+def enqueue_many(jobs, priority=PRIORITY_NORMAL):
+    """
+    Add ``(stage, project_id, source_id, payload)`` GPU requests to the
+    outbox in one INSERT.
+
+    Runs in the caller's transaction, so the requests exist exactly when the
+    rows that triggered them do. A request whose ``stage`` and ``source_id``
+    are already in the outbox, in any state, is dropped. Preprocess requests
+    only become due after GPU_PREPROCESS_BATCH_WINDOW, so that requests of
+    the same upload can be sent as one batch.
+
+    Each new request gets a PENDING ProcessingTask, whose id is sent along
+    as ``task_id`` for the GPU server's status reports.
+    """
+    # Read twice below, so a generator would be used up by the first pass.
+    jobs = list(jobs)
+    now = timezone.now()
+    window = timedelta(seconds=GPU_PREPROCESS_BATCH_WINDOW if GPU_PREPROCESS_BATCHING else 0)
+    queued = set(
+        GpuDispatch.objects.filter(
+            dedup_key__in=[f"{stage}:{source_id}" for stage, _, source_id, _ in jobs]
+        ).values_list("dedup_key", flat=True)
+    )
+    dispatches, tasks = [], []
+    for stage, project_id, source_id, payload in jobs:
+        dedup_key = f"{stage}:{source_id}"
+        if dedup_key in queued:
+            continue
+        queued.add(dedup_key)
+        task_id = uuid.uuid4()
+        dispatches.append(
+            GpuDispatch(
+                project_id=project_id,
+                stage=stage,
+                dedup_key=dedup_key,
+                source_id=source_id,
+                payload={**payload, "task_id": str(task_id)},
+                next_attempt_at=now + window if stage == "preprocess" else now,
+                priority=priority,
+            )
+        )
+        tasks.append(
+            ProcessingTask(
+                unique_id=task_id,
+                project_id=project_id,
+                audio_id=os.path.splitext(os.path.basename(payload["audio_path"]))[0],
+                source_id=source_id,
+                task_type=stage.upper(),
+            )
+        )
+    # Should a concurrent enqueue of the same request win the dedup_key, its
+    # twin task here is never sent and stays PENDING; that race needs two
+    # saves of one source row at once and is left alone.
+    GpuDispatch.objects.bulk_create(dispatches, ignore_conflicts=True)
+    ProcessingTask.objects.bulk_create(tasks)
+
+
+def enqueue(stage, project_id, source_id, payload, priority=PRIORITY_NORMAL):
+    """Add one GPU request to the outbox; see ``enqueue_many``."""
+    enqueue_many([(stage, project_id, source_id, payload)], priority)
+
+
+def backoff_delay(attempts):
+    """Seconds before retry number ``attempts``: exponential with jitter."""
+    delay = min(
+        GPU_DISPATCH_BACKOFF_BASE * 2 ** (attempts - 1), GPU_DISPATCH_BACKOFF_MAX
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def _in_flight(now):
+    """Rows holding a stage slot: claimed, or accepted and presumed running."""
+    in_flight = Q(status="in_flight", locked_until__gt=now)
+    for stage, hold in GPU_STAGE_HOLD_SECONDS.items():
+        in_flight |= Q(
+            stage=stage,
+            status="sent",
+            completed_at__isnull=True,
+            sent_at__gt=now - timedelta(seconds=hold),
+        )
+    return in_flight
+
+
+def stage_load(now=None):
+    """``{stage: files in flight}``, see GPU_STAGE_CONCURRENCY."""
+    now = now or timezone.now()
+    load = dict.fromkeys(STAGES, 0)
+    load.update(
+        GpuDispatch.objects.filter(_in_flight(now))
+        .values("stage")
+        .annotate(files=Count("pk"))
+        .values_list("stage", "files")
+    )
+    return load
+
+
+def claim_due(batch_size=GPU_DISPATCH_BATCH_SIZE, lease=GPU_DISPATCH_LEASE, paused=()):
+    """
+    Lease due outbox rows to this dispatcher: per stage not in ``paused``,
+    up to ``batch_size`` rows and no more than its free slots, highest
+    priority first.
+
+    Rows locked by a concurrent dispatcher are skipped; rows whose lease
+    expired without a result are due again.
+    """
+    now = timezone.now()
+    due = Q(status="pending", next_attempt_at__lte=now) | Q(
+        status="in_flight", locked_until__lte=now
+    )
+    with transaction.atomic():
+        load = stage_load(now)
+        dispatches = []
+        for stage in STAGES:
+            free = min(GPU_STAGE_CONCURRENCY.get(stage, batch_size) - load[stage], batch_size)
+            if stage in paused or free <= 0:
+                continue
+            dispatches.extend(
+                GpuDispatch.objects.select_for_update(skip_locked=True)
+                .filter(due, stage=stage)
+                .order_by("priority", "next_attempt_at")[:free]
+            )
+        GpuDispatch.objects.filter(pk__in=[d.pk for d in dispatches]).update(
+            status="in_flight",
+            locked_until=now + timedelta(seconds=lease),
+            updated_at=now,
+        )
+    return dispatches
+
+
+def queue_depth(project=None):
+    """
+    Per stage: rows ``pending`` (of which ``due`` now), ``in_flight`` (see
+    GPU_STAGE_CONCURRENCY), ``limit`` and ``dead``.
+    """
+    now = timezone.now()
+    queryset = GpuDispatch.objects.all()
+    if project is not None:
+        queryset = queryset.filter(project=project)
+    depth = {
+        stage: {
+            "pending": 0,
+            "due": 0,
+            "in_flight": 0,
+            "dead": 0,
+            "limit": GPU_STAGE_CONCURRENCY.get(stage),
+        }
+        for stage in STAGES
+    }
+    counts = queryset.values("stage").annotate(
+        pending=Count("pk", filter=Q(status="pending")),
+        due=Count("pk", filter=Q(status="pending", next_attempt_at__lte=now)),
+        in_flight=Count("pk", filter=_in_flight(now)),
+        dead=Count("pk", filter=Q(status="dead")),
+    )
+    for row in counts:
+        depth[row.pop("stage")].update(row)
+    return depth
+
+
+def _retry_after(response):
+    try:
+        return max(float(response.headers["Retry-After"]), 0)
+    except (KeyError, ValueError):
+        return GPU_THROTTLE_SECONDS
+
+
+def _post(stage, payload):
+    """
+    POST ``payload`` to ``stage``'s endpoint.
+
+    Returns ``(error, retryable, throttle)``: ``error`` is None once the
+    server accepted the request; ``throttle`` is the number of seconds to
+    pause the stage for when the server is full, else None.
+    """
+    try:
+        response = http_client.post(
+            STAGE_URLS[stage],
+            json=payload,
+            timeout=GPU_DISPATCH_TIMEOUT,
+        )
+    except requests.exceptions.RequestException as e:
+        return str(e) or repr(e), True, None
+    if response.status_code in ACCEPTED_STATUSES[stage]:
+        logger.info(f"{stage} accepted: {response.text[:200]}")
+        return None, False, None
+    error = f"HTTP {response.status_code}: {response.text[:500]}"
+    if response.status_code in THROTTLE_STATUSES:
+        return error, True, _retry_after(response)
+    retryable = (
+        response.status_code >= 500
+        or response.status_code in RETRYABLE_CLIENT_ERRORS
+    )
+    return error, retryable, None
+
+
+def send_dispatch(dispatch):
+    """
+    POST one outbox row to the GPU server.
+
+    Returns ``(error, retryable, throttle)`` as ``_post`` does.
+    """
+    return _post(dispatch.stage, dispatch.payload)
+
+
+def preprocess_batch_payload(dispatches):
+    """One batch request for preprocess rows sharing project and options."""
+    payload = dict(dispatches[0].payload)
+    del payload["audio_path"]
+    payload.pop("task_id", None)
+    payload["audio_paths"] = [dispatch.payload["audio_path"] for dispatch in dispatches]
+    payload["task_ids"] = [dispatch.payload.get("task_id") for dispatch in dispatches]
+    return payload
+
+
+def send_group(dispatches):
+    """Send a group from ``group_dispatches``: a preprocess batch or a single row."""
+    if dispatches[0].stage == "preprocess" and GPU_PREPROCESS_BATCHING:
+        return _post("preprocess_batch", preprocess_batch_payload(dispatches))
+    return send_dispatch(dispatches[0])
+
+
+def group_dispatches(dispatches, batch_size=GPU_PREPROCESS_BATCH_SIZE):
+    """
+    Split claimed rows into requests: preprocess rows with the same project
+    and options share one, up to ``batch_size`` paths; others go alone.
+    """
+    groups = []
+    batches = {}
+    for dispatch in dispatches:
+        if dispatch.stage != "preprocess" or not GPU_PREPROCESS_BATCHING:
+            groups.append([dispatch])
+            continue
+        options = {
+            k: v for k, v in dispatch.payload.items() if k not in ("audio_path", "task_id")
+        }
+        key = json.dumps(options, sort_keys=True)
+        batch = batches.get(key)
+        if batch is None or len(batch) >= batch_size:
+            batch = batches[key] = []
+            groups.append(batch)
+        batch.append(dispatch)
+    return groups
+
+
+def mark_sent(dispatches):
+    """Close accepted rows and apply their stage's bookkeeping in one transaction."""
+    now = timezone.now()
+    with transaction.atomic():
+        GpuDispatch.objects.filter(pk__in=[d.pk for d in dispatches]).update(
+            status="sent",
+            attempts=F("attempts") + 1,
+            sent_at=now,
+            locked_until=None,
+            last_error=None,
+            updated_at=now,
+        )
+        # update() does not send post_save, so this cannot enqueue again.
+        AudioFile.objects.filter(
+            pk__in=[d.source_id for d in dispatches if d.stage == "preprocess"]
+        ).update(is_processed=True)
+        ProcessingTask.objects.filter(
+            pk__in=[d.payload["task_id"] for d in dispatches if "task_id" in d.payload],
+            dispatched_at__isnull=True,
+        ).update(dispatched_at=now, updated_at=now)
+
+
+def mark_completed(stage, source_ids):
+    """
+    Record that the GPU server finished ``stage`` for ``source_ids``, which
+    frees their slots before GPU_STAGE_HOLD_SECONDS runs out. Returns how
+    many rows were updated.
+    """
+    return GpuDispatch.objects.filter(
+        stage=stage, source_id__in=source_ids, completed_at__isnull=True
+    ).update(completed_at=timezone.now())
+
+
+def defer(dispatches, until, error):
+    """Put throttled rows back in the queue until ``until``, attempts unchanged."""
+    GpuDispatch.objects.filter(pk__in=[d.pk for d in dispatches]).update(
+        status="pending",
+        next_attempt_at=until,
+        locked_until=None,
+        last_error=error,
+        updated_at=timezone.now(),
+    )
+
+
+def mark_failed(dispatch, error, retryable, max_attempts=GPU_DISPATCH_MAX_ATTEMPTS):
+    """Schedule a retry of a failed row, or dead-letter it."""
+    now = timezone.now()
+    attempts = dispatch.attempts + 1
+    dead = not retryable or attempts >= max_attempts
+    GpuDispatch.objects.filter(pk=dispatch.pk).update(
+        status="dead" if dead else "pending",
+        attempts=attempts,
+        next_attempt_at=now + timedelta(seconds=0 if dead else backoff_delay(attempts)),
+        locked_until=None,
+        last_error=error,
+        updated_at=now,
+    )
+    if dead:
+        ProcessingTask.objects.filter(pk=dispatch.payload.get("task_id")).update(
+            status="FAILED", error_message=error, completed_at=now, updated_at=now
+        )
+        logger.error(f"{dispatch.dedup_key} dead after {attempts} attempts: {error}")
+    return "dead" if dead else "retry"
+
+
+def requeue_dead(stage=None):
+    """Give dead-lettered rows a fresh set of attempts. Returns how many."""
+    queryset = GpuDispatch.objects.filter(status="dead")
+    if stage:
+        queryset = queryset.filter(stage=stage)
+    with transaction.atomic():
+        task_ids = [
+            payload.get("task_id") for payload in queryset.values_list("payload", flat=True)
+        ]
+        ProcessingTask.objects.filter(pk__in=[t for t in task_ids if t]).update(
+            status="PENDING", error_message=None, completed_at=None, updated_at=timezone.now()
+        )
+        return queryset.update(
+            status="pending", attempts=0, next_attempt_at=timezone.now()
+        )
+
+
+def dispatch_due(
+    executor,
+    batch_size=GPU_DISPATCH_BATCH_SIZE,
+    max_attempts=GPU_DISPATCH_MAX_ATTEMPTS,
+    on_result=None,
+    paused=None,
+):
+    """
+    Claim one batch of due rows and send it concurrently on ``executor``,
+    preprocess rows coalesced per project.
+
+    ``paused`` maps stages to the time until which they must not be sent
+    to; a 429 or 503 response pauses its stage (for Retry-After seconds when
+    given) and puts its rows back without using up an attempt. Returns the
+    number of rows claimed.
+    """
+    paused = {} if paused is None else paused
+    now = timezone.now()
+    dispatches = claim_due(
+        batch_size, paused={stage for stage, until in paused.items() if until > now}
+    )
+    groups = group_dispatches(dispatches)
+    sent = []
+    for group, (error, retryable, throttle) in zip(
+        groups, executor.map(send_group, groups)
+    ):
+        if throttle is not None:
+            stage = group[0].stage
+            until = timezone.now() + timedelta(seconds=throttle)
+            paused[stage] = max(paused.get(stage, until), until)
+            defer(group, paused[stage], error)
+            logger.warning(f"{stage} paused for {throttle:.0f}s: {error}")
+        for dispatch in group:
+            if throttle is not None:
+                outcome = "throttled"
+            elif error is None:
+                sent.append(dispatch)
+                outcome = "sent"
+            else:
+                outcome = mark_failed(dispatch, error, retryable, max_attempts)
+            if on_result:
+                on_result(dispatch, outcome, error)
+    if sent:
+        mark_sent(sent)
+    return len(dispatches)
+
+
+def run_dispatcher(
+    workers=GPU_DISPATCH_WORKERS,
+    batch_size=GPU_DISPATCH_BATCH_SIZE,
+    max_attempts=GPU_DISPATCH_MAX_ATTEMPTS,
+    poll_interval=2.0,
+    once=False,
+    on_result=None,
+    stop=None,
+):
+    """
+    Drain the outbox with ``workers`` concurrent requests, within the stage
+    limits, sleeping ``poll_interval`` seconds whenever nothing can be sent.
+    With ``once`` return as soon as nothing can be sent; a set ``stop``
+    event ends the loop too.
+    """
+    paused = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while stop is None or not stop.is_set():
+            claimed = dispatch_due(executor, batch_size, max_attempts, on_result, paused)
+            if not claimed:
+                if once:
+                    return
+                if stop is None:
+                    time.sleep(poll_interval)
+                else:
+                    stop.wait(poll_interval)
+
+
+def backfill_preprocessing(project=None, priority=PRIORITY_BACKFILL):
+    """
+    Queue preprocessing for AudioFiles that are not processed and were never
+    queued, e.g. those registered by the ingest commands, whose bulk inserts
+    send no post_save. Returns how many were queued.
+    """
+    queued = GpuDispatch.objects.filter(stage="preprocess").values("source_id")
+    audio_files = AudioFile.objects.filter(is_processed=False).exclude(pk__in=queued)
+    if project is not None:
+        audio_files = audio_files.filter(project=project)
+    jobs = [
+        ("preprocess", audio_file.project_id, audio_file.pk, preprocess_payload(audio_file))
+        for audio_file in audio_files.only("unique_id", "project_id", "audio_file")
+    ]
+    for start in range(0, len(jobs), GPU_DISPATCH_BATCH_SIZE):
+        enqueue_many(jobs[start : start + GPU_DISPATCH_BATCH_SIZE], priority)
+    return len(jobs)
@@ -0,0 +1,242 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ENDPOINTS = (
+    "/api/audio/preprocess/",
+    "/api/audio/preprocess/batch/",
+    "/api/audio/diarize/",
+    "/api/audio/chunk/",
+)
+
+
+class GpuServerStub:
+    """
+    In-process stand-in for the GPU server's job endpoints, for tests.
+
+    Every endpoint answers ``status`` (202 by default) with task ids and
+    records ``(path, payload)`` in ``received``. Use as a context manager;
+    ``base_url`` is the value to use for GPU_SERVER_BASE_URL.
+    """
+
+    def __init__(self, status=202, host="127.0.0.1", port=0):
+        self.status = status
+        self.received = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def urls(self):
+        """STAGE_URLS pointing at this stub."""
+        return {
+            "preprocess": f"{self.base_url}/audio/preprocess/",
+            "preprocess_batch": f"{self.base_url}/audio/preprocess/batch/",
+            "diarize": f"{self.base_url}/audio/diarize/",
+            "chunk": f"{self.base_url}/audio/chunk/",
+        }
+
+    def respond(self, path, payload):
+        """``(status, body)`` for one request; override for other behaviour."""
+        if "audio_paths" in payload:
+            return self.status, {
+                "task_ids": [str(uuid.uuid4()) for _ in payload["audio_paths"]],
+                "status": "queued",
+            }
+        return self.status, {"task_id": str(uuid.uuid4()), "status": "queued"}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "Invalid JSON"})
+                    return
+                if self.path not in STUB_ENDPOINTS:
+                    self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+                    return
+                with stub._lock:
+                    stub.received.append((self.path, payload))
+                self._reply(*stub.respond(self.path, payload))
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+# Mean seconds a job of each stage takes on the stand-in
+STAND_IN_LATENCY = {"preprocess": 2.0, "diarize": 5.0, "chunk": 2.0}
+
+
+class GpuServerStandIn(GpuServerStub):
+    """
+    GpuServerStub that also runs the jobs it accepts, for load tests.
+
+    Each accepted file finishes after an exponentially distributed delay
+    with the stage's mean ``latency`` and its results are POSTed to the S3
+    API at ``callback_url`` with ``token``, as the GPU server does: one
+    ProcessedAudioFile, one DiarizedAudioFile, or ``chunks_per_file``
+    AudioChunks. Like the GPU server, it reports each job's ProcessingTask as
+    PROCESSING when it starts and COMPLETED or FAILED when it is done. Output
+    names keep the input's stem, so one recording can be followed through
+    every stage. ``failure_rate`` of the requests are
+    answered with ``failure_status`` instead. Every job is recorded in
+    ``jobs`` with its ``received`` and ``completed`` times.
+    """
+
+    def __init__(
+        self,
+        callback_url,
+        token,
+        latency=None,
+        failure_rate=0.0,
+        failure_status=500,
+        chunks_per_file=5,
+        workers=32,
+        seed=0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.callback_url = callback_url.rstrip("/")
+        self.token = token
+        self.latency = {**STAND_IN_LATENCY, **(latency or {})}
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.chunks_per_file = chunks_per_file
+        self.random = random.Random(seed)
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def respond(self, path, payload):
+        stage = path.split("/")[3]
+        audio_paths = payload.get("audio_paths") or [payload["audio_path"]]
+        task_ids = payload.get("task_ids") or [payload.get("task_id")]
+        mean = self.latency[stage]
+        with self._lock:
+            if self.random.random() < self.failure_rate:
+                return self.failure_status, {"error": "Simulated failure"}
+            delays = [self.random.expovariate(1 / mean) if mean > 0 else 0 for _ in audio_paths]
+        status, body = super().respond(path, payload)
+        received = time.time()
+        for audio_path, task_id, delay in zip(audio_paths, task_ids, delays):
+            job = {
+                "stage": stage,
+                "audio_path": audio_path,
+                "task_id": task_id,
+                "project_id": payload["project_id"],
+                "received": received,
+                "completed": None,
+                "error": None,
+            }
+            with self._lock:
+                self.jobs.append(job)
+            self.executor.submit(self._run_job, job, delay)
+        return status, body
+
+    def results(self, stage, name):
+        """``(endpoint, record)`` callbacks for one finished file."""
+        if stage == "preprocess":
+            return [
+                (
+                    "processed-audio-files/",
+                    {"processed_file": f"processed/{name}.wav", "file_size": 0, "duration": 0},
+                )
+            ]
+        if stage == "diarize":
+            return [
+                (
+                    "diarized-audio-files/",
+                    {
+                        "diarized_file": f"diarized/{name}.wav",
+                        "diarization_result_json_path": f"diarized/{name}.json",
+                        "file_size": 0,
+                        "duration": 0,
+                    },
+                )
+            ]
+        return [
+            ("audio-chunks/", {"chunk_file": f"chunks/{name}_chunk_{i:04d}.wav", "duration": 5.0})
+            for i in range(self.chunks_per_file)
+        ]
+
+    def _report(self, job, status, headers):
+        from transcriptions import http_client
+
+        if not job["task_id"]:
+            return
+        report = {"task_id": job["task_id"], "status": status}
+        if job["error"]:
+            report["error_message"] = job["error"]
+        try:
+            http_client.post(
+                f"{self.callback_url}/processing-tasks/status/",
+                json={"tasks": [report]},
+                headers=headers,
+            ).raise_for_status()
+        except Exception as e:
+            job["error"] = job["error"] or f"Status report failed: {e}"
+
+    def _run_job(self, job, delay):
+        from transcriptions import http_client
+
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "x-project-id": job["project_id"],
+        }
+        self._report(job, "PROCESSING", headers)
+        time.sleep(delay)
+        name = os.path.splitext(os.path.basename(job["audio_path"]))[0]
+        try:
+            for endpoint, record in self.results(job["stage"], name):
+                response = http_client.post(
+                    f"{self.callback_url}/{endpoint}", json=record, headers=headers
+                )
+                response.raise_for_status()
+        except Exception as e:
+            job["error"] = str(e) or repr(e)
+        self._report(job, "FAILED" if job["error"] else "COMPLETED", headers)
+        job["completed"] = time.time()
+
+    def stop(self):
+        super().stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
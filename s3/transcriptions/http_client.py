@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import numpy as np
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) seconds
+HTTP_CLIENT_TIMEOUT = getattr(settings, "HTTP_CLIENT_TIMEOUT", (5, 30))
+HTTP_CLIENT_POOL_SIZE = getattr(settings, "HTTP_CLIENT_POOL_SIZE", 20)
+HTTP_CLIENT_RETRIES = getattr(settings, "HTTP_CLIENT_RETRIES", 3)
+HTTP_CLIENT_BACKOFF_FACTOR = getattr(settings, "HTTP_CLIENT_BACKOFF_FACTOR", 0.5)
+HTTP_CLIENT_RETRY_STATUSES = getattr(
+    settings, "HTTP_CLIENT_RETRY_STATUSES", (502, 503, 504)
+)
+# Per-host overrides of the above, e.g. {"192.168.8.18:8001": {"timeout": (2, 120)}}
+HTTP_CLIENT_HOST_OPTIONS = getattr(settings, "HTTP_CLIENT_HOST_OPTIONS", {})
+HTTP_CLIENT_LATENCY_WINDOW = getattr(settings, "HTTP_CLIENT_LATENCY_WINDOW", 1000)
+
+_lock = threading.Lock()
+_sessions = {}
+_latencies = {}
+_pid = None
+
+
+def host_options(host):
+    """Timeout, pool size and retry policy for ``host`` (``name[:port]``)."""
+    options = {
+        "timeout": HTTP_CLIENT_TIMEOUT,
+        "pool_size": HTTP_CLIENT_POOL_SIZE,
+        "retries": HTTP_CLIENT_RETRIES,
+        "backoff_factor": HTTP_CLIENT_BACKOFF_FACTOR,
+        "retry_statuses": HTTP_CLIENT_RETRY_STATUSES,
+    }
+    options.update(HTTP_CLIENT_HOST_OPTIONS.get(host, {}))
+    return options
+
+
+def _new_session(options):
+    # Connection failures are retried for every method: nothing reached the
+    # server. Status retries only apply to idempotent methods, so a POST is
+    # never sent twice by the client itself.
+    retry = Retry(
+        total=options["retries"],
+        connect=options["retries"],
+        read=0,
+        status=options["retries"],
+        status_forcelist=options["retry_statuses"],
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]),
+        backoff_factor=options["backoff_factor"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=options["pool_size"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url):
+    """
+    The keep-alive session of ``url``'s host, created on first use.
+
+    Sessions are per process: a forked worker builds its own instead of
+    sharing the parent's sockets.
+    """
+    global _pid
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _lock:
+        if _pid != os.getpid():
+            _sessions.clear()
+            _pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session(host_options(parts.netloc))
+    return session
+
+
+def _record(host, seconds, failed):
+    with _lock:
+        samples = _latencies.get(host)
+        if samples is None:
+            samples = _latencies[host] = deque(maxlen=HTTP_CLIENT_LATENCY_WINDOW)
+        samples.append((seconds, failed))
+
+
+def request(method, url, **kwargs):
+    """
+    ``requests.request`` through the pooled session of ``url``'s host, with
+    the host's timeout unless one is given. Latency is recorded per host.
+    """
+    host = urlsplit(url).netloc
+    kwargs.setdefault("timeout", host_options(host)["timeout"])
+    started = time.monotonic()
+    failed = True
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        seconds = time.monotonic() - started
+        _record(host, seconds, failed)
+        logger.debug(f"{method} {url} took {seconds * 1000:.0f} ms")
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def latency_stats():
+    """
+    ``{host: {"calls", "errors", "p50_ms", "p95_ms", "max_ms"}}`` over the
+    last HTTP_CLIENT_LATENCY_WINDOW calls to each host in this process.
+    Errors are exceptions and 5xx responses.
+    """
+    with _lock:
+        snapshot = {host: list(samples) for host, samples in _latencies.items()}
+    stats = {}
+    for host, samples in snapshot.items():
+        ms = np.array([seconds for seconds, _ in samples]) * 1000
+        stats[host] = {
+            "calls": len(samples),
+            "errors": sum(failed for _, failed in samples),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "max_ms": round(float(ms.max()), 1),
+        }
+    return stats
@@ -0,0 +1,476 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from transcriptions.audio_metadata import probe_duration
+from transcriptions.dispatch import enqueue_many, preprocess_payload
+from transcriptions.models import AudioChunk, AudioFile
+from transcriptions.pcm_cache import file_sha256
+
+INGEST_BATCH_SIZE = getattr(settings, "INGEST_BATCH_SIZE", 500)
+INGEST_WORKERS = getattr(settings, "INGEST_WORKERS", 8)
+INGEST_MANIFEST_DIR = getattr(
+    settings,
+    "INGEST_MANIFEST_DIR",
+    os.path.join(settings.MEDIA_ROOT, "cache", "ingest"),
+)
+
+# <audio_id>_<run key>_chunk_<order>.wav, as written by the chunker (the run
+# key is the first 8 hex digits of its cache key), or <audio_id>_chunk_<order>.wav
+# from before run keys. A name that only fits the first form because its
+# audio_id ends in 8 hex digits is resolved against the AudioFiles: ``prefix``
+# is then the audio_id.
+CHUNK_NAME_RE = re.compile(
+    r"^(?P<prefix>(?P<audio_id>.+?)(?:_(?P<run_key>[0-9a-f]{8}))?)"
+    r"_chunk_(?P<order>\d+)\.wav$"
+)
+
+
+def scan_audio_files(directory, extensions=(".wav",)):
+    """Yield ``(name, path, size, mtime_ns)`` for audio files directly in ``directory``."""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.lower().endswith(extensions) and entry.is_file():
+                stat = entry.stat()
+                yield entry.name, entry.path, stat.st_size, stat.st_mtime_ns
+
+
+def place_in_media(source, relative_name, move=False):
+    """
+    Put ``source`` at ``MEDIA_ROOT/relative_name`` without rewriting its bytes
+    when possible: a hard link (or a rename with ``move``) on the same
+    filesystem, a copy across filesystems. An existing file is replaced.
+    """
+    destination = os.path.join(settings.MEDIA_ROOT, relative_name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return relative_name
+
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        if move:
+            os.rename(source, tmp_path)
+        else:
+            os.link(source, tmp_path)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copyfile(source, tmp_path)
+        if move:
+            os.remove(source)
+    os.replace(tmp_path, destination)
+    return relative_name
+
+
+def manifest_path(directory, scope):
+    """Manifest file of one (directory, scope) pair, e.g. a project's raw ingest."""
+    key = f"{os.path.realpath(directory)}\0{scope}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(INGEST_MANIFEST_DIR, f"{digest}.jsonl")
+
+
+def load_manifest(path):
+    """
+    ``{name: entry}`` of files ingested so far. Entries are appended as
+    batches commit, so a later line for the same name wins.
+    """
+    entries = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interruption.
+                    continue
+                entries[entry["name"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def append_manifest(manifest, entries):
+    """Durably append ``entries`` to an open manifest file."""
+    for entry in entries:
+        manifest.write(json.dumps(entry) + "\n")
+    manifest.flush()
+    os.fsync(manifest.fileno())
+
+
+def write_manifest(path, entries):
+    """Rewrite a manifest with one line per entry, dropping superseded lines."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        append_manifest(f, entries.values())
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(entry, size, mtime_ns):
+    return entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+
+def manifest_entry(name, size, mtime_ns, sha256=None):
+    entry = {"name": name, "size": size, "mtime_ns": mtime_ns}
+    if sha256:
+        entry["sha256"] = sha256
+    return entry
+
+
+def _prepare(name, path, size, mtime_ns, project, move, previous_sha256, with_hash):
+    """Probe and place one file; runs in the worker pool."""
+    result = {"name": name, "size": size, "mtime_ns": mtime_ns}
+    if with_hash:
+        result["sha256"] = file_sha256(path)
+        if result["sha256"] == previous_sha256:
+            # Touched but not modified: only the manifest needs updating.
+            result["unchanged"] = True
+            return result
+    try:
+        result["duration"] = probe_duration(path)
+    except Exception as e:
+        result["duration"] = None
+        result["warning"] = f"Could not read duration: {e!r}"
+    try:
+        # One folder per project: a same-named file of another project must
+        # not replace the audio its AudioFile points at.
+        result["audio_file"] = place_in_media(
+            path, f"raw/{project.pk}/{name}", move=move
+        )
+    except OSError as e:
+        result["error"] = str(e)
+    return result
+
+
+def _upsert_audio_files(project, prepared):
+    """
+    Create or update the AudioFile rows of one batch in a single transaction,
+    queueing preprocessing for the unprocessed ones as their post_save
+    signal would (bulk writes send none).
+    """
+    by_audio_id = {os.path.splitext(item["name"])[0]: item for item in prepared}
+    existing = {
+        audio_file.audio_id: audio_file
+        for audio_file in AudioFile.objects.filter(
+            project=project, audio_id__in=list(by_audio_id)
+        )
+    }
+    to_create = []
+    to_update = []
+    now = timezone.now()
+    for audio_id, item in by_audio_id.items():
+        audio_file = existing.get(audio_id)
+        if audio_file is None:
+            to_create.append(
+                AudioFile(
+                    project=project,
+                    audio_id=audio_id,
+                    audio_file=item["audio_file"],
+                    file_size=item["size"],
+                    duration=item["duration"],
+                )
+            )
+        else:
+            audio_file.audio_file = item["audio_file"]
+            audio_file.file_size = item["size"]
+            if item["duration"] is not None:
+                audio_file.duration = item["duration"]
+            # bulk_update does not apply auto_now.
+            audio_file.updated_at = now
+            to_update.append(audio_file)
+
+    with transaction.atomic():
+        AudioFile.objects.bulk_create(to_create)
+        AudioFile.objects.bulk_update(
+            to_update, ["audio_file", "file_size", "duration", "updated_at"]
+        )
+        enqueue_many(
+            [
+                ("preprocess", project.pk, audio_file.pk, preprocess_payload(audio_file))
+                for audio_file in to_create + to_update
+                if not audio_file.is_processed
+            ]
+        )
+    return len(to_create), len(to_update)
+
+
+def ingest_audio_directory(
+    directory,
+    project,
+    extensions=(".wav",),
+    move=False,
+    workers=INGEST_WORKERS,
+    batch_size=INGEST_BATCH_SIZE,
+    incremental=True,
+    with_hash=False,
+    on_batch=None,
+):
+    """
+    Register the audio files in ``directory`` as AudioFiles of ``project``.
+
+    Metadata is probed and files are placed under MEDIA_ROOT/raw/<project id>
+    by a thread pool; rows are upserted one batch at a time. After each batch commits,
+    its files are appended to the directory's manifest. With
+    ``incremental``, files whose size and mtime match the manifest are
+    skipped, so a re-run (or a resumed interrupted run) only touches new and
+    modified files; ``with_hash`` also records a sha256 and skips files that
+    were touched without changing. ``on_batch`` gets a summary dict after
+    every batch. Returns the totals, including manifest names no longer
+    found in the directory as ``deleted``.
+    """
+    path = manifest_path(directory, f"raw:{project.pk}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = load_manifest(path) if incremental else {}
+
+    totals = {"created": 0, "updated": 0, "unchanged": 0, "failed": []}
+    seen = set()
+
+    def flush(batch, executor, manifest_file):
+        prepared = list(
+            executor.map(
+                lambda args: _prepare(
+                    *args,
+                    project,
+                    move,
+                    manifest.get(args[0], {}).get("sha256"),
+                    with_hash,
+                ),
+                batch,
+            )
+        )
+        failed = [item for item in prepared if "error" in item]
+        unchanged = [item for item in prepared if item.get("unchanged")]
+        placed = [
+            item
+            for item in prepared
+            if "error" not in item and not item.get("unchanged")
+        ]
+        created, updated = _upsert_audio_files(project, placed) if placed else (0, 0)
+        entries = [
+            manifest_entry(
+                item["name"], item["size"], item["mtime_ns"], item.get("sha256")
+            )
+            for item in placed + unchanged
+        ]
+        append_manifest(manifest_file, entries)
+        manifest.update((entry["name"], entry) for entry in entries)
+
+        totals["created"] += created
+        totals["updated"] += updated
+        totals["unchanged"] += len(unchanged)
+        totals["failed"].extend(failed)
+        if on_batch:
+            on_batch(
+                {
+                    "created": created,
+                    "updated": updated,
+                    "failed": failed,
+                    "warnings": [item for item in placed if "warning" in item],
+                }
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(
+        path, "a" if incremental else "w"
+    ) as manifest_file:
+        batch = []
+        for name, file_path, size, mtime_ns in scan_audio_files(directory, extensions):
+            seen.add(name)
+            if is_unchanged(manifest.get(name), size, mtime_ns):
+                totals["unchanged"] += 1
+                continue
+            batch.append((name, file_path, size, mtime_ns))
+            if len(batch) >= batch_size:
+                flush(batch, executor, manifest_file)
+                batch = []
+        if batch:
+            flush(batch, executor, manifest_file)
+
+    # With move the sources are gone by design, so nothing counts as deleted.
+    totals["deleted"] = [] if move else sorted(set(manifest) - seen)
+    write_manifest(path, manifest)
+    return totals
+
+
+def media_relative_path(path, relative_name):
+    """
+    Path of ``path`` relative to MEDIA_ROOT. Files outside MEDIA_ROOT are
+    first placed at ``relative_name`` (see ``place_in_media``).
+    """
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([media_root, real_path]) == media_root:
+        return os.path.relpath(real_path, media_root)
+    return place_in_media(path, relative_name)
+
+
+def _prepare_chunk(name, path, size, mtime_ns):
+    """Probe and locate one chunk file; runs in the worker pool."""
+    result = {"name": name, "size": size, "mtime_ns": mtime_ns}
+    try:
+        result["duration"] = probe_duration(path)
+    except Exception as e:
+        result["duration"] = None
+        result["warning"] = f"Could not read duration: {e!r}"
+    try:
+        result["chunk_file"] = media_relative_path(path, f"chunks/{name}")
+    except OSError as e:
+        result["error"] = str(e)
+    return result
+
+
+def _upsert_chunks(prepared):
+    """
+    Create the AudioChunk rows of one batch that are not registered yet and
+    fill in missing durations of those that are, in a single transaction.
+    """
+    by_file = {item["chunk_file"]: item for item in prepared}
+    existing = {
+        chunk.chunk_file.name: chunk
+        for chunk in AudioChunk.objects.filter(
+            chunk_file__in=list(by_file)
+        ).only("unique_id", "chunk_file", "duration")
+    }
+    to_create = []
+    to_update = []
+    now = timezone.now()
+    for chunk_file, item in by_file.items():
+        chunk = existing.get(chunk_file)
+        if chunk is None:
+            to_create.append(
+                AudioChunk(
+                    project_id=item["project_id"],
+                    chunk_file=chunk_file,
+                    duration=item["duration"],
+                )
+            )
+        elif chunk.duration is None and item["duration"] is not None:
+            chunk.duration = item["duration"]
+            chunk.updated_at = now
+            to_update.append(chunk)
+
+    with transaction.atomic():
+        AudioChunk.objects.bulk_create(to_create)
+        AudioChunk.objects.bulk_update(to_update, ["duration", "updated_at"])
+    return len(to_create), len(to_update), len(existing) - len(to_update)
+
+
+def register_chunk_directory(
+    directory,
+    project=None,
+    workers=INGEST_WORKERS,
+    batch_size=INGEST_BATCH_SIZE,
+    incremental=True,
+    on_batch=None,
+):
+    """
+    Register the chunk files in ``directory`` as AudioChunks.
+
+    Every filename is parsed first and the parent AudioFiles of all of them
+    are resolved in one query on ``audio_id`` (restricted to ``project`` if
+    given), which gives each chunk its project. Durations are then read from
+    the file headers by a thread pool and rows are upserted one batch at a
+    time; files already under MEDIA_ROOT are registered where they are,
+    others are linked in under MEDIA_ROOT/chunks. The manifest works as in
+    ``ingest_audio_directory``. Returns the totals; ``rejected`` holds
+    ``(name, reason)`` pairs for files that could not be matched.
+    """
+    path = manifest_path(
+        directory, f"chunks:{project.pk}" if project is not None else "chunks"
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = load_manifest(path) if incremental else {}
+
+    totals = {
+        "created": 0,
+        "updated": 0,
+        "existing": 0,
+        "unchanged": 0,
+        "rejected": [],
+        "failed": [],
+    }
+    seen = set()
+    parsed = []
+    for name, file_path, size, mtime_ns in sorted(scan_audio_files(directory)):
+        seen.add(name)
+        if is_unchanged(manifest.get(name), size, mtime_ns):
+            totals["unchanged"] += 1
+            continue
+        match = CHUNK_NAME_RE.match(name)
+        if match is None:
+            totals["rejected"].append((name, "Not a <audio_id>_chunk_<n>.wav name"))
+            continue
+        parsed.append(
+            (
+                (match.group("audio_id"), match.group("prefix")),
+                (name, file_path, size, mtime_ns),
+            )
+        )
+
+    audio_files = AudioFile.objects.filter(
+        audio_id__in={audio_id for candidates, _ in parsed for audio_id in candidates}
+    )
+    if project is not None:
+        audio_files = audio_files.filter(project=project)
+    project_by_audio_id = {}
+    ambiguous = set()
+    for audio_id, project_id in audio_files.values_list("audio_id", "project_id"):
+        if audio_id in project_by_audio_id:
+            ambiguous.add(audio_id)
+        project_by_audio_id[audio_id] = project_id
+
+    matched = []
+    for (audio_id, prefix), item in parsed:
+        if audio_id not in project_by_audio_id:
+            audio_id = prefix
+        if audio_id in ambiguous:
+            totals["rejected"].append((item[0], "Several AudioFiles have this audio_id"))
+        elif audio_id not in project_by_audio_id:
+            totals["rejected"].append((item[0], "No AudioFile with this audio_id"))
+        else:
+            matched.append((project_by_audio_id[audio_id], item))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(
+        path, "a" if incremental else "w"
+    ) as manifest_file:
+        for start in range(0, len(matched), batch_size):
+            batch = matched[start : start + batch_size]
+            prepared = list(
+                executor.map(lambda args: _prepare_chunk(*args[1]), batch)
+            )
+            for (project_id, _), item in zip(batch, prepared):
+                item["project_id"] = project_id
+            failed = [item for item in prepared if "error" in item]
+            placed = [item for item in prepared if "error" not in item]
+            created, updated, existing = (
+                _upsert_chunks(placed) if placed else (0, 0, 0)
+            )
+            entries = [
+                manifest_entry(item["name"], item["size"], item["mtime_ns"])
+                for item in placed
+            ]
+            append_manifest(manifest_file, entries)
+            manifest.update((entry["name"], entry) for entry in entries)
+
+            totals["created"] += created
+            totals["updated"] += updated
+            totals["existing"] += existing
+            totals["failed"].extend(failed)
+            if on_batch:
+                on_batch(
+                    {
+                        "created": created,
+                        "updated": updated,
+                        "existing": existing,
+                        "failed": failed,
+                        "warnings": [item for item in placed if "warning" in item],
+                    }
+                )
+
+    totals["deleted"] = sorted(set(manifest) - seen)
+    write_manifest(path, manifest)
+    return totals
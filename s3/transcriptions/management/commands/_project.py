@@ -0,0 +1,17 @@
+import uuid
+from django.core.management.base import CommandError
+from transcriptions.models import Project
+
+
+def get_project(value):
+    """The Project named by a ``--project`` option: its unique_id or its name."""
+    try:
+        return Project.objects.get(unique_id=uuid.UUID(value))
+    except ValueError:
+        pass
+    except Project.DoesNotExist:
+        raise CommandError(f"Project with ID {value} not found")
+    try:
+        return Project.objects.get(name=value)
+    except Project.DoesNotExist:
+        raise CommandError(f"Project {value} not found")
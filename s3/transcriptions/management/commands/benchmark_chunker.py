@@ -0,0 +1,44 @@
+import json
+import tempfile
+from django.core.management.base import BaseCommand
+from transcriptions.benchmarks import run_benchmark
+
+DEFAULT_DURATIONS = [60, 600, 3600, 10800]  # 1 minute to 3 hours
+
+
+class Command(BaseCommand):
+    help = "Benchmark the audio chunker on synthetic call audio and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--durations", type=float, nargs="+", default=DEFAULT_DURATIONS, help="Synthetic recording durations in seconds.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic audio.")
+        parser.add_argument("--noise-floor", type=float, default=0.002, help="Standard deviation of the background noise.")
+        parser.add_argument("--repeat", type=int, default=1, help="Runs per duration; the fastest is reported.")
+        parser.add_argument("--streaming", action="store_true", help="Benchmark the streaming block-wise chunker.")
+        parser.add_argument("--workdir", type=str, default=None, help="Keep generated audio here between runs (default: a temporary directory).")
+        parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["workdir"]:
+            report = self.run(kwargs["workdir"], kwargs)
+        else:
+            with tempfile.TemporaryDirectory() as workdir:
+                report = self.run(workdir, kwargs)
+
+        output = json.dumps(report, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ Benchmark report written to {kwargs['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run(self, workdir, options):
+        return run_benchmark(
+            options["durations"],
+            workdir,
+            seed=options["seed"],
+            noise_floor=options["noise_floor"],
+            repeat=options["repeat"],
+            streaming=options["streaming"],
+        )
@@ -0,0 +1,64 @@
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from transcriptions.gpu_stub import STAND_IN_LATENCY
+from transcriptions.pipeline_harness import run_pipeline_load
+
+
+class Command(BaseCommand):
+    help = "Load-test the upload -> preprocess -> approve -> diarize -> chunk pipeline against a local GPU server stand-in and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recordings", type=int, default=100, help="Synthetic recordings to push through the pipeline.")
+        parser.add_argument("--duration", type=float, default=30.0, help="Length of each recording in seconds.")
+        parser.add_argument("--preprocess-latency", type=float, default=STAND_IN_LATENCY["preprocess"], help="Mean seconds per preprocessing job.")
+        parser.add_argument("--diarize-latency", type=float, default=STAND_IN_LATENCY["diarize"], help="Mean seconds per diarization job.")
+        parser.add_argument("--chunk-latency", type=float, default=STAND_IN_LATENCY["chunk"], help="Mean seconds per chunking job.")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of GPU requests answered with HTTP 500.")
+        parser.add_argument("--chunks-per-file", type=int, default=5, help="AudioChunks the stand-in posts back per recording.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent dispatcher requests.")
+        parser.add_argument("--timeout", type=float, default=600.0, help="Give up after this many seconds.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic audio and the stand-in.")
+        parser.add_argument("--user", type=str, default=None, help="Username the API callbacks authenticate as (default: the first superuser).")
+        parser.add_argument("--keep", action="store_true", help="Keep the load-test project, its records and audio.")
+        parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **kwargs):
+        User = get_user_model()
+        if kwargs["user"]:
+            user = User.objects.filter(**{User.USERNAME_FIELD: kwargs["user"]}).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No user to run the load test as; pass --user.")
+
+        report = run_pipeline_load(
+            kwargs["recordings"],
+            user,
+            duration=kwargs["duration"],
+            latency={
+                "preprocess": kwargs["preprocess_latency"],
+                "diarize": kwargs["diarize_latency"],
+                "chunk": kwargs["chunk_latency"],
+            },
+            failure_rate=kwargs["failure_rate"],
+            chunks_per_file=kwargs["chunks_per_file"],
+            dispatch_workers=kwargs["workers"],
+            timeout=kwargs["timeout"],
+            seed=kwargs["seed"],
+            keep=kwargs["keep"],
+            on_progress=self.report,
+        )
+
+        output = json.dumps(report, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {kwargs['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def report(self, done):
+        if done != getattr(self, "done", None):
+            self.done = done
+            self.stderr.write(f"⏱️ {done} recordings through the pipeline")
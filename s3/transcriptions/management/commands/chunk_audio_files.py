@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from transcriptions.utils import process_all_cleaned_audio
+from transcriptions.management.commands._project import get_project
+
+
+class Command(BaseCommand):
+    help = "Split processed audio files into chunks across a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+        parser.add_argument("--project", type=str, default=None, help="Only chunk files of this project (unique_id or name).")
+        parser.add_argument("--limit", type=int, default=None, help="Chunk at most this many files.")
+        parser.add_argument("--streaming", action="store_true", help="Read audio in blocks instead of decoding whole files into memory.")
+        parser.add_argument("--virtual", action="store_true", help="Store chunks as sample ranges of the source file instead of writing WAV files.")
+
+    def handle(self, *args, **kwargs):
+        project = None
+        if kwargs["project"]:
+            project = get_project(kwargs["project"])
+
+        self.done = 0
+        results = process_all_cleaned_audio(
+            workers=kwargs["workers"],
+            project=project,
+            limit=kwargs["limit"],
+            on_result=self.report,
+            streaming=kwargs["streaming"],
+            virtual=kwargs["virtual"],
+        )
+
+        failed = len([r for r in results if r["status"] == "error"])
+        chunks = sum(r.get("chunks", 0) for r in results)
+        summary = f"Chunked {len(results) - failed}/{len(results)} files into {chunks} chunks."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️ {summary} {failed} failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {summary}"))
+
+    def report(self, result):
+        self.done += 1
+        name = result.get("file", result["unique_id"])
+        if result["status"] == "success":
+            self.stdout.write(self.style.SUCCESS(f"[{self.done}] 🔹 {name}: {result['chunks']} chunks in {result['seconds']}s"))
+        else:
+            self.stderr.write(self.style.ERROR(f"[{self.done}] ❌ {name}: {result['message']}"))
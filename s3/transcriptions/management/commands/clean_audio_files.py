@@ -1,99 +1,51 @@
-import os
-import librosa
-import soundfile as sf
-import logging
-from django.core.files import File
 from django.core.management.base import BaseCommand
-from transcriptions.models import AudioFile, cleaned_audio_file
-import hashlib
-import time
-from django.conf import settings
+from transcriptions.cleaning import CLEAN_BATCH_SIZE, CLEAN_LOG_PATH, CLEAN_TOP_DB, clean_all_audio
+from transcriptions.management.commands._project import get_project
 
 
 class Command(BaseCommand):
     help = "Clean saved audio files, remove silences, and save the cleaned versions."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+        parser.add_argument("--project", type=str, default=None, help="Only clean files of this project (unique_id or name).")
+        parser.add_argument("--limit", type=int, default=None, help="Clean at most this many files.")
+        parser.add_argument("--batch-size", type=int, default=CLEAN_BATCH_SIZE, help="Cleaned files committed per transaction.")
+        parser.add_argument("--top-db", type=float, default=CLEAN_TOP_DB, help="Silence threshold in dB below peak for trimming.")
+        parser.add_argument("--resume", action="store_true", help="Continue an interrupted run: keep its log and register outputs it finished but never committed.")
+        parser.add_argument("--log", type=str, default=CLEAN_LOG_PATH, help="JSON lines progress log.")
+
     def handle(self, *args, **kwargs):
-        # Configure logging
-        logging.basicConfig(
-            level=logging.ERROR,
-            format="%(asctime)s - %(levelname)s - %(message)s",
+        project = None
+        if kwargs["project"]:
+            project = get_project(kwargs["project"])
+
+        self.done = 0
+        results = clean_all_audio(
+            workers=kwargs["workers"],
+            project=project,
+            limit=kwargs["limit"],
+            batch_size=kwargs["batch_size"],
+            top_db=kwargs["top_db"],
+            resume=kwargs["resume"],
+            log_path=kwargs["log"],
+            on_result=self.report,
         )
 
-        # Ensure the output directory exists within MEDIA_ROOT
-        output_dir = os.path.join(settings.MEDIA_ROOT, "cleaned-audio")
-        if not os.path.exists(output_dir):
-            try:
-                os.makedirs(output_dir)
-                logging.info(f"Created directory: {output_dir}")
-            except Exception as e:
-                logging.error(f"Failed to create directory {output_dir}: {e}")
-                self.stderr.write(self.style.ERROR(f"⚠️ Failed to create directory {output_dir}: {e}"))
-                return
-
-        # Process each AudioFile instance
-        audio_files = AudioFile.objects.filter(is_cleaned=False)
-
-        if not audio_files.exists():
+        if not results:
             self.stdout.write(self.style.WARNING("⚠️ No audio files to clean."))
             return
 
-        for audio_instance in audio_files:
-            file_path = audio_instance.audio_file.path
-
-            try:
-                # ✅ Load the audio file
-                y, sr = librosa.load(file_path, sr=16000)
-
-                # ✅ Remove silences (example process using librosa.effects.trim)
-                y_cleaned, _ = librosa.effects.trim(y, top_db=20)  # Adjust `top_db` as needed
-
-                # Generate a unique hash-based name
-                hash_seed = f"{file_path}{time.time()}".encode("utf-8")
-                cleaned_file_name = f"{hashlib.sha256(hash_seed).hexdigest()[:16]}.wav"
-
-                # ✅ Save the cleaned audio using soundfile
-                cleaned_file_path = os.path.join(output_dir, cleaned_file_name)
-                sf.write(cleaned_file_path, y_cleaned, sr)  # Save as WAV
-
-                # Open the file for saving in the database
-                with open(cleaned_file_path, "rb") as f:
-                    django_file = File(f)
-
-                    # Save cleaned_audio_file instance (ensures it's saved only once)
-                    cleaned_instance, created = cleaned_audio_file.objects.get_or_create(
-                        audio_file=f"cleaned-audio/{cleaned_file_name}",
-                        defaults={
-                            "file_size": os.path.getsize(cleaned_file_path),
-                            "duration": librosa.get_duration(y=y_cleaned, sr=sr),
-                        },
-                    )
-
-                    # Only save the file to the model if it was newly created
-                    if created:
-                        self.stdout.write(
-                            self.style.SUCCESS(f"🎵 Cleaned audio file saved: {cleaned_file_path}")
-                        )
-                    else:
-                        self.stdout.write(
-                            self.style.WARNING(f"✅ Using existing cleaned audio file: {cleaned_file_path}")
-                        )
-
-                # ✅ Update the original AudioFile instance
-                audio_instance.is_cleaned = True
-                audio_instance.save()
-
-            except Exception as e:
-                logging.error(f"Error cleaning {file_path}: {e}")
-                self.stderr.write(self.style.ERROR(f"⚠️ Error cleaning {file_path}: {e}"))
-
-        self.stdout.write(self.style.SUCCESS("✅ All audio files processed successfully."))
-
-    def get_audio_duration(self, file_path):
-        """Extracts the duration of an audio file."""
-        try:
-            y, sr = librosa.load(file_path, sr=None)  # Load audio with original sampling rate
-            return librosa.get_duration(y=y, sr=sr)  # Calculate duration in seconds
-        except Exception as e:
-            logging.error(f"⚠️ Error extracting duration for {file_path}: {e}")
-            return None  # Return None if duration extraction fails
+        failed = len([r for r in results if r["status"] == "error"])
+        summary = f"Cleaned {len(results) - failed}/{len(results)} audio files (log: {kwargs['log']})."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️ {summary} {failed} failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {summary}"))
+
+    def report(self, result):
+        self.done += 1
+        if result["status"] == "success":
+            self.stdout.write(self.style.SUCCESS(f"[{self.done}] 🎵 Cleaned audio file saved: {result['processed_file']} ({result['seconds']}s)"))
+        else:
+            self.stderr.write(self.style.ERROR(f"[{self.done}] ⚠️ Error cleaning {result['unique_id']}: {result['message']}"))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from transcriptions.http_client import latency_stats
+from transcriptions.dispatch import (
+    GPU_DISPATCH_BATCH_SIZE,
+    GPU_DISPATCH_MAX_ATTEMPTS,
+    GPU_DISPATCH_WORKERS,
+    backfill_preprocessing,
+    queue_depth,
+    requeue_dead,
+    run_dispatcher,
+)
+
+
+class Command(BaseCommand):
+    help = "Send queued preprocessing, diarization and chunking requests to the GPU server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=GPU_DISPATCH_WORKERS, help="Concurrent requests to the GPU server.")
+        parser.add_argument("--batch-size", type=int, default=GPU_DISPATCH_BATCH_SIZE, help="Outbox rows claimed at a time.")
+        parser.add_argument("--max-attempts", type=int, default=GPU_DISPATCH_MAX_ATTEMPTS, help="Attempts before a request is dead-lettered.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when nothing is due.")
+        parser.add_argument("--once", action="store_true", help="Exit once nothing is due instead of polling.")
+        parser.add_argument("--requeue-dead", action="store_true", help="Retry dead-lettered requests before dispatching.")
+        parser.add_argument("--backfill", action="store_true", help="Queue preprocessing, at backfill priority, for unprocessed audio files that were never queued.")
+        parser.add_argument("--status", action="store_true", help="Print the queue depth per stage and exit.")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["status"]:
+            for stage, depth in queue_depth().items():
+                self.stdout.write(f"📊 {stage}: {depth['pending']} pending ({depth['due']} due), {depth['in_flight']}/{depth['limit']} in flight, {depth['dead']} dead")
+            return
+
+        if kwargs["backfill"]:
+            count = backfill_preprocessing()
+            self.stdout.write(self.style.SUCCESS(f"📥 Queued preprocessing for {count} audio files."))
+
+        if kwargs["requeue_dead"]:
+            count = requeue_dead()
+            self.stdout.write(self.style.WARNING(f"🔁 Requeued {count} dead requests."))
+
+        try:
+            run_dispatcher(
+                workers=kwargs["workers"],
+                batch_size=kwargs["batch_size"],
+                max_attempts=kwargs["max_attempts"],
+                poll_interval=kwargs["poll_interval"],
+                once=kwargs["once"],
+                on_result=self.report,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("⏹️ Dispatcher stopped."))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Outbox drained."))
+
+        for host, stats in latency_stats().items():
+            self.stdout.write(f"📈 {host}: {stats['calls']} calls, {stats['errors']} errors, p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, max {stats['max_ms']} ms")
+
+    def report(self, dispatch, outcome, error):
+        if outcome == "sent":
+            self.stdout.write(self.style.SUCCESS(f"🚀 {dispatch.dedup_key} sent"))
+        elif outcome == "throttled":
+            self.stderr.write(self.style.WARNING(f"⏸️ {dispatch.dedup_key} deferred, GPU server busy: {error}"))
+        elif outcome == "retry":
+            self.stderr.write(self.style.WARNING(f"⚠️ {dispatch.dedup_key} will be retried: {error}"))
+        else:
+            self.stderr.write(self.style.ERROR(f"❌ {dispatch.dedup_key} dead-lettered: {error}"))
@@ -1,56 +1,43 @@
-import csv
-from datetime import datetime
+import os
 from django.core.management.base import BaseCommand
-from transcriptions.models import AudioFile, CaseRecord
-from django.utils.timezone import make_aware
+from transcriptions.case_import import CASE_IMPORT_BATCH_SIZE, import_case_records
+from transcriptions.management.commands._project import get_project
 
 class Command(BaseCommand):
     help = 'Import data from a CSV file into the CaseRecord model'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='The path to the CSV file to import.')
+        parser.add_argument('--batch-size', type=int, default=CASE_IMPORT_BATCH_SIZE, help='Rows imported per transaction.')
+        parser.add_argument('--rejects', type=str, default=None, help='Where to write rows that could not be imported (default: <csv_file>.rejects.csv).')
+        parser.add_argument('--project', type=str, default=None, help='Only match audio files of this project (unique_id or name).')
 
     def handle(self, *args, **kwargs):
         csv_file_path = kwargs['csv_file']
+        rejects_path = kwargs['rejects'] or f"{os.path.splitext(csv_file_path)[0]}.rejects.csv"
+        project = get_project(kwargs['project']) if kwargs['project'] else None
 
         try:
-            with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile, delimiter=',')  # Use correct delimiter
-                for row in reader:
-                    try:
-                        # Retrieve the AudioFile instance by audio_id
-                        audio_file = AudioFile.objects.get(audio_id=row['UNIQUEID'])
-
-                        # Check if CaseRecord exists for this audio file and update it, else create a new record
-                        raw_data, created = CaseRecord.objects.update_or_create(
-                            audio_id=audio_file,
-                            defaults={
-                                'date': make_aware(datetime.strptime(row['DATE'], '%d %b %Y %H:%M')),  # Add time zone awareness
-                                'talk_time': datetime.strptime(row['TALKTIME'], '%H:%M').time(),
-                                'case_id': int(row['CASEID']),
-                                'narrative': row['NARRATIVE'],
-                                'plan': row['PLAN'],
-                                'main_category': row['MAIN CATEGORY'],
-                                'sub_category': row['SUB CATEGORY'],
-                                'gbv': row['GBV'].strip().lower() == 'yes',  # Convert to boolean
-                            }
-                        )
-
-                        if created:
-                            self.stdout.write(self.style.SUCCESS(f"Created CaseRecord for audio_id {row['UNIQUEID']}"))
-                        else:
-                            self.stdout.write(self.style.SUCCESS(f"Updated CaseRecord for audio_id {row['UNIQUEID']}"))
-
-                    except AudioFile.DoesNotExist:
-                        self.stderr.write(self.style.ERROR(f"AudioFile with audio_id {row['UNIQUEID']} does not exist. Skipping."))
-                    except Exception as e:
-                        self.stderr.write(self.style.ERROR(f"Error saving CaseRecord for audio_id {row['UNIQUEID']}: {e}"))
-
-            self.stdout.write(self.style.SUCCESS(f"Data imported successfully from {csv_file_path}"))
+            self.rows = 0
+            totals = import_case_records(
+                csv_file_path,
+                rejects_path,
+                project=project,
+                batch_size=kwargs['batch_size'],
+                on_batch=self.report,
+            )
+
+            summary = f"{totals['created']} created, {totals['updated']} updated, {totals['rejected']} rejected"
+            if totals['rejected']:
+                self.stdout.write(self.style.WARNING(f"Data imported from {csv_file_path}: {summary}. Rejected rows written to {rejects_path}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Data imported successfully from {csv_file_path}: {summary}"))
 
         except FileNotFoundError:
             self.stderr.write(self.style.ERROR(f"File not found: {csv_file_path}"))
-        except KeyError as e:
-            self.stderr.write(self.style.ERROR(f"Missing column in CSV file: {e}"))
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f"An error occurred: {e}"))
\ No newline at end of file
+            self.stderr.write(self.style.ERROR(f"An error occurred: {e}"))
+
+    def report(self, batch):
+        self.rows += batch['rows']
+        self.stdout.write(self.style.SUCCESS(f"Imported {self.rows} rows ({batch['created']} created, {batch['updated']} updated, {batch['rejected']} rejected in this batch)"))
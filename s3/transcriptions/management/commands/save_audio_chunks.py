@@ -1,15 +1,18 @@
 import os
-import re
-import librosa
-from django.core.files import File
 from django.core.management.base import BaseCommand
-from transcriptions.models import AudioFile, AudioFileChunk
+from transcriptions.ingest import INGEST_BATCH_SIZE, INGEST_WORKERS, register_chunk_directory
+from transcriptions.management.commands._project import get_project
 
 class Command(BaseCommand):
     help = "Save audio file chunks to the FileField with metadata (duration)."
 
     def add_arguments(self, parser):
         parser.add_argument("directory", type=str, help="The directory containing chunked audio files.")
+        parser.add_argument("--project", type=str, default=None, help="Only match parent audio files of this project (unique_id or name).")
+        parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Threads reading chunk durations.")
+        parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Rows upserted per transaction.")
+        parser.add_argument("--full", action="store_true", help="Ignore the manifest of earlier runs and save every chunk again.")
+        parser.add_argument("--report-deletions", action="store_true", help="List chunks saved earlier that are no longer in the directory.")
 
     def handle(self, *args, **kwargs):
         directory = kwargs["directory"]
@@ -18,68 +21,37 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"❌ Directory not found: {directory}"))
             return
 
-        for filename in sorted(os.listdir(directory)):  # Sort to maintain order
-            if filename.endswith(".wav"):
-                file_path = os.path.join(directory, filename)
-
-                # ✅ Debug: Print filename before matching
-                print(f"🔍 Checking filename: {filename}")
-
-                # ✅ Try multiple regex formats
-                match = re.match(r"^(?P<unique_id>[\d.]+)_chunk_(?P<order>\d+)\.wav$", filename)
-                
-                if match:
-                    unique_id = match.group("unique_id")
-                    chunk_order = int(match.group("order"))  # Convert chunk number to integer
-                    print(f"✅ Matched! Unique ID: {unique_id}, Chunk Order: {chunk_order}")
-                else:
-                    print(f"❌ No match for filename: {filename}")
-                    continue  # Skip this file
-
-                try:
-                    # ✅ Find the parent `AudioFile`
-                    parent_audio = AudioFile.objects.filter(unique_id=unique_id).first()
-                    if not parent_audio:
-                        self.stderr.write(self.style.ERROR(f"No matching AudioFile for {unique_id}, skipping {filename}"))
-                        continue
-
-                    # ✅ Extract metadata
-                    duration = self.get_audio_duration(file_path)
-
-                    # ✅ Check if chunk already exists
-                    chunk_instance, created = AudioFileChunk.objects.get_or_create(
-                        parent_audio=parent_audio,
-                        order=chunk_order,
-                        defaults={"chunk_file": file_path, "duration": duration}  # ✅ Ensure metadata is saved
-                    )
-
-                    # ✅ Open the file properly before saving
-                    with open(file_path, "rb") as f:
-                        django_file = File(f)
-                        chunk_instance.chunk_file.save(filename, django_file, save=True)
-
-                    # ✅ Update duration if missing
-                    if not created and chunk_instance.duration is None:
-                        chunk_instance.duration = duration
-                        chunk_instance.save()
-
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f"🔹 New chunk saved: {filename} (Duration: {duration:.2f}s)"))
-                    else:
-                        self.stdout.write(self.style.WARNING(f"⚠️ Using existing chunk: {filename} (Updated duration if missing)"))
-
-                except Exception as e:
-                    import traceback
-                    error_details = traceback.format_exc()
-                    self.stderr.write(self.style.ERROR(f"❌ Error saving file {filename}: {e}\n{error_details}"))
-
-        self.stdout.write(self.style.SUCCESS("✅ All audio chunks processed successfully."))
-
-    def get_audio_duration(self, file_path):
-        """Extracts the duration of an audio file chunk."""
-        try:
-            y, sr = librosa.load(file_path, sr=None)  # Load audio with original sampling rate
-            return librosa.get_duration(y=y, sr=sr)  # Calculate duration in seconds
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"⚠️ Error extracting duration for {file_path}: {e}"))
-            return None  # Return None if duration extraction fails
+        project = None
+        if kwargs["project"]:
+            project = get_project(kwargs["project"])
+
+        self.done = 0
+        totals = register_chunk_directory(
+            directory,
+            project=project,
+            workers=kwargs["workers"],
+            batch_size=kwargs["batch_size"],
+            incremental=not kwargs["full"],
+            on_batch=self.report,
+        )
+
+        for name, reason in totals["rejected"]:
+            self.stderr.write(self.style.ERROR(f"❌ Skipping {name}: {reason}"))
+        if kwargs["report_deletions"]:
+            for name in totals["deleted"]:
+                self.stdout.write(self.style.WARNING(f"🗑️ No longer in directory: {name}"))
+
+        summary = f"{totals['created']} new, {totals['updated']} updated, {totals['existing']} already saved, {totals['unchanged']} unchanged, {len(totals['deleted'])} deleted"
+        problems = len(totals["rejected"]) + len(totals["failed"])
+        if problems:
+            self.stdout.write(self.style.WARNING(f"⚠️ Audio chunks processed: {summary}, {problems} skipped or failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ All audio chunks processed successfully: {summary}."))
+
+    def report(self, batch):
+        self.done += batch["created"] + batch["updated"] + batch["existing"]
+        for item in batch["warnings"]:
+            self.stderr.write(self.style.WARNING(f"⚠️ {item['name']}: {item['warning']}"))
+        for item in batch["failed"]:
+            self.stderr.write(self.style.ERROR(f"❌ Error saving file {item['name']}: {item['error']}"))
+        self.stdout.write(self.style.SUCCESS(f"🔹 Batch saved: {batch['created']} new, {batch['updated']} updated ({self.done} so far)"))
@@ -1,14 +1,21 @@
 import os
-import librosa
-from django.core.files import File
 from django.core.management.base import BaseCommand
-from transcriptions.models import AudioFile
+from transcriptions.ingest import INGEST_BATCH_SIZE, INGEST_WORKERS, ingest_audio_directory
+from transcriptions.management.commands._project import get_project
 
 class Command(BaseCommand):
     help = "Save audio files to the FileField with metadata (duration & file size)."
 
     def add_arguments(self, parser):
         parser.add_argument("directory", type=str, help="The directory containing audio files to save.")
+        parser.add_argument("--project", type=str, required=True, help="Project the files belong to (unique_id or name).")
+        parser.add_argument("--extensions", type=str, nargs="+", default=[".wav"], help="File extensions to ingest.")
+        parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Threads probing and placing files.")
+        parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Rows upserted per transaction.")
+        parser.add_argument("--move", action="store_true", help="Move files into MEDIA_ROOT instead of hard-linking them.")
+        parser.add_argument("--full", action="store_true", help="Ignore the manifest of earlier runs and ingest every file again.")
+        parser.add_argument("--hash", action="store_true", help="Record content hashes and skip files that were touched but not modified.")
+        parser.add_argument("--report-deletions", action="store_true", help="List files ingested earlier that are no longer in the directory.")
 
     def handle(self, *args, **kwargs):
         directory = kwargs["directory"]
@@ -17,51 +24,36 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"❌ Directory not found: {directory}"))
             return
 
-        for filename in os.listdir(directory):
-            if filename.endswith(".wav"):
-                file_path = os.path.join(directory, filename)
-                audio_id = os.path.splitext(filename)[0]  # Extract filename without extension
-
-                try:
-                    # ✅ Extract metadata
-                    duration = self.get_audio_duration(file_path)
-                    file_size = os.path.getsize(file_path)  # File size in bytes
-
-                    # ✅ Check if the file already exists
-                    audio_file_instance, created = AudioFile.objects.get_or_create(
-                        audio_id=audio_id,
-                        defaults={"duration": duration, "file_size": file_size}  # ✅ Set metadata
-                    )
-
-                    # ✅ If file exists but metadata is missing, update it
-                    if not created:
-                        if audio_file_instance.duration is None:
-                            audio_file_instance.duration = duration
-                        if audio_file_instance.file_size is None:
-                            audio_file_instance.file_size = file_size
-
-                    # ✅ Save the file to the FileField (filesystem)
-                    with open(file_path, "rb") as f:
-                        django_file = File(f)
-                        audio_file_instance.audio_file.save(filename, django_file, save=True)
-
-                    audio_file_instance.save()  # ✅ Ensure metadata is saved
-
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f"🎵 New audio file saved: {filename} (Duration: {duration:.2f}s, Size: {file_size} bytes)"))
-                    else:
-                        self.stdout.write(self.style.WARNING(f"✅ Using existing audio file: {filename} (Updated metadata if needed)"))
-
-                except Exception as e:
-                    self.stderr.write(self.style.ERROR(f"❌ Error saving file {filename}: {e}"))
-
-        self.stdout.write(self.style.SUCCESS("✅ All audio files processed successfully."))
-
-    def get_audio_duration(self, file_path):
-        """Extracts the duration of an audio file."""
-        try:
-            y, sr = librosa.load(file_path, sr=None)  # Load audio with original sampling rate
-            return librosa.get_duration(y=y, sr=sr)  # Calculate duration in seconds
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"⚠️ Error extracting duration for {file_path}: {e}"))
-            return None  # Return None if duration extraction fails
+        project = get_project(kwargs["project"])
+        extensions = tuple(ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in kwargs["extensions"])
+
+        self.done = 0
+        totals = ingest_audio_directory(
+            directory,
+            project,
+            extensions=extensions,
+            move=kwargs["move"],
+            workers=kwargs["workers"],
+            batch_size=kwargs["batch_size"],
+            incremental=not kwargs["full"],
+            with_hash=kwargs["hash"],
+            on_batch=self.report,
+        )
+
+        if kwargs["report_deletions"]:
+            for name in totals["deleted"]:
+                self.stdout.write(self.style.WARNING(f"🗑️ No longer in directory: {name}"))
+
+        summary = f"{totals['created']} new, {totals['updated']} updated, {totals['unchanged']} unchanged, {len(totals['deleted'])} deleted"
+        if totals["failed"]:
+            self.stdout.write(self.style.WARNING(f"⚠️ Audio files processed: {summary}, {len(totals['failed'])} failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ All audio files processed successfully: {summary}."))
+
+    def report(self, batch):
+        self.done += batch["created"] + batch["updated"]
+        for item in batch["warnings"]:
+            self.stderr.write(self.style.WARNING(f"⚠️ {item['name']}: {item['warning']}"))
+        for item in batch["failed"]:
+            self.stderr.write(self.style.ERROR(f"❌ Error saving file {item['name']}: {item['error']}"))
+        self.stdout.write(self.style.SUCCESS(f"🎵 Batch saved: {batch['created']} new, {batch['updated']} updated ({self.done} so far)"))
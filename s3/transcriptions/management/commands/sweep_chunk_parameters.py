@@ -0,0 +1,62 @@
+import itertools
+import json
+from django.core.management.base import BaseCommand, CommandError
+from transcriptions.utils import sweep_processed_audio
+from transcriptions.management.commands._project import get_project
+
+
+class Command(BaseCommand):
+    help = "Dry-run chunking parameter combinations over processed audio files and report chunk statistics as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-chunk-ms", type=int, nargs="+", default=[3000], help="Minimum chunk lengths to try.")
+        parser.add_argument("--max-chunk-ms", type=int, nargs="+", default=[7000], help="Maximum chunk lengths to try.")
+        parser.add_argument("--frame-ms", type=int, nargs="+", default=[30], help="Frame lengths to try.")
+        parser.add_argument("--overlap-ms", type=int, nargs="+", default=[2000], help="Chunk overlaps to try.")
+        parser.add_argument("--project", type=str, default=None, help="Only sweep files of this project (unique_id or name).")
+        parser.add_argument("--limit", type=int, default=None, help="Sweep at most this many files.")
+        parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+        parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument("--use-cache", action="store_true", help="Read and fill the PCM and frame feature caches, so a later chunking run can reuse them (writes to disk).")
+
+    def handle(self, *args, **kwargs):
+        # Every combination of the given values is one configuration.
+        configs = [
+            {
+                "min_chunk_length_ms": min_ms,
+                "max_chunk_length_ms": max_ms,
+                "frame_length_ms": frame_ms,
+                "overlap_ms": overlap_ms,
+            }
+            for min_ms, max_ms, frame_ms, overlap_ms in itertools.product(
+                kwargs["min_chunk_ms"], kwargs["max_chunk_ms"], kwargs["frame_ms"], kwargs["overlap_ms"]
+            )
+            if min_ms <= max_ms
+        ]
+        if not configs:
+            raise CommandError("No configuration has min-chunk-ms <= max-chunk-ms")
+
+        project = None
+        if kwargs["project"]:
+            project = get_project(kwargs["project"])
+
+        report = sweep_processed_audio(
+            configs,
+            project=project,
+            limit=kwargs["limit"],
+            workers=kwargs["workers"],
+            on_result=self.report,
+            use_cache=kwargs["use_cache"],
+        )
+
+        output = json.dumps(report, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"✅ Swept {len(configs)} configurations over {report['files']} files; report written to {kwargs['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def report(self, result):
+        if result["status"] != "success":
+            self.stderr.write(self.style.ERROR(f"❌ {result['unique_id']}: {result['message']}"))
@@ -50,7 +50,14 @@ class AudioFile(BaseModel):
     audio_file = models.FileField(upload_to='raw/')
     file_size = models.PositiveIntegerField(null=True)
     duration = models.FloatField(null=True)
+    # Set once the GPU server accepts the preprocess job (dispatch.mark_sent)
     is_processed = models.BooleanField(default=False)
+    # Set by the local clean_audio_files pass (see cleaning.save_cleaned_files)
+    is_cleaned = models.BooleanField(default=False)
+
+    class Meta:
+        # Keyset pagination within a project, see pagination.KeysetPagination
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
 
     def __str__(self):
         return self.audio_id
@@ -80,6 +87,9 @@ class ProcessedAudioFile(BaseModel):
     duration = models.FloatField(null=True)
     is_approved = models.BooleanField(default=False)
     is_disapproved = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
     
     @property
     def full_path(self):
@@ -114,6 +124,9 @@ class CaseRecord(BaseModel):
     sub_category = models.CharField(max_length=100)
     gbv = models.BooleanField()
 
+    class Meta:
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
+
     def __str__(self):
         return f"Case {self.case_id} - {self.main_category}"
     
@@ -130,7 +143,10 @@ class DiarizedAudioFile(BaseModel):
     diarization_result_json_path = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField(null=True)
     duration = models.FloatField(null=True)
-    
+
+    class Meta:
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
+
     @property
     def full_path(self):
         """Return the full path on the S3 server"""
@@ -201,16 +217,34 @@ class AudioChunk(BaseModel):
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, default="not_sure")
     locale = models.CharField(max_length=5, choices=LOCALE_CHOICES, default="EN")
 
+    # Virtual chunks have no chunk_file of their own: they are a sample range
+    # of source_file (relative to MEDIA_ROOT) at sample_rate, read on demand.
+    source_file = models.CharField(max_length=500, blank=True, null=True)
+    sample_rate = models.PositiveIntegerField(null=True, blank=True)
+    start_sample = models.BigIntegerField(null=True, blank=True)
+    num_samples = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
+
+    @property
+    def is_virtual(self):
+        return bool(self.source_file) and not self.chunk_file
     
     @property
     def full_path(self):
         """Return the full path on the S3 server"""
+        # A virtual chunk's audio is a range of its source file
+        if self.is_virtual:
+            return os.path.join('shared', self.source_file)
         return os.path.join('shared', self.chunk_file)
     
     @property
     def gpu_path(self):
         """Return the full path on the GPU server"""
         # Path for GPU server uses a different mount point (/mnt/shared)
+        if self.is_virtual:
+            return os.path.join('/mnt/shared', self.source_file)
         return os.path.join('/mnt/shared', self.chunk_file)
 
 class EvaluationResults(BaseModel):
@@ -235,34 +269,120 @@ class EvaluationResults(BaseModel):
 
     class Meta:
         unique_together = ("audiofilechunk", "created_by")
+        indexes = [models.Index(fields=["project", "created_at", "unique_id"])]
 
-# Asynchronous task tracking
-# class ProcessingTask(BaseModel):
-#     project = models.ForeignKey(
-#         Project,
-#         on_delete=models.CASCADE,
-#         related_name="processing_tasks",
-#     )
-#     TASK_TYPES = [
-#         ('PREPROCESS', 'Audio Preprocessing'),
-#         ('DIARIZE', 'Speaker Diarization'),
-#         ('CHUNK', 'Audio Chunking'),
-#     ]
-    
-#     STATUS_CHOICES = [
-#         ('PENDING', 'Pending'),
-#         ('PROCESSING', 'Processing'),
-#         ('COMPLETED', 'Completed'),
-#         ('FAILED', 'Failed'),
-#     ]
-    
-#     # Store the audio_id as a string reference without direct FK relationship
-#     audio_id = models.CharField(max_length=50)
-#     task_type = models.CharField(max_length=20, choices=TASK_TYPES)
-#     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
-#     error_message = models.TextField(null=True, blank=True)
-#     result_path = models.CharField(max_length=255, null=True, blank=True)
-    
-#     # Add timestamps for tracking task progress
-#     started_at = models.DateTimeField(null=True, blank=True)
-#     completed_at = models.DateTimeField(null=True, blank=True)
\ No newline at end of file
+# Cached outcome of chunking one processed file with one set of parameters.
+# Chunks are referenced by id only, so AudioChunk itself keeps no link back
+# to the source recording.
+class ChunkingResult(BaseModel):
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="chunking_results",
+    )
+    # sha256 over project, content hash, parameters and algorithm version
+    cache_key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    parameters = models.JSONField()
+    algorithm_version = models.CharField(max_length=20)
+    boundaries = models.JSONField()
+    chunk_ids = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {len(self.chunk_ids)} chunks"
+
+# Outbox of requests to the GPU server. Rows are written with the save that
+# triggers them and sent by the dispatch_gpu_jobs worker.
+class GpuDispatch(BaseModel):
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="gpu_dispatches",
+    )
+    STAGE_CHOICES = [
+        ("preprocess", "Audio Preprocessing"),
+        ("diarize", "Speaker Diarization"),
+        ("chunk", "Audio Chunking"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("in_flight", "In Flight"),
+        ("sent", "Sent"),
+        ("dead", "Dead"),
+    ]
+
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    # e.g. "preprocess:<AudioFile id>"; a second request for the same work is dropped
+    dedup_key = models.CharField(max_length=255, unique=True)
+    # The AudioFile, ProcessedAudioFile or DiarizedAudioFile the request is for
+    source_id = models.UUIDField()
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    # Lower goes first, e.g. approvals before bulk backfills
+    priority = models.SmallIntegerField(default=50)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    # A claimed row whose lease ran out (crashed dispatcher) is claimed again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set when the GPU server reports the job finished; until then an
+    # accepted job holds one of its stage's slots
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "stage", "priority", "next_attempt_at"]),
+            models.Index(fields=["stage", "status", "completed_at", "sent_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.dedup_key} ({self.status})"
+
+# Asynchronous task tracking: one row per recording and pipeline stage
+class ProcessingTask(BaseModel):
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="processing_tasks",
+    )
+    TASK_TYPES = [
+        ('PREPROCESS', 'Audio Preprocessing'),
+        ('REVIEW', 'Approval'),
+        ('DIARIZE', 'Speaker Diarization'),
+        ('CHUNK', 'Audio Chunking'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    # Store the audio_id as a string reference without direct FK relationship
+    # (the file name stem, which every stage keeps)
+    audio_id = models.CharField(max_length=255, db_index=True)
+    # The AudioFile, ProcessedAudioFile or DiarizedAudioFile the task works on
+    source_id = models.UUIDField()
+    task_type = models.CharField(max_length=20, choices=TASK_TYPES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    error_message = models.TextField(null=True, blank=True)
+    result_path = models.CharField(max_length=255, null=True, blank=True)
+
+    # Add timestamps for tracking task progress: created_at is when the task
+    # was queued, dispatched_at when the GPU server accepted it
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "task_type", "status"]),
+            models.Index(fields=["task_type", "source_id"]),
+            models.Index(fields=["task_type", "completed_at"]),
+            models.Index(fields=["project", "created_at", "unique_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task_type} {self.audio_id} ({self.status})"
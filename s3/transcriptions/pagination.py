@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+import operator
+from datetime import datetime
+from functools import reduce
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Upper bound for ?page_size=
+API_MAX_PAGE_SIZE = getattr(settings, "API_MAX_PAGE_SIZE", 1000)
+
+
+def _value(row, field):
+    """``field`` of a model instance or of a ``.values()`` row."""
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on an indexed key, by default ``(created_at,
+    unique_id)``, newest first.
+
+    A page is fetched with ``WHERE key < cursor ORDER BY key LIMIT n``, so
+    its cost does not depend on how deep into the table it is, and rows
+    inserted meanwhile neither repeat nor skip rows. The key must be unique;
+    a view can page on another one by setting ``keyset`` to field names,
+    all ``-``-prefixed for descending or none. ``?page_size=`` is capped at
+    API_MAX_PAGE_SIZE. The response is ``{"next", "previous", "results"}``
+    with ready-made URLs.
+    """
+
+    keyset = ("-created_at", "-unique_id")
+    page_size = api_settings.PAGE_SIZE or 100
+    page_size_query_param = "page_size"
+    max_page_size = API_MAX_PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        """``(key values, reverse)`` from the request's cursor, or ``(None, False)``."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            # Cursors are sent without their base64 padding.
+            padded = encoded + "=" * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            values, reverse = cursor["k"], bool(cursor.get("r"))
+        except (binascii.Error, KeyError, TypeError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, row, reverse):
+        cursor = {"k": [_encode_value(_value(row, field)) for field in self.fields]}
+        if reverse:
+            cursor["r"] = True
+        # Without the "=" padding the cursor needs no escaping in a URL.
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode("ascii")).rstrip(b"=")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def after(self, values, descending):
+        """Rows strictly after ``values`` in key order: a row-value comparison."""
+        lookup = "lt" if descending else "gt"
+        return reduce(
+            operator.or_,
+            (
+                Q(
+                    **dict(zip(self.fields[:i], values[:i])),
+                    **{f"{field}__{lookup}": values[i]},
+                )
+                for i, field in enumerate(self.fields)
+            ),
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = getattr(view, "keyset", self.keyset)
+        self.fields = [field.lstrip("-") for field in keyset]
+        descending = keyset[0].startswith("-")
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+
+        # A previous page is read backwards from the cursor, then flipped.
+        backwards = descending != reverse
+        queryset = queryset.order_by(
+            *(f"-{field}" if backwards else field for field in self.fields)
+        )
+        if values is not None:
+            queryset = queryset.filter(self.after(values, backwards))
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next = self.previous = None
+        if rows:
+            if has_more or reverse:
+                self.next = self.encode_cursor(rows[-1], reverse=False)
+            if values is not None and (has_more or not reverse):
+                self.previous = self.encode_cursor(rows[0], reverse=True)
+        elif reverse:
+            self.next = remove_query_param(self.base_url, self.cursor_query_param)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.next, "previous": self.previous, "results": data}
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import librosa
+import numpy as np
+from django.conf import settings
+
+PCM_SAMPLE_RATE = 16000
+PCM_CACHE_DIR = getattr(
+    settings, "PCM_CACHE_DIR", os.path.join(settings.MEDIA_ROOT, "cache", "pcm")
+)
+PCM_CACHE_MAX_BYTES = getattr(settings, "PCM_CACHE_MAX_BYTES", 50 * 1024**3)
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hex sha256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _index_path(path):
+    digest = hashlib.sha1(os.path.realpath(path).encode("utf-8")).hexdigest()
+    return os.path.join(PCM_CACHE_DIR, "index", f"{digest}.json")
+
+
+def content_hash(path):
+    """
+    sha256 of a file's content, remembered per (path, size, mtime) so an
+    unchanged file is only hashed once.
+    """
+    stat = os.stat(path)
+    index_path = _index_path(path)
+    try:
+        with open(index_path) as f:
+            entry = json.load(f)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = file_sha256(path)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}, f
+        )
+    os.replace(tmp_path, index_path)
+    return digest
+
+
+def pcm_cache_path(path, sr=PCM_SAMPLE_RATE):
+    return os.path.join(PCM_CACHE_DIR, f"{content_hash(path)}_{sr}.npy")
+
+
+def _decode_to_npy(path, sr, npy_path):
+    """
+    Decode ``path`` to mono float32 at ``sr`` into a .npy file, block by
+    block, and return it memory-mapped.
+
+    The file is mapped before it is renamed into place, so the map stays
+    valid even if another process evicts the entry straight away.
+    """
+    from transcriptions.utils import iter_audio_blocks, streamed_length
+
+    tmp_path = f"{npy_path}.{os.getpid()}.tmp.npy"
+    try:
+        try:
+            n_samples = streamed_length(path, sr)
+            pcm = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.float32, shape=(n_samples,)
+            )
+            position = 0
+            for block in iter_audio_blocks(path, sr):
+                pcm[position : position + len(block)] = block
+                position += len(block)
+            pcm.flush()
+            del pcm
+        except RuntimeError:
+            # Formats soundfile cannot read go through librosa's audioread fallback.
+            y, _ = librosa.load(path, sr=sr)
+            np.save(tmp_path, y)
+        pcm = np.load(tmp_path, mmap_mode="r")
+        os.replace(tmp_path, npy_path)
+    finally:
+        # Only left over when decoding failed.
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return pcm
+
+
+def load_pcm(path, sr=PCM_SAMPLE_RATE):
+    """
+    Mono float32 samples of ``path`` at ``sr`` as a read-only memory map.
+
+    The first call decodes the file into the cache; later calls from any
+    process map the cached samples without decoding or copying. The samples
+    are the ones ``librosa.load(path, sr=sr)`` returns.
+    """
+    npy_path = pcm_cache_path(path, sr)
+    try:
+        # The modification time doubles as the LRU timestamp.
+        os.utime(npy_path)
+        return np.load(npy_path, mmap_mode="r")
+    except FileNotFoundError:
+        # Not cached yet, or evicted by another process since.
+        pass
+    os.makedirs(PCM_CACHE_DIR, exist_ok=True)
+    pcm = _decode_to_npy(path, sr, npy_path)
+    evict_pcm_cache(keep=(npy_path,))
+    return pcm
+
+
+def evict_pcm_cache(max_bytes=PCM_CACHE_MAX_BYTES, keep=()):
+    """
+    Delete least recently used entries until the cache fits in ``max_bytes``,
+    sparing the paths in ``keep`` (e.g. the entry just written, even when it
+    alone is larger than that).
+    """
+    entries = []
+    with os.scandir(PCM_CACHE_DIR) as it:
+        for entry in it:
+            if (
+                entry.is_file()
+                and entry.name.endswith(".npy")
+                and ".tmp" not in entry.name
+            ):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry_path in keep:
+            continue
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        total -= size
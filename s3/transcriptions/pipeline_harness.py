@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import uuid
+import soundfile as sf
+from django.conf import settings
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+    get_internal_wsgi_application,
+)
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from transcriptions import dispatch
+from transcriptions.benchmarks import synthetic_call
+from transcriptions.gpu_stub import GpuServerStandIn
+from transcriptions.models import AudioFile, ProcessedAudioFile, Project
+from transcriptions.tracking import percentiles, stage_timings
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_api():
+    """Serve this Django project on a free local port from a background thread."""
+    server = ThreadedWSGIServer(("127.0.0.1", 0), _QuietRequestHandler)
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run_dispatcher(stop, workers):
+    try:
+        dispatch.run_dispatcher(workers=workers, poll_interval=0.05, stop=stop)
+    finally:
+        connection.close()
+
+
+def run_pipeline_load(
+    recordings,
+    user,
+    duration=30.0,
+    latency=None,
+    failure_rate=0.0,
+    chunks_per_file=5,
+    dispatch_workers=8,
+    timeout=600.0,
+    seed=0,
+    keep=False,
+    on_progress=None,
+):
+    """
+    Drive ``recordings`` synthetic recordings of ``duration`` seconds through
+    upload -> preprocess -> approve -> diarize -> chunk against a local
+    GpuServerStandIn, and report per-stage latency percentiles and
+    throughput, next to the ProcessingTask timings (``tracked``) the
+    stand-in's status reports produced.
+
+    Everything runs in this process: the API the stand-in calls back, the
+    outbox dispatcher, and the reviewer, which approves every processed file
+    as soon as it appears. Recordings are uploaded into a new project that is
+    deleted afterwards unless ``keep``. ``on_progress`` gets a count of
+    finished recordings now and then.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    project = Project.objects.create(name=f"load-test-{run_id}", created_by=user)
+    # The stand-in calls back on 127.0.0.1, which production does not allow.
+    local_host = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "127.0.0.1"])
+    local_host.enable()
+    api = serve_api()
+    host, port = api.server_address[:2]
+    stand_in = GpuServerStandIn(
+        callback_url=f"http://{host}:{port}/api/transcriptions",
+        token=str(RefreshToken.for_user(user).access_token),
+        latency=latency,
+        failure_rate=failure_rate,
+        chunks_per_file=chunks_per_file,
+        seed=seed,
+    ).start()
+    original_urls = dict(dispatch.STAGE_URLS)
+    dispatch.STAGE_URLS.update(stand_in.urls())
+    stop = threading.Event()
+    dispatcher = threading.Thread(target=_run_dispatcher, args=(stop, dispatch_workers))
+
+    # Recordings are followed by stem: the stand-in keeps it in every output.
+    uploaded, approved = {}, {}
+    written = []
+    try:
+        dispatcher.start()
+        raw_dir = os.path.join(settings.MEDIA_ROOT, "raw")
+        os.makedirs(raw_dir, exist_ok=True)
+        started = time.time()
+        for i in range(recordings):
+            stem = f"loadtest_{run_id}_{i:05d}"
+            path = os.path.join(raw_dir, f"{stem}.wav")
+            sf.write(path, synthetic_call(duration, seed=seed + i), 16000)
+            written.append(path)
+            with transaction.atomic():
+                AudioFile.objects.create(
+                    project=project,
+                    audio_id=stem,
+                    audio_file=f"raw/{stem}.wav",
+                    file_size=os.path.getsize(path),
+                    duration=duration,
+                    created_by=user,
+                )
+            uploaded[stem] = time.time()
+
+        deadline = started + timeout
+        while time.time() < deadline:
+            # The reviewer: approve each processed file once it appears.
+            for processed in ProcessedAudioFile.objects.filter(
+                project=project, is_approved=False
+            ):
+                processed.is_approved = True
+                processed.save()
+                approved[os.path.splitext(os.path.basename(processed.processed_file.name))[0]] = time.time()
+
+            done = sum(
+                1 for job in list(stand_in.jobs)
+                if job["stage"] == "chunk" and job["completed"] and not job["error"]
+            )
+            if on_progress:
+                on_progress(done)
+            if done >= recordings:
+                break
+            time.sleep(0.2)
+        wall = time.time() - started
+        # The same stages as the server-side job tracking sees them
+        tracked = stage_timings(project).get(project.pk)
+    finally:
+        stop.set()
+        dispatcher.join()
+        stand_in.stop()
+        api.shutdown()
+        api.server_close()
+        dispatch.STAGE_URLS.clear()
+        dispatch.STAGE_URLS.update(original_urls)
+        local_host.disable()
+        if not keep:
+            project.delete()
+            for path in written:
+                os.remove(path)
+
+    report = summarize(stand_in.jobs, uploaded, approved, recordings, duration, wall)
+    report["tracked"] = tracked
+    return report
+
+
+def summarize(jobs, uploaded, approved, recordings, duration, wall):
+    """Per-stage waiting and total times, end-to-end latency and throughput."""
+    by_stage = {}
+    for job in jobs:
+        if job["completed"] and not job["error"]:
+            stem = os.path.splitext(os.path.basename(job["audio_path"]))[0]
+            by_stage.setdefault(job["stage"], {})[stem] = job
+
+    preprocess = by_stage.get("preprocess", {})
+    diarize = by_stage.get("diarize", {})
+    chunk = by_stage.get("chunk", {})
+    # When each stage's input became ready on the S3 side
+    ready = {
+        "preprocess": uploaded,
+        "diarize": approved,
+        "chunk": {stem: job["completed"] for stem, job in diarize.items()},
+    }
+    stages = {}
+    for stage, finished in (("preprocess", preprocess), ("diarize", diarize), ("chunk", chunk)):
+        stems = [stem for stem in finished if stem in ready[stage]]
+        stages[stage] = {
+            # Ready on the S3 side until the GPU server received it
+            "queued": percentiles([finished[s]["received"] - ready[stage][s] for s in stems]),
+            # Ready until its results were posted back
+            "total": percentiles([finished[s]["completed"] - ready[stage][s] for s in stems]),
+        }
+    stages["approve"] = {
+        "total": percentiles(
+            [approved[s] - preprocess[s]["completed"] for s in approved if s in preprocess]
+        )
+    }
+    completed = [stem for stem in chunk if stem in uploaded]
+    return {
+        "recordings": recordings,
+        "completed": len(completed),
+        "failed_jobs": sum(1 for job in jobs if job["error"]),
+        "wall_s": round(wall, 3),
+        "stages": stages,
+        "end_to_end": percentiles([chunk[s]["completed"] - uploaded[s] for s in completed]),
+        "recordings_per_minute": round(len(completed) / wall * 60, 2) if wall else None,
+        "audio_hours_per_hour": round(len(completed) * duration / wall, 2) if wall else None,
+    }
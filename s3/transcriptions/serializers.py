@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from .models import (
     AudioFile, ProcessedAudioFile, CaseRecord, DiarizedAudioFile, 
-    AudioChunk, EvaluationResults, Project
+    AudioChunk, EvaluationResults, Project, ProcessingTask
 )
 from django.db.models import Count, Sum, IntegerField, ExpressionWrapper, FloatField
+from django.urls import reverse
 
 class ProjectSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.whatsapp_number')
@@ -81,6 +82,15 @@ class AudioChunkSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['file_path']  # read only fields
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Virtual chunks have no file: point at the endpoint that serves them
+        if instance.is_virtual:
+            url = reverse('audiochunk-audio', args=[instance.unique_id])
+            request = self.context.get('request')
+            data['chunk_file'] = request.build_absolute_uri(url) if request else url
+        return data
+
 
 class EvaluationResultsSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.whatsapp_number')
@@ -93,14 +103,23 @@ class EvaluationResultsSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_by', 'updated_by', 'evaluation_date']
 
 
-# class ProcessingTaskSerializer(serializers.ModelSerializer):
-#     created_by = serializers.ReadOnlyField(source='created_by.whatsapp_number')
-#     updated_by = serializers.ReadOnlyField(source='updated_by.whatsapp_number')
-#     project = serializers.PrimaryKeyRelatedField(read_only=True)
+class ProcessingTaskSerializer(serializers.ModelSerializer):
+    created_by = serializers.ReadOnlyField(source='created_by.whatsapp_number')
+    updated_by = serializers.ReadOnlyField(source='updated_by.whatsapp_number')
+    project = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = ProcessingTask
+        fields = '__all__'
+
 
-#     class Meta:
-#         model = ProcessingTask
-#         fields = '__all__'
+# One status report from the GPU server
+class ProcessingTaskStatusSerializer(serializers.Serializer):
+    task_id = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=['PROCESSING', 'COMPLETED', 'FAILED'])
+    error_message = serializers.CharField(required=False, allow_blank=True)
+    result_path = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    timestamp = serializers.DateTimeField(required=False)
 
 
     
@@ -1,3 +1,953 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import librosa
+import numpy as np
+import soundfile as sf
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from transcriptions import cleaning, dispatch, ingest, pcm_cache, utils
+from transcriptions.benchmarks import synthetic_call
+from transcriptions.case_import import import_case_records
+from transcriptions.gpu_stub import GpuServerStub
+from transcriptions.models import (
+    AudioChunk,
+    AudioFile,
+    CaseRecord,
+    ChunkingResult,
+    EvaluationResults,
+    GpuDispatch,
+    ProcessedAudioFile,
+    ProcessingTask,
+    Project,
+)
+from transcriptions.pagination import KeysetPagination
+from transcriptions.tracking import stage_timings
+from transcriptions.utils import (
+    analyze_chunks,
+    boundary_parameters,
+    compute_dynamic_thresholds,
+    find_chunk_boundaries,
+    iter_audio_blocks,
+    iter_chunk_audio,
+    read_chunk_audio,
+    split_and_save_chunks,
+    stream_chunk_boundaries,
+    sweep_file,
+    virtual_chunk_record,
+)
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def reference_compute_dynamic_thresholds(
+    audio, sr, frame_length_samples, segment_length_samples
+):
+    """Frame-by-frame threshold computation the vectorized engine replaced."""
+    energy_thresholds = []
+    zcr_thresholds = []
+
+    for i in range(0, len(audio), segment_length_samples):
+        segment = audio[i : i + segment_length_samples]
+        n_frames = max(int(len(segment) / frame_length_samples), 1)
+        energy = np.array(
+            [
+                np.sum(
+                    segment[j * frame_length_samples : (j + 1) * frame_length_samples]
+                    ** 2
+                )
+                for j in range(n_frames)
+            ]
+        )
+        zcr = np.array(
+            [
+                np.sum(
+                    librosa.zero_crossings(
+                        segment[
+                            j * frame_length_samples : (j + 1) * frame_length_samples
+                        ],
+                        pad=False,
+                    )
+                )
+                for j in range(n_frames)
+            ]
+        )
+        energy_thresholds.append(np.mean(energy) + 3 * np.std(energy))
+        zcr_thresholds.append(np.mean(zcr) + 3 * np.std(zcr))
+
+    return energy_thresholds, zcr_thresholds
+
+
+def reference_analyze_chunks(
+    audio,
+    sr,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+):
+    """Frame-by-frame chunker the vectorized engine replaced."""
+    segment_length_samples = len(audio) // 5
+    energy_thresholds, zcr_thresholds = reference_compute_dynamic_thresholds(
+        audio, sr, frame_length_samples, segment_length_samples
+    )
+
+    chunks = []
+    current_chunk_start = None
+    last_valid_end = None
+    is_previous_frame_silent = False
+
+    for i in range(0, len(audio), frame_length_samples):
+        segment_index = min(i // segment_length_samples, len(energy_thresholds) - 1)
+        energy_threshold = energy_thresholds[segment_index]
+        zcr_threshold = zcr_thresholds[segment_index]
+
+        frame = audio[i : min(i + frame_length_samples, len(audio))]
+        frame_energy = np.sum(frame**2)
+        frame_zcr = np.sum(librosa.zero_crossings(frame, pad=False))
+
+        is_silent = frame_energy <= energy_threshold and frame_zcr <= zcr_threshold
+
+        if current_chunk_start is None and not is_silent:
+            current_chunk_start = i
+            last_valid_end = i + frame_length_samples
+
+        if current_chunk_start is not None:
+            if is_silent and (
+                is_previous_frame_silent
+                or i + frame_length_samples - current_chunk_start
+                >= max_chunk_length_samples
+            ):
+                if (
+                    last_valid_end
+                    and last_valid_end - current_chunk_start >= min_chunk_length_samples
+                ):
+                    chunks.append(
+                        (current_chunk_start, last_valid_end + overlap_samples)
+                    )
+                    current_chunk_start = None
+            else:
+                last_valid_end = i + frame_length_samples
+                if (
+                    not is_silent
+                    and i + frame_length_samples - current_chunk_start
+                    >= max_chunk_length_samples
+                ):
+                    chunks.append(
+                        (
+                            current_chunk_start,
+                            min(len(audio), last_valid_end + overlap_samples),
+                        )
+                    )
+                    current_chunk_start = None
+
+        is_previous_frame_silent = is_silent
+
+    if (
+        current_chunk_start is not None
+        and last_valid_end - current_chunk_start >= min_chunk_length_samples
+    ):
+        chunks.append(
+            (current_chunk_start, min(len(audio), last_valid_end + overlap_samples))
+        )
+
+    return chunks
+
+
+class ChunkBoundaryParityTests(SimpleTestCase):
+    PARAMETERS = [
+        # min, max, frame, overlap (samples at 16 kHz)
+        (48000, 112000, 480, 32000),
+        (16000, 48000, 320, 0),
+        (80000, 320000, 480, 16000),
+    ]
+
+    def test_thresholds_match_reference(self):
+        for seed, seconds in enumerate([0.01, 7.3, 95.0]):
+            audio = synthetic_call(seconds, seed=seed)
+            segment = len(audio) // 5
+            self.assertEqual(
+                compute_dynamic_thresholds(audio, 16000, 480, segment),
+                reference_compute_dynamic_thresholds(audio, 16000, 480, segment),
+            )
+
+    def test_boundaries_match_reference(self):
+        for seed, seconds in enumerate([2.5, 31.7, 240.03]):
+            audio = synthetic_call(seconds, seed=seed)
+            for params in self.PARAMETERS:
+                with self.subTest(seconds=seconds, params=params):
+                    expected = reference_analyze_chunks(audio, 16000, *params)
+                    if seconds > 30:
+                        self.assertTrue(expected)
+                    self.assertEqual(analyze_chunks(audio, 16000, *params), expected)
+
+    @unittest.skipIf(numba is None, "numba is not installed")
+    def test_numba_backend_matches_python(self):
+        rng = np.random.default_rng(0)
+        flags = [
+            np.zeros(0, dtype=bool),
+            np.zeros(500, dtype=bool),
+            np.ones(500, dtype=bool),
+        ] + [rng.random(5000) < p for p in (0.05, 0.3, 0.6, 0.9)]
+        for is_silent in flags:
+            for min_len, max_len, frame, overlap in self.PARAMETERS:
+                # A length that is not a whole number of frames exercises the
+                # clipping of the final chunk.
+                n_samples = len(is_silent) * frame - frame // 2
+                args = (is_silent, n_samples, min_len, max_len, frame, overlap)
+                with self.subTest(silent=is_silent.mean() if len(is_silent) else 0):
+                    self.assertEqual(
+                        find_chunk_boundaries(*args, backend="numba"),
+                        find_chunk_boundaries(*args, backend="python"),
+                    )
+
+
+class StreamingChunkerTests(SimpleTestCase):
+    PARAMETERS = (48000, 112000, 480, 32000)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_wav(self, name, audio, sr=16000):
+        path = os.path.join(self.tmpdir.name, name)
+        sf.write(path, audio, sr, subtype="FLOAT")
+        return path
+
+    def test_streamed_boundaries_and_samples_match_in_memory(self):
+        mono = synthetic_call(95.3, seed=3)
+        stereo = np.stack([mono, synthetic_call(95.3, seed=4)], axis=1)
+        stereo_44k = np.stack(
+            [synthetic_call(95.3, sr=44100, seed=seed) for seed in (3, 4)], axis=1
+        )
+        sources = [
+            ("mono.wav", mono, 16000),
+            ("stereo.wav", stereo, 16000),
+            # Resampled through soxr.ResampleStream, block by block.
+            ("stereo_44k.wav", stereo_44k, 44100),
+            ("mono_8k.wav", synthetic_call(95.3, sr=8000, seed=5), 8000),
+        ]
+        for name, audio, sr in sources:
+            with self.subTest(name=name):
+                path = self.write_wav(name, audio, sr)
+                y, _ = librosa.load(path, sr=16000)
+                expected = analyze_chunks(y, 16000, *self.PARAMETERS)
+                # An odd block size puts frame and segment edges inside blocks.
+                chunks, n_samples = stream_chunk_boundaries(
+                    path, 16000, *self.PARAMETERS, block_seconds=1.2345
+                )
+                self.assertEqual(n_samples, len(y))
+                self.assertEqual(chunks, expected)
+
+                # soxr's streaming resampler keeps its filter state across
+                # blocks, so its output matches librosa's one-shot resampling
+                # to float32 rounding; 16 kHz sources are copied exactly.
+                blocks = iter_audio_blocks(path, 16000, block_seconds=1.2345)
+                for index, samples in iter_chunk_audio(blocks, chunks):
+                    start, end = chunks[index]
+                    np.testing.assert_allclose(samples, y[start:end], rtol=0, atol=1e-6)
+
+    def test_sweep_matches_chunking_each_config(self):
+        path = self.write_wav("call.wav", synthetic_call(61.7, seed=5))
+        y, _ = librosa.load(path, sr=16000)
+        configs = [
+            {
+                "min_chunk_length_ms": min_ms,
+                "max_chunk_length_ms": max_ms,
+                "frame_length_ms": frame_ms,
+                "overlap_ms": 2000,
+            }
+            for min_ms, max_ms, frame_ms in [(3000, 7000, 30), (1000, 3000, 20)]
+        ]
+        for config, stats in zip(configs, sweep_file(path, configs)):
+            chunks = analyze_chunks(
+                y,
+                16000,
+                *boundary_parameters(16000, **config),
+            )
+            self.assertEqual(stats["chunks"], len(chunks))
+            self.assertEqual(sum(stats["histogram"]), len(chunks))
+            self.assertEqual(
+                stats["chunk_samples"], sum(end - start for start, end in chunks)
+            )
+            self.assertEqual(stats["audio_samples"], len(y))
+            self.assertLessEqual(
+                stats["covered_speech_frames"], stats["speech_frames"]
+            )
+
+    def test_virtual_chunks_read_the_same_samples(self):
+        stereo = np.stack([synthetic_call(40.1, seed=5), synthetic_call(40.1, seed=6)], axis=1)
+        # At 16 kHz the samples are the same; other rates are resampled from
+        # a window, which matches resampling the whole file to float rounding.
+        for sr, atol in [(16000, 0), (44100, 1e-6), (8000, 1e-6)]:
+            with self.subTest(sr=sr):
+                audio = stereo if sr == 16000 else librosa.resample(stereo.T, orig_sr=16000, target_sr=sr).T
+                path = self.write_wav(f"stereo_{sr}.wav", audio, sr)
+                y, _ = librosa.load(path, sr=16000)
+                chunks = analyze_chunks(y, 16000, *self.PARAMETERS)
+                self.assertTrue(chunks)
+                with override_settings(MEDIA_ROOT=self.tmpdir.name):
+                    for start, end in chunks:
+                        record = virtual_chunk_record(path, 16000, (start, end), len(y))
+                        samples = read_chunk_audio(AudioChunk(**record))
+                        self.assertEqual(len(samples), end - start)
+                        np.testing.assert_allclose(samples, y[start:end], rtol=0, atol=atol)
+
+
+class ChunkingCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        for patcher in (
+            mock.patch.object(utils, "CHUNK_FEATURE_CACHE_DIR", os.path.join(self.tmp.name, "features")),
+            mock.patch.object(pcm_cache, "PCM_CACHE_DIR", os.path.join(self.tmp.name, "pcm")),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.makedirs(os.path.join(self.tmp.name, "processed"))
+        sf.write(os.path.join(self.tmp.name, "processed", "call.wav"), synthetic_call(40.0, seed=6), 16000)
+        self.project = Project.objects.create(name="chunking")
+        self.processed = ProcessedAudioFile.objects.create(
+            project=self.project, processed_file="processed/call.wav"
+        )
+
+    def chunk_files(self):
+        return sorted(os.listdir(os.path.join(self.tmp.name, "audio_chunks")))
+
+    def test_same_options_are_a_no_op(self):
+        chunks = split_and_save_chunks(self.processed)
+        self.assertGreater(chunks, 0)
+        files = self.chunk_files()
+
+        with mock.patch.object(utils, "load_pcm", side_effect=AssertionError("decoded again")):
+            self.assertEqual(split_and_save_chunks(self.processed), chunks)
+        self.assertEqual(AudioChunk.objects.filter(project=self.project).count(), chunks)
+        self.assertEqual(ChunkingResult.objects.count(), 1)
+        self.assertEqual(self.chunk_files(), files)
+
+    def test_changed_option_recomputes_from_cached_features(self):
+        first = split_and_save_chunks(self.processed)
+        files = self.chunk_files()
+
+        with mock.patch.object(utils, "analyze_frames", side_effect=AssertionError("re-analyzed")):
+            second = split_and_save_chunks(self.processed, max_chunk_length_ms=5000)
+        self.assertEqual(ChunkingResult.objects.count(), 2)
+        self.assertEqual(AudioChunk.objects.filter(project=self.project).count(), first + second)
+        # The new chunk set is written next to the first one, not over it.
+        self.assertEqual(len(self.chunk_files()), first + second)
+        self.assertLess(set(files), set(self.chunk_files()))
+
+
+class PreprocessBatchingTests(SimpleTestCase):
+    def setUp(self):
+        batching = mock.patch.object(dispatch, "GPU_PREPROCESS_BATCHING", True)
+        batching.start()
+        self.addCleanup(batching.stop)
+
+    def make_dispatch(self, project_id, stage="preprocess", **payload):
+        source_id = uuid.uuid4()
+        return GpuDispatch(
+            project_id=project_id,
+            stage=stage,
+            dedup_key=f"{stage}:{source_id}",
+            source_id=source_id,
+            payload={
+                "audio_path": f"/mnt/shared/raw/{source_id}.wav",
+                "noise_reduction": 0.3,
+                "normalize": True,
+                "project_id": str(project_id),
+                "task_id": str(uuid.uuid4()),
+                **payload,
+            },
+        )
+
+    def test_preprocess_rows_are_sent_as_one_request_per_project(self):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        dispatches = [self.make_dispatch(first) for _ in range(5)]
+        dispatches += [self.make_dispatch(second) for _ in range(2)]
+        dispatches.append(self.make_dispatch(first, stage="diarize"))
+
+        groups = dispatch.group_dispatches(dispatches, batch_size=3)
+        self.assertEqual(
+            sorted(len(group) for group in groups), [1, 2, 2, 3]
+        )
+
+        with GpuServerStub() as stub, mock.patch.dict(
+            dispatch.STAGE_URLS, stub.urls()
+        ):
+            for group in groups:
+                self.assertEqual(dispatch.send_group(group), (None, False, None))
+
+        batches = [
+            payload
+            for path, payload in stub.received
+            if path == "/api/audio/preprocess/batch/"
+        ]
+        self.assertEqual(len(batches), 3)
+        sent_paths = sorted(path for batch in batches for path in batch["audio_paths"])
+        self.assertEqual(
+            sent_paths,
+            sorted(d.payload["audio_path"] for d in dispatches if d.stage == "preprocess"),
+        )
+        for batch in batches:
+            self.assertNotIn("audio_path", batch)
+            self.assertIn(batch["project_id"], {str(first), str(second)})
+
+    def test_preprocess_rows_are_sent_alone_unless_batching_is_enabled(self):
+        project_id = uuid.uuid4()
+        group = [self.make_dispatch(project_id) for _ in range(3)]
+        with mock.patch.object(dispatch, "GPU_PREPROCESS_BATCHING", False):
+            groups = dispatch.group_dispatches(group)
+            self.assertEqual(groups, [[d] for d in group])
+            with GpuServerStub() as stub, mock.patch.dict(dispatch.STAGE_URLS, stub.urls()):
+                for single in groups:
+                    self.assertEqual(dispatch.send_group(single), (None, False, None))
+                self.assertEqual(
+                    [path for path, _ in stub.received], ["/api/audio/preprocess/"] * 3
+                )
+
+    def test_batch_carries_each_rows_task_id(self):
+        group = [self.make_dispatch(uuid.uuid4()) for _ in range(3)]
+        self.assertEqual(len(dispatch.group_dispatches(group)), 3)
+
+        project_id = uuid.uuid4()
+        group = [self.make_dispatch(project_id) for _ in range(3)]
+        (batch,) = dispatch.group_dispatches(group)
+        payload = dispatch.preprocess_batch_payload(batch)
+        self.assertNotIn("task_id", payload)
+        self.assertEqual(
+            list(zip(payload["audio_paths"], payload["task_ids"])),
+            [(d.payload["audio_path"], d.payload["task_id"]) for d in group],
+        )
+
+    def test_rejected_batch_is_not_retried_on_client_errors(self):
+        group = [self.make_dispatch(uuid.uuid4()) for _ in range(2)]
+        with GpuServerStub(status=400) as stub, mock.patch.dict(
+            dispatch.STAGE_URLS, stub.urls()
+        ):
+            error, retryable, throttle = dispatch.send_group(group)
+        self.assertTrue(error.startswith("HTTP 400"))
+        self.assertFalse(retryable)
+        self.assertIsNone(throttle)
+
+    def test_busy_server_throttles_the_stage(self):
+        group = [self.make_dispatch(uuid.uuid4())]
+        with GpuServerStub(status=429) as stub, mock.patch.dict(
+            dispatch.STAGE_URLS, stub.urls()
+        ):
+            error, retryable, throttle = dispatch.send_group(group)
+        self.assertTrue(error.startswith("HTTP 429"))
+        self.assertEqual(throttle, dispatch.GPU_THROTTLE_SECONDS)
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def request(self, **params):
+        return Request(APIRequestFactory().get("/api/transcriptions/audio-chunks/", params))
+
+    def paginator(self):
+        paginator = KeysetPagination()
+        paginator.fields = ["created_at", "unique_id"]
+        paginator.base_url = "http://testserver/api/transcriptions/audio-chunks/?page_size=2"
+        return paginator
+
+    def test_cursor_round_trips_the_key(self):
+        paginator = self.paginator()
+        row = {
+            "created_at": datetime(2025, 3, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc),
+            "unique_id": uuid.uuid4(),
+        }
+        url = paginator.encode_cursor(row, reverse=True)
+        self.assertIn("page_size=2", url)
+        cursor = parse_qs(urlparse(url).query)["cursor"][0]
+        self.assertNotIn("%", url)
+        values, reverse = paginator.decode_cursor(self.request(cursor=cursor))
+        self.assertEqual(values, [row["created_at"].isoformat(), str(row["unique_id"])])
+        self.assertTrue(reverse)
+
+    def test_garbage_cursor_is_rejected(self):
+        paginator = self.paginator()
+        for cursor in ("not-base64!", "e30=", "eyJrIjogWzFdfQ=="):  # "{}", {"k": [1]}
+            with self.assertRaises(NotFound):
+                paginator.decode_cursor(self.request(cursor=cursor))
+
+    def test_page_size_is_capped(self):
+        paginator = KeysetPagination()
+        self.assertEqual(paginator.get_page_size(self.request(page_size="10")), 10)
+        self.assertEqual(paginator.get_page_size(self.request(page_size="0")), 1)
+        self.assertEqual(
+            paginator.get_page_size(self.request(page_size="1000000")), paginator.max_page_size
+        )
+        self.assertEqual(paginator.get_page_size(self.request(page_size="x")), paginator.page_size)
+
+    def test_after_is_a_row_value_comparison(self):
+        paginator = self.paginator()
+        at = "2025-03-01T12:00:00+00:00"
+        self.assertEqual(
+            paginator.after([at, "abc"], descending=True),
+            Q(created_at__lt=at) | Q(created_at=at, unique_id__lt="abc"),
+        )
+        self.assertEqual(
+            paginator.after([at, "abc"], descending=False),
+            Q(created_at__gt=at) | Q(created_at=at, unique_id__gt="abc"),
+        )
+
+
+class EvaluationChunkCategoryQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.annotator = User.objects.create_user(whatsapp_number="254700000001")
+        cls.other = User.objects.create_user(whatsapp_number="254700000002")
+        cls.project = Project.objects.create(name="category-queries", created_by=cls.annotator)
+
+    def add_chunks(self, count):
+        """``count`` chunks, every other one evaluated once."""
+        chunks = AudioChunk.objects.bulk_create(
+            AudioChunk(
+                project=self.project,
+                chunk_file=f"chunks/category_{uuid.uuid4().hex}.wav",
+                duration=5.0,
+            )
+            for _ in range(count)
+        )
+        EvaluationResults.objects.bulk_create(
+            EvaluationResults(
+                project=self.project,
+                audiofilechunk=chunk,
+                created_by=self.annotator if i % 4 == 0 else self.other,
+            )
+            for i, chunk in enumerate(chunks)
+            if i % 2 == 0
+        )
+
+    def fetch(self):
+        client = APIClient()
+        client.force_authenticate(self.annotator)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse("evaluation-categories"), HTTP_X_PROJECT_ID=str(self.project.pk)
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_chunks(self):
+        self.add_chunks(4)
+        small, small_queries = self.fetch()
+        self.add_chunks(40)
+        large, large_queries = self.fetch()
+
+        self.assertEqual(len(small["not_evaluated"]), 2)
+        self.assertEqual(len(large["one_evaluation"]), 22)
+        self.assertEqual(large_queries, small_queries)
+
+        flagged = [chunk["evaluated_by_user"] for chunk in large["one_evaluation"]]
+        self.assertEqual(sum(flagged), 11)
+        self.assertTrue(all(chunk["file_url"].endswith(".wav") for chunk in large["not_evaluated"]))
+
+
+class ChunksForTranscriptionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.first = User.objects.create_user(whatsapp_number="254700000011")
+        cls.second = User.objects.create_user(whatsapp_number="254700000012")
+        cls.project = Project.objects.create(name="transcribable", created_by=cls.first)
+
+    def add_chunks(self, count, **flags):
+        """``count`` chunks evaluated twice, with ``flags`` set on the second evaluation."""
+        chunks = AudioChunk.objects.bulk_create(
+            AudioChunk(project=self.project, chunk_file=f"chunks/t_{uuid.uuid4().hex}.wav")
+            for _ in range(count)
+        )
+        EvaluationResults.objects.bulk_create(
+            EvaluationResults(
+                project=self.project,
+                audiofilechunk=chunk,
+                created_by=user,
+                **(flags if user == self.second else {}),
+            )
+            for chunk in chunks
+            for user in (self.first, self.second)
+        )
+        return {str(chunk.pk) for chunk in chunks}
+
+    def get(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.first)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse("transcribable"), params, HTTP_X_PROJECT_ID=str(self.project.pk)
+            )
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_only_clean_chunks_are_listed_in_constant_queries(self):
+        clean = self.add_chunks(3)
+        self.add_chunks(2, silence=True)
+        response, small_queries = self.get()
+        listed = response.json()["chunks_for_transcription"]
+        self.assertEqual({chunk["unique_id"] for chunk in listed}, clean)
+        self.assertTrue(all(chunk["file_url"].endswith(".wav") for chunk in listed))
+
+        clean |= self.add_chunks(30)
+        response, large_queries = self.get()
+        self.assertEqual(len(response.json()["chunks_for_transcription"]), len(clean))
+        self.assertEqual(large_queries, small_queries)
+
+    def test_since_and_ndjson_stream(self):
+        self.add_chunks(2)
+        since = timezone.now()
+        later = self.add_chunks(3)
+
+        response, _ = self.get(since=since.isoformat(), stream="ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual({json.loads(line)["unique_id"] for line in lines}, later)
+
+        client = APIClient()
+        client.force_authenticate(self.first)
+        response = client.get(reverse("transcribable"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_clearing_a_flag_makes_the_chunk_eligible_after_since(self):
+        (flagged,) = self.add_chunks(1, not_clear=True)
+        since = timezone.now()
+        response, _ = self.get(since=since.isoformat())
+        self.assertEqual(response.json()["chunks_for_transcription"], [])
+
+        # The evaluator revises their evaluation; update_or_create keeps the row
+        evaluation = EvaluationResults.objects.get(audiofilechunk=flagged, created_by=self.second)
+        evaluation.not_clear = False
+        evaluation.save()
+
+        response, _ = self.get(since=since.isoformat())
+        listed = response.json()["chunks_for_transcription"]
+        self.assertEqual([chunk["unique_id"] for chunk in listed], [flagged])
+
+
+class IngestAudioDirectoryTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, "incoming")
+        os.makedirs(self.source)
+        for i in range(3):
+            sf.write(os.path.join(self.source, f"call_{i}.wav"), synthetic_call(2.0, seed=i), 16000)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.tmp.name, "media"))
+        media.enable()
+        self.addCleanup(media.disable)
+        manifests = mock.patch.object(
+            ingest, "INGEST_MANIFEST_DIR", os.path.join(self.tmp.name, "manifests")
+        )
+        manifests.start()
+        self.addCleanup(manifests.stop)
+        self.project = Project.objects.create(name="ingest")
+
+    def test_ingested_files_are_queued_for_preprocessing(self):
+        totals = ingest.ingest_audio_directory(self.source, self.project, workers=2)
+        self.assertEqual(totals["created"], 3)
+        audio_files = set(AudioFile.objects.filter(project=self.project).values_list("pk", flat=True))
+        queued = GpuDispatch.objects.filter(project=self.project, stage="preprocess")
+        self.assertEqual(set(queued.values_list("source_id", flat=True)), audio_files)
+
+        # A full re-run updates the rows without queueing them twice
+        totals = ingest.ingest_audio_directory(
+            self.source, self.project, workers=2, incremental=False
+        )
+        self.assertEqual(totals["updated"], 3)
+        self.assertEqual(queued.count(), 3)
+
+    def test_same_named_files_of_two_projects_are_kept_apart(self):
+        ingest.ingest_audio_directory(self.source, self.project, workers=2)
+        first = AudioFile.objects.get(project=self.project, audio_id="call_0")
+        with open(first.audio_file.path, "rb") as f:
+            original = f.read()
+
+        # A different recording under the same name, for another project
+        replacement = os.path.join(self.tmp.name, "replacement.wav")
+        sf.write(replacement, synthetic_call(2.0, seed=9), 16000)
+        os.replace(replacement, os.path.join(self.source, "call_0.wav"))
+        other = Project.objects.create(name="other")
+        ingest.ingest_audio_directory(self.source, other, workers=2)
+
+        second = AudioFile.objects.get(project=other, audio_id="call_0")
+        self.assertNotEqual(first.audio_file.name, second.audio_file.name)
+        with open(first.audio_file.path, "rb") as f:
+            self.assertEqual(f.read(), original)
+
+    def test_chunk_names_resolve_with_and_without_run_key(self):
+        ingest.ingest_audio_directory(self.source, self.project, workers=2)
+        AudioFile.objects.filter(project=self.project, audio_id="call_2").update(
+            audio_id="call_3ab4cd56"
+        )
+        chunks = os.path.join(self.tmp.name, "chunks")
+        os.makedirs(chunks)
+        for name in (
+            "call_0_3ab4cd56_chunk_0001.wav",
+            "call_1_chunk_0002.wav",
+            "call_3ab4cd56_chunk_0003.wav",
+            "other_chunk_0001.wav",
+        ):
+            sf.write(os.path.join(chunks, name), synthetic_call(1.0), 16000)
+        totals = ingest.register_chunk_directory(chunks, self.project, workers=2)
+        self.assertEqual(totals["created"], 3)
+        self.assertEqual(
+            totals["rejected"], [("other_chunk_0001.wav", "No AudioFile with this audio_id")]
+        )
+
+        # Each project keeps its own manifest of the directory
+        other = Project.objects.create(name="other")
+        totals = ingest.register_chunk_directory(chunks, other, workers=2)
+        self.assertEqual(totals["unchanged"], 0)
+        self.assertEqual(len(totals["rejected"]), 4)
+
+
+class CleaningTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache_dir = mock.patch.object(pcm_cache, "PCM_CACHE_DIR", os.path.join(self.tmp.name, "pcm"))
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        os.makedirs(os.path.join(self.tmp.name, "raw"))
+        sf.write(os.path.join(self.tmp.name, "raw", "call_0.wav"), synthetic_call(3.0), 16000)
+        self.project = Project.objects.create(name="cleaning")
+        self.audio_file = AudioFile.objects.create(
+            project=self.project, audio_id="call_0", audio_file="raw/call_0.wav"
+        )
+
+    def test_cleaning_keeps_the_stem_and_leaves_preprocessing_pending(self):
+        result = cleaning.clean_audio_file(
+            self.audio_file.pk, os.path.join(self.tmp.name, "raw", "call_0.wav")
+        )
+        self.assertEqual(result["status"], "success")
+        cleaning.save_cleaned_files([result])
+
+        self.audio_file.refresh_from_db()
+        self.assertTrue(self.audio_file.is_cleaned)
+        self.assertFalse(self.audio_file.is_processed)
+        processed = ProcessedAudioFile.objects.get(project=self.project)
+        self.assertEqual(os.path.basename(processed.processed_file.name), "call_0.wav")
+        review = ProcessingTask.objects.get(task_type="REVIEW", source_id=processed.pk)
+        self.assertEqual((review.audio_id, review.status), ("call_0", "PENDING"))
+
+        # Registering the same output again adds nothing
+        cleaning.save_cleaned_files([result])
+        self.assertEqual(ProcessedAudioFile.objects.filter(project=self.project).count(), 1)
+
+
+class ReviewTrackingTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="reviews")
+
+    def review(self, processed):
+        return ProcessingTask.objects.get(task_type="REVIEW", source_id=processed.pk)
+
+    def test_approval_and_disapproval_both_close_the_review(self):
+        approved, disapproved = (
+            ProcessedAudioFile.objects.create(project=self.project, processed_file=f"processed/{name}.wav")
+            for name in ("approved", "disapproved")
+        )
+        self.assertEqual(self.review(disapproved).status, "PENDING")
+        self.assertEqual(stage_timings(self.project)[self.project.pk]["review"]["pending"], 2)
+
+        approved.is_approved = True
+        approved.save()
+        disapproved.is_disapproved = True
+        disapproved.save()
+        for processed in (approved, disapproved):
+            task = self.review(processed)
+            self.assertEqual(task.status, "COMPLETED")
+            self.assertIsNotNone(task.completed_at)
+        self.assertEqual(stage_timings(self.project)[self.project.pk]["review"]["pending"], 0)
+        # Only the approved file goes on to diarization
+        self.assertEqual(
+            list(GpuDispatch.objects.filter(stage="diarize").values_list("source_id", flat=True)),
+            [approved.pk],
+        )
+
+
+class AudioBulkUploadTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # The view writes under ./shared/raw
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.user = get_user_model().objects.create_user(whatsapp_number="254700000021")
+        self.project = Project.objects.create(name="uploads", created_by=self.user)
+
+    def wav(self, name, seed):
+        path = os.path.join(self.tmp.name, name)
+        sf.write(path, synthetic_call(2.0, seed=seed), 16000)
+        with open(path, "rb") as f:
+            return SimpleUploadedFile(name, f.read(), content_type="audio/wav")
+
+    def test_uploaded_files_are_queued_for_preprocessing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            reverse("audio-bulk-upload"),
+            {"files": [self.wav("call_0.wav", 0), self.wav("call_1.wav", 1)]},
+            format="multipart",
+            HTTP_X_PROJECT_ID=str(self.project.pk),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["summary"]["successful"], 2)
+
+        audio_files = set(AudioFile.objects.filter(project=self.project).values_list("pk", flat=True))
+        self.assertEqual(len(audio_files), 2)
+        queued = GpuDispatch.objects.filter(project=self.project, stage="preprocess")
+        self.assertEqual(set(queued.values_list("source_id", flat=True)), audio_files)
+        self.assertEqual(
+            ProcessingTask.objects.filter(project=self.project, task_type="PREPROCESS").count(), 2
+        )
+
+
+class CaseImportTests(TestCase):
+    HEADER = ["UNIQUEID", "DATE", "TALKTIME", "CASEID", "NARRATIVE", "PLAN", "MAIN CATEGORY", "SUB CATEGORY", "GBV"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.project = Project.objects.create(name="cases")
+        self.audio_files = {
+            audio_id: AudioFile.objects.create(
+                project=self.project, audio_id=audio_id, audio_file=f"raw/{audio_id}.wav"
+            )
+            for audio_id in ("call_0", "call_1")
+        }
+
+    def row(self, audio_id, case_id, narrative="Caller asked for advice", date="03 Mar 2024 14:05"):
+        return [audio_id, date, "00:12", str(case_id), narrative, "Follow up", "Advice", "Legal", "No"]
+
+    def import_rows(self, rows, **kwargs):
+        csv_path = os.path.join(self.tmp.name, "cases.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(rows)
+        rejects_path = os.path.join(self.tmp.name, "cases.rejects.csv")
+        totals = import_case_records(csv_path, rejects_path, **kwargs)
+        with open(rejects_path, newline="", encoding="utf-8") as f:
+            return totals, list(csv.DictReader(f))
+
+    def test_new_case_ids_are_inserted_and_existing_ones_updated(self):
+        existing = CaseRecord.objects.create(
+            project=self.project,
+            audio_id=self.audio_files["call_1"],
+            date=timezone.now(),
+            talk_time="00:05",
+            case_id="1",
+            narrative="Old narrative",
+            plan="",
+            main_category="Other",
+            sub_category="Other",
+            gbv=False,
+        )
+
+        totals, rejects = self.import_rows(
+            [self.row("call_0", 100), self.row("call_1", 101, "New narrative")], batch_size=1
+        )
+        self.assertEqual(totals, {"rows": 2, "created": 1, "updated": 1, "rejected": 0})
+        self.assertEqual(rejects, [])
+        self.assertEqual(CaseRecord.objects.count(), 2)
+        updated = CaseRecord.objects.get(audio_id=self.audio_files["call_1"])
+        # Updated in place: same row, new values
+        self.assertEqual(updated.pk, existing.pk)
+        self.assertEqual((updated.case_id, updated.narrative), ("101", "New narrative"))
+        self.assertEqual(CaseRecord.objects.get(audio_id=self.audio_files["call_0"]).case_id, "100")
+
+    def test_rows_that_cannot_be_imported_are_written_to_rejects(self):
+        other = Project.objects.create(name="other")
+        AudioFile.objects.create(project=other, audio_id="call_1", audio_file="raw/call_1.wav")
+
+        totals, rejects = self.import_rows(
+            [
+                self.row("call_0", 100, date="yesterday"),
+                self.row("call_1", 101),
+                self.row("call_9", 109),
+            ]
+        )
+        self.assertEqual(totals, {"rows": 3, "created": 0, "updated": 0, "rejected": 3})
+        self.assertFalse(CaseRecord.objects.exists())
+        reasons = {row["UNIQUEID"]: row["REJECT_REASON"] for row in rejects}
+        self.assertTrue(reasons["call_0"].startswith("Invalid row"))
+        self.assertEqual(reasons["call_1"], "Several AudioFiles have this audio_id")
+        self.assertEqual(reasons["call_9"], "No AudioFile with this audio_id")
+        # Rejected rows keep their columns so they can be fixed and re-imported
+        self.assertEqual(rejects[0]["NARRATIVE"], "Caller asked for advice")
+
+        # Restricted to one project, the same audio_id is no longer ambiguous
+        totals, rejects = self.import_rows([self.row("call_1", 101)], project=self.project)
+        self.assertEqual((totals["created"], totals["rejected"]), (1, 0))
+
+
+class PcmCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        cache_dir = mock.patch.object(
+            pcm_cache, "PCM_CACHE_DIR", os.path.join(self.tmpdir.name, "pcm")
+        )
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+
+    def test_entry_larger_than_the_cache_is_still_returned(self):
+        path = os.path.join(self.tmpdir.name, "call.wav")
+        sf.write(path, synthetic_call(3.0), 16000, subtype="FLOAT")
+        expected, _ = librosa.load(path, sr=16000)
+        evict = pcm_cache.evict_pcm_cache
+        with mock.patch.object(
+            pcm_cache, "evict_pcm_cache", side_effect=lambda keep: evict(1, keep)
+        ):
+            np.testing.assert_array_equal(pcm_cache.load_pcm(path), expected)
+            self.assertTrue(os.path.exists(pcm_cache.pcm_cache_path(path)))
+            np.testing.assert_array_equal(pcm_cache.load_pcm(path), expected)
+
+    def test_failed_decode_leaves_no_temporary_file(self):
+        path = os.path.join(self.tmpdir.name, "call.wav")
+        sf.write(path, synthetic_call(3.0), 16000, subtype="FLOAT")
+        with mock.patch.object(
+            utils, "iter_audio_blocks", side_effect=RuntimeError("unreadable")
+        ), mock.patch.object(pcm_cache.librosa, "load", side_effect=ValueError("unreadable")):
+            with self.assertRaises(ValueError):
+                pcm_cache.load_pcm(path)
+        self.assertEqual(
+            [name for name in os.listdir(pcm_cache.PCM_CACHE_DIR) if name.endswith(".npy")], []
+        )
+
+    def test_entry_evicted_by_another_process_is_decoded_again(self):
+        path = os.path.join(self.tmpdir.name, "call.wav")
+        sf.write(path, synthetic_call(3.0), 16000, subtype="FLOAT")
+        first = np.array(pcm_cache.load_pcm(path))
+        os.remove(pcm_cache.pcm_cache_path(path))
+        np.testing.assert_array_equal(pcm_cache.load_pcm(path), first)
 
-# Create your tests here.
@@ -0,0 +1,173 @@
+import os
+from datetime import timedelta
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from transcriptions.dispatch import mark_completed
+from transcriptions.models import ProcessingTask
+
+# Stages in pipeline order; REVIEW is the wait for a human to approve a
+# processed file, the others are GPU jobs named after their dispatch stage.
+TASK_TYPES = ("PREPROCESS", "REVIEW", "DIARIZE", "CHUNK")
+GPU_TASK_TYPES = {"PREPROCESS": "preprocess", "DIARIZE": "diarize", "CHUNK": "chunk"}
+FINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+def stem(path):
+    """The file name stem, which every stage keeps, used as ``audio_id``."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.array(values)
+    return {
+        "count": len(values),
+        "p50_s": round(float(np.percentile(values, 50)), 3),
+        "p95_s": round(float(np.percentile(values, 95)), 3),
+        "p99_s": round(float(np.percentile(values, 99)), 3),
+        "max_s": round(float(values.max()), 3),
+    }
+
+
+def reviewed(processed_file):
+    return processed_file.is_approved or processed_file.is_disapproved
+
+
+def open_reviews(processed_files):
+    """Start timing the approval of new ProcessedAudioFiles, in one INSERT."""
+    now = timezone.now()
+    return ProcessingTask.objects.bulk_create(
+        [
+            ProcessingTask(
+                project_id=processed_file.project_id,
+                audio_id=stem(processed_file.processed_file.name),
+                source_id=processed_file.pk,
+                task_type="REVIEW",
+                status="COMPLETED" if reviewed(processed_file) else "PENDING",
+                completed_at=now if reviewed(processed_file) else None,
+                created_by_id=processed_file.created_by_id,
+            )
+            for processed_file in processed_files
+        ]
+    )
+
+
+def open_review(processed_file):
+    """Start timing the approval of a new ProcessedAudioFile."""
+    return open_reviews([processed_file])[0]
+
+
+def close_review(processed_file):
+    """
+    Stop timing the review of a ProcessedAudioFile, approved or disapproved.
+    Returns rows updated.
+    """
+    return ProcessingTask.objects.filter(
+        task_type="REVIEW", source_id=processed_file.pk, status="PENDING"
+    ).update(status="COMPLETED", completed_at=timezone.now())
+
+
+def apply_status_updates(updates, project=None):
+    """
+    Apply the GPU server's status reports: dicts with ``task_id``, a
+    ``status`` of PROCESSING, COMPLETED or FAILED, and optionally
+    ``error_message``, ``result_path`` and the ``timestamp`` it happened.
+
+    The tasks are loaded in one query and saved in one bulk UPDATE; a
+    finished GPU task also frees its dispatch slot (see
+    ``dispatch.mark_completed``). Reports for tasks that already finished
+    are ignored, as are task ids outside ``project`` when given. Returns
+    ``(updated, unknown task ids)``.
+    """
+    tasks = ProcessingTask.objects.filter(pk__in=[u["task_id"] for u in updates])
+    if project is not None:
+        tasks = tasks.filter(project=project)
+    tasks = {task.pk: task for task in tasks}
+    now = timezone.now()
+    changed = {}
+    finished = {}
+    unknown = []
+    for update in updates:
+        task = tasks.get(update["task_id"])
+        if task is None:
+            unknown.append(update["task_id"])
+            continue
+        if task.status in FINAL_STATUSES:
+            continue
+        at = update.get("timestamp") or now
+        task.status = update["status"]
+        task.started_at = task.started_at or at
+        if update["status"] in FINAL_STATUSES:
+            task.completed_at = at
+            if task.task_type in GPU_TASK_TYPES:
+                finished.setdefault(GPU_TASK_TYPES[task.task_type], []).append(task.source_id)
+        for field in ("error_message", "result_path"):
+            if update.get(field):
+                setattr(task, field, update[field])
+        task.updated_at = now
+        changed[task.pk] = task
+
+    with transaction.atomic():
+        ProcessingTask.objects.bulk_update(
+            changed.values(),
+            ["status", "started_at", "completed_at", "error_message", "result_path", "updated_at"],
+        )
+        for stage, source_ids in finished.items():
+            mark_completed(stage, source_ids)
+    return len(changed), unknown
+
+
+def stage_timings(project=None, since=None):
+    """
+    Per project and task type: how many tasks are ``pending``,
+    ``processing`` and ``failed`` now, and percentiles of the seconds the
+    tasks completed after ``since`` (default: the last 24 hours) spent
+    ``queued`` (created until dispatched to the GPU server), ``waiting``
+    (created until started) and in ``total`` (created until completed).
+    """
+    since = since or timezone.now() - timedelta(hours=24)
+    tasks = ProcessingTask.objects.all()
+    if project is not None:
+        tasks = tasks.filter(project=project)
+
+    def stages():
+        return {
+            task_type.lower(): {"pending": 0, "processing": 0, "failed": 0}
+            for task_type in TASK_TYPES
+        }
+
+    projects = {}
+    counts = (
+        tasks.exclude(status="COMPLETED")
+        .values("project_id", "task_type")
+        .annotate(
+            pending=Count("pk", filter=Q(status="PENDING")),
+            processing=Count("pk", filter=Q(status="PROCESSING")),
+            failed=Count("pk", filter=Q(status="FAILED")),
+        )
+    )
+    for row in counts:
+        stage = projects.setdefault(row["project_id"], stages())[row["task_type"].lower()]
+        stage.update(pending=row["pending"], processing=row["processing"], failed=row["failed"])
+
+    durations = {}
+    completed = tasks.filter(status="COMPLETED", completed_at__gte=since).values_list(
+        "project_id", "task_type", "created_at", "dispatched_at", "started_at", "completed_at"
+    )
+    for project_id, task_type, created, dispatched, started, finished in completed.iterator():
+        times = durations.setdefault((project_id, task_type), ([], [], []))
+        if dispatched:
+            times[0].append((dispatched - created).total_seconds())
+        if started:
+            times[1].append((started - created).total_seconds())
+        times[2].append((finished - created).total_seconds())
+    for (project_id, task_type), (queued, waiting, total) in durations.items():
+        projects.setdefault(project_id, stages())[task_type.lower()].update(
+            queued=percentiles(queued),
+            waiting=percentiles(waiting),
+            total=percentiles(total),
+        )
+    return projects
@@ -16,17 +16,18 @@ from .views import (
     CaseRecordListCreateView, CaseRecordDetailView,
     
     # Audio chunk views (renamed from AudioFileChunk)
-    AudioChunkListCreateView, AudioChunkDetailView, AudioChunkEvaluateView,
+    AudioChunkListCreateView, AudioChunkDetailView, AudioChunkEvaluateView, AudioChunkAudioView,
     
     # Evaluation views
     EvaluationResultsListCreateView, EvaluationResultsDetailView, 
     EvaluationResultsSummaryView, EvaluationChunkCategoryView,
     
     # Statistics views
-    ChunkStatisticsView, EvaluationCategoryStatisticsView,
+    ChunkStatisticsView, EvaluationCategoryStatisticsView, GpuQueueView,
     
     # Processing tasks
-    # ProcessingTaskListCreateView, ProcessingTaskDetailView,
+    ProcessingTaskListCreateView, ProcessingTaskDetailView,
+    ProcessingTaskStatusView, ProcessingTaskStatsView,
     
     # Specialized views
     ChunksForTranscriptionView, LeaderboardView,
@@ -62,14 +63,18 @@ urlpatterns = [
     path('audio-chunks/', AudioChunkListCreateView.as_view(), name='audiochunk-list'),
     path('audio-chunks/<uuid:pk>/', AudioChunkDetailView.as_view(), name='audiochunk-detail'),
     path('audio-chunks/<uuid:pk>/evaluate/', AudioChunkEvaluateView.as_view(), name='audiochunk-evaluate'),
+    path('audio-chunks/<uuid:pk>/audio/', AudioChunkAudioView.as_view(), name='audiochunk-audio'),
 
     # ProcessingTask URLs
-    # path('processing-tasks/', ProcessingTaskListCreateView.as_view(), name='processing-task-list'),
-    # path('processing-tasks/<uuid:pk>/', ProcessingTaskDetailView.as_view(), name='processing-task-detail'),
+    path('processing-tasks/', ProcessingTaskListCreateView.as_view(), name='processing-task-list'),
+    path('processing-tasks/status/', ProcessingTaskStatusView.as_view(), name='processing-task-status'),
+    path('processing-tasks/stats/', ProcessingTaskStatsView.as_view(), name='processing-task-stats'),
+    path('processing-tasks/<uuid:pk>/', ProcessingTaskDetailView.as_view(), name='processing-task-detail'),
 
     # Statistics URLs
     path('chunk-statistics/', ChunkStatisticsView.as_view(), name='chunk-statistics'),
     path('evaluation-statistics/', EvaluationCategoryStatisticsView.as_view(), name='evaluation-statistics'),
+    path('gpu-queue/', GpuQueueView.as_view(), name='gpu-queue'),
 
     # EvaluationResults URLs
     path('evaluation-results/', EvaluationResultsListCreateView.as_view(), name='evaluationresults-list'),
@@ -1,10 +1,43 @@
+import hashlib
+import json
 import os
+import time
+from math import gcd
 import librosa
 import numpy as np
 import soundfile as sf
-from concurrent.futures import ThreadPoolExecutor
+import soxr
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
 from django.conf import settings
-from transcriptions.models import CleanedAudioFile, AudioFileChunk
+from django.db import connections, transaction
+from transcriptions.models import ProcessedAudioFile, AudioChunk, ChunkingResult
+from transcriptions.pcm_cache import content_hash as cached_content_hash, load_pcm
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+CHUNK_BULK_CREATE_BATCH_SIZE = getattr(settings, "CHUNK_BULK_CREATE_BATCH_SIZE", 500)
+CHUNK_WRITER_THREADS = getattr(settings, "CHUNK_WRITER_THREADS", 4)
+CHUNK_FEATURE_CACHE_DIR = getattr(
+    settings,
+    "CHUNK_FEATURE_CACHE_DIR",
+    os.path.join(settings.MEDIA_ROOT, "cache", "features"),
+)
+# Bump whenever a change to the analysis can move chunk boundaries, so
+# cached features and chunk sets from older code are not reused.
+CHUNKER_VERSION = "1"
+CHUNK_BOUNDARY_BACKEND = getattr(
+    settings, "CHUNK_BOUNDARY_BACKEND", "numba" if numba is not None else "python"
+)
 
 
 def adjust_to_frame_length(chunk_length_ms, frame_length_ms):
@@ -17,78 +50,235 @@ def samples_per_ms(sample_rate, ms):
     return int(sample_rate * ms / 1000)
 
 
+def boundary_parameters(
+    sr, min_chunk_length_ms, max_chunk_length_ms, frame_length_ms, overlap_ms
+):
+    """Millisecond chunking parameters as the sample counts the boundary pass takes."""
+    return (
+        samples_per_ms(
+            sr, adjust_to_frame_length(min_chunk_length_ms, frame_length_ms)
+        ),
+        samples_per_ms(
+            sr, adjust_to_frame_length(max_chunk_length_ms, frame_length_ms)
+        ),
+        samples_per_ms(sr, frame_length_ms),
+        samples_per_ms(sr, overlap_ms),
+    )
+
+
+ZERO_CROSSING_THRESHOLD = 1e-10
+FEATURE_BLOCK_FRAMES = 65536
+
+
+def _frame_block_features(frames):
+    """Energy and zero-crossing count for each row of a 2-D frame block.
+
+    Mirrors ``np.sum(frame ** 2)`` and
+    ``np.sum(librosa.zero_crossings(frame, pad=False))`` row by row, so the
+    results are bit-for-bit identical to the per-frame calls.
+    """
+    energy = np.sum(frames**2, axis=1)
+    signs = np.signbit(frames) & (np.abs(frames) > ZERO_CROSSING_THRESHOLD)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1).astype(np.int64)
+    return energy, zcr
+
+
+def _full_frame_features(audio, frame_length_samples):
+    """Features of every complete frame of ``audio``, computed in bounded blocks."""
+    n_frames = len(audio) // frame_length_samples
+    frames = audio[: n_frames * frame_length_samples].reshape(
+        n_frames, frame_length_samples
+    )
+    energy = np.empty(n_frames, dtype=audio.dtype)
+    zcr = np.empty(n_frames, dtype=np.int64)
+    for start in range(0, n_frames, FEATURE_BLOCK_FRAMES):
+        stop = start + FEATURE_BLOCK_FRAMES
+        energy[start:stop], zcr[start:stop] = _frame_block_features(frames[start:stop])
+    return energy, zcr
+
+
+def frame_features(audio, frame_length_samples):
+    """
+    Per-frame energy and zero-crossing counts for the whole signal.
+
+    Frames start every ``frame_length_samples`` from the beginning of the
+    signal; a trailing partial frame is included as the last entry, the same
+    grid ``analyze_chunks`` walks.
+    """
+    energy, zcr = _full_frame_features(audio, frame_length_samples)
+    tail = audio[len(energy) * frame_length_samples :]
+    if len(tail):
+        tail_energy, tail_zcr = _frame_block_features(tail[np.newaxis, :])
+        energy = np.concatenate([energy, tail_energy])
+        zcr = np.concatenate([zcr, tail_zcr])
+    return energy, zcr
+
+
 def compute_dynamic_thresholds(audio, sr, frame_length_samples, segment_length_samples):
     energy_thresholds = []
     zcr_thresholds = []
 
     for i in range(0, len(audio), segment_length_samples):
         segment = audio[i : i + segment_length_samples]
-        n_frames = max(int(len(segment) / frame_length_samples), 1)
-        energy = np.array(
-            [
-                np.sum(
-                    segment[j * frame_length_samples : (j + 1) * frame_length_samples]
-                    ** 2
-                )
-                for j in range(n_frames)
-            ]
-        )
-        zcr = np.array(
-            [
-                np.sum(
-                    librosa.zero_crossings(
-                        segment[
-                            j * frame_length_samples : (j + 1) * frame_length_samples
-                        ],
-                        pad=False,
-                    )
-                )
-                for j in range(n_frames)
-            ]
-        )
+        # Segments are not frame aligned, so frames are taken relative to the
+        # segment start; a segment shorter than a frame counts as one frame.
+        if len(segment) >= frame_length_samples:
+            energy, zcr = _full_frame_features(segment, frame_length_samples)
+        else:
+            energy, zcr = _frame_block_features(segment[np.newaxis, :])
         energy_thresholds.append(np.mean(energy) + 3 * np.std(energy))
         zcr_thresholds.append(np.mean(zcr) + 3 * np.std(zcr))
 
     return energy_thresholds, zcr_thresholds
 
 
-def analyze_chunks(
-    audio,
-    sr,
+def silent_frames(
+    energy,
+    zcr,
+    frame_length_samples,
+    segment_length_samples,
+    energy_thresholds,
+    zcr_thresholds,
+):
+    """Boolean array marking frames below both thresholds of their segment."""
+    frame_starts = np.arange(len(energy), dtype=np.int64) * frame_length_samples
+    segment_index = np.minimum(
+        frame_starts // segment_length_samples, len(energy_thresholds) - 1
+    )
+    return (energy <= np.asarray(energy_thresholds)[segment_index]) & (
+        zcr <= np.asarray(zcr_thresholds)[segment_index]
+    )
+
+
+def _boundary_kernel(
+    is_silent,
+    n_samples,
     min_chunk_length_samples,
     max_chunk_length_samples,
     frame_length_samples,
     overlap_samples,
 ):
-    segment_length_samples = len(audio) // 5
-    energy_thresholds, zcr_thresholds = compute_dynamic_thresholds(
-        audio, sr, frame_length_samples, segment_length_samples
+    """
+    ``_find_chunk_boundaries_python`` written for numba: -1 stands for None
+    and results go to preallocated start/end arrays.
+    """
+    starts = np.empty(len(is_silent) + 1, dtype=np.int64)
+    ends = np.empty(len(is_silent) + 1, dtype=np.int64)
+    count = 0
+    current_chunk_start = -1
+    last_valid_end = -1
+    is_previous_frame_silent = False
+
+    for frame_index in range(len(is_silent)):
+        i = frame_index * frame_length_samples
+        is_silent_frame = is_silent[frame_index]
+
+        if current_chunk_start < 0 and not is_silent_frame:
+            current_chunk_start = i
+            last_valid_end = i + frame_length_samples
+
+        if current_chunk_start >= 0:
+            if is_silent_frame and (
+                is_previous_frame_silent
+                or i + frame_length_samples - current_chunk_start
+                >= max_chunk_length_samples
+            ):
+                if (
+                    last_valid_end > 0
+                    and last_valid_end - current_chunk_start >= min_chunk_length_samples
+                ):
+                    starts[count] = current_chunk_start
+                    ends[count] = last_valid_end + overlap_samples
+                    count += 1
+                    current_chunk_start = -1
+            else:
+                last_valid_end = i + frame_length_samples
+                if (
+                    not is_silent_frame
+                    and i + frame_length_samples - current_chunk_start
+                    >= max_chunk_length_samples
+                ):
+                    starts[count] = current_chunk_start
+                    ends[count] = min(n_samples, last_valid_end + overlap_samples)
+                    count += 1
+                    current_chunk_start = -1
+
+        is_previous_frame_silent = is_silent_frame
+
+    if (
+        current_chunk_start >= 0
+        and last_valid_end - current_chunk_start >= min_chunk_length_samples
+    ):
+        starts[count] = current_chunk_start
+        ends[count] = min(n_samples, last_valid_end + overlap_samples)
+        count += 1
+
+    return starts[:count], ends[:count]
+
+
+_compiled_boundary_kernel = None
+
+
+def _find_chunk_boundaries_numba(is_silent, *args):
+    global _compiled_boundary_kernel
+    if _compiled_boundary_kernel is None:
+        _compiled_boundary_kernel = numba.njit(cache=True, nogil=True)(_boundary_kernel)
+    starts, ends = _compiled_boundary_kernel(
+        np.ascontiguousarray(is_silent, dtype=np.bool_), *args
+    )
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def find_chunk_boundaries(
+    is_silent,
+    n_samples,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+    backend=None,
+):
+    """
+    Run the silence/boundary state machine over precomputed frame flags.
+
+    ``backend`` is "numba" or "python"; by default the compiled kernel is
+    used whenever numba imports, and both give identical boundaries.
+    """
+    backend = backend or CHUNK_BOUNDARY_BACKEND
+    args = (
+        int(n_samples),
+        int(min_chunk_length_samples),
+        int(max_chunk_length_samples),
+        int(frame_length_samples),
+        int(overlap_samples),
     )
+    if backend == "numba" and numba is not None:
+        return _find_chunk_boundaries_numba(is_silent, *args)
+    return _find_chunk_boundaries_python(is_silent, *args)
 
+
+def _find_chunk_boundaries_python(
+    is_silent,
+    n_samples,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+):
     chunks = []
     current_chunk_start = None
     last_valid_end = None
     is_previous_frame_silent = False
 
-    for i in range(0, len(audio), frame_length_samples):
-        segment_index = i // segment_length_samples
-        segment_index = min(segment_index, len(energy_thresholds) - 1)
-
-        energy_threshold = energy_thresholds[segment_index]
-        zcr_threshold = zcr_thresholds[segment_index]
-
-        frame = audio[i : min(i + frame_length_samples, len(audio))]
-        frame_energy = np.sum(frame**2)
-        frame_zcr = np.sum(librosa.zero_crossings(frame, pad=False))
+    for frame_index, is_silent_frame in enumerate(is_silent.tolist()):
+        i = frame_index * frame_length_samples
 
-        is_silent = frame_energy <= energy_threshold and frame_zcr <= zcr_threshold
-
-        if current_chunk_start is None and not is_silent:
+        if current_chunk_start is None and not is_silent_frame:
             current_chunk_start = i
             last_valid_end = i + frame_length_samples
 
         if current_chunk_start is not None:
-            if is_silent and (
+            if is_silent_frame and (
                 is_previous_frame_silent
                 or i + frame_length_samples - current_chunk_start
                 >= max_chunk_length_samples
@@ -104,32 +294,303 @@ def analyze_chunks(
             else:
                 last_valid_end = i + frame_length_samples
                 if (
-                    not is_silent
+                    not is_silent_frame
                     and i + frame_length_samples - current_chunk_start
                     >= max_chunk_length_samples
                 ):
                     chunks.append(
                         (
                             current_chunk_start,
-                            min(len(audio), last_valid_end + overlap_samples),
+                            min(n_samples, last_valid_end + overlap_samples),
                         )
                     )
                     current_chunk_start = None
 
-        is_previous_frame_silent = is_silent
+        is_previous_frame_silent = is_silent_frame
 
     if (
         current_chunk_start is not None
         and last_valid_end - current_chunk_start >= min_chunk_length_samples
     ):
         chunks.append(
-            (current_chunk_start, min(len(audio), last_valid_end + overlap_samples))
+            (current_chunk_start, min(n_samples, last_valid_end + overlap_samples))
         )
 
     return chunks
 
 
+def analyze_frames(audio, frame_length_samples):
+    """Frame features and per-segment thresholds of a fully decoded signal."""
+    segment_length_samples = len(audio) // 5
+    energy_thresholds, zcr_thresholds = compute_dynamic_thresholds(
+        audio, None, frame_length_samples, segment_length_samples
+    )
+    energy, zcr = frame_features(audio, frame_length_samples)
+    return {
+        "energy": energy,
+        "zcr": zcr,
+        "energy_thresholds": energy_thresholds,
+        "zcr_thresholds": zcr_thresholds,
+        "n_samples": len(audio),
+    }
+
+
+def boundaries_from_analysis(
+    analysis,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+):
+    """Chunk boundaries from the output of ``analyze_frames``."""
+    is_silent = silent_frames(
+        analysis["energy"],
+        analysis["zcr"],
+        frame_length_samples,
+        analysis["n_samples"] // 5,
+        analysis["energy_thresholds"],
+        analysis["zcr_thresholds"],
+    )
+    return find_chunk_boundaries(
+        is_silent,
+        analysis["n_samples"],
+        min_chunk_length_samples,
+        max_chunk_length_samples,
+        frame_length_samples,
+        overlap_samples,
+    )
+
+
+def analyze_chunks(
+    audio,
+    sr,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+):
+    return boundaries_from_analysis(
+        analyze_frames(audio, frame_length_samples),
+        min_chunk_length_samples,
+        max_chunk_length_samples,
+        frame_length_samples,
+        overlap_samples,
+    )
+
+
+STREAM_BLOCK_SECONDS = 60
+
+
+def streamed_length(input_file, sr):
+    """Length in samples of ``input_file`` once resampled to ``sr``, from its header."""
+    info = sf.info(input_file)
+    if info.samplerate == sr:
+        return info.frames
+    return int(np.ceil(info.frames * float(sr) / info.samplerate))
+
+
+def iter_audio_blocks(input_file, sr, block_seconds=STREAM_BLOCK_SECONDS):
+    """
+    Yield mono float32 blocks of ``input_file`` resampled to ``sr``.
+
+    Decodes the same samples as ``librosa.load(input_file, sr=sr)`` (channel
+    mean, then soxr HQ resampling), trimmed or zero-padded to the length
+    librosa would return, without holding the whole signal in memory.
+    """
+    n_samples = streamed_length(input_file, sr)
+    emitted = 0
+    with sf.SoundFile(input_file) as f:
+        resampler = None
+        if f.samplerate != sr:
+            resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype="float32")
+        for block in f.blocks(
+            blocksize=int(block_seconds * f.samplerate), dtype="float32", always_2d=True
+        ):
+            mono = block[:, 0] if block.shape[1] == 1 else np.mean(block.T, axis=0)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono)
+            mono = mono[: n_samples - emitted]
+            emitted += len(mono)
+            if len(mono):
+                yield mono
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            tail = tail[: n_samples - emitted]
+            emitted += len(tail)
+            if len(tail):
+                yield tail
+    if emitted < n_samples:
+        yield np.zeros(n_samples - emitted, dtype=np.float32)
+
+
+class _FrameFeatureStream:
+    """Accumulates frame features over blocks on a fixed frame grid."""
+
+    def __init__(self, frame_length_samples):
+        self.frame_length_samples = frame_length_samples
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.energy = []
+        self.zcr = []
+
+    def feed(self, block):
+        block = np.concatenate([self.carry, block]) if len(self.carry) else block
+        energy, zcr = _full_frame_features(block, self.frame_length_samples)
+        self.energy.append(energy)
+        self.zcr.append(zcr)
+        self.carry = block[len(energy) * self.frame_length_samples :].copy()
+
+    def finish(self, include_tail):
+        """Return the feature arrays, with the trailing partial frame if asked."""
+        if include_tail and len(self.carry):
+            energy, zcr = _frame_block_features(self.carry[np.newaxis, :])
+            self.energy.append(energy)
+            self.zcr.append(zcr)
+        return (
+            np.concatenate(self.energy or [np.zeros(0, dtype=np.float32)]),
+            np.concatenate(self.zcr or [np.zeros(0, dtype=np.int64)]),
+        )
+
+
+def stream_frame_analysis(blocks, n_samples, frame_length_samples):
+    """
+    Single pass over ``blocks`` producing everything the boundary pass needs.
+
+    Returns the same dict as ``analyze_frames`` on the fully decoded signal.
+    """
+    segment_length_samples = n_samples // 5
+    if segment_length_samples == 0:
+        raise ValueError("Audio is too short to split into threshold segments")
+    frames = _FrameFeatureStream(frame_length_samples)
+    segment = _FrameFeatureStream(frame_length_samples)
+    segment_filled = 0
+    energy_thresholds = []
+    zcr_thresholds = []
+
+    def close_segment(segment):
+        # Like compute_dynamic_thresholds: full frames only, unless the
+        # segment is shorter than a frame and counts as one partial frame.
+        has_full_frames = any(len(energy) for energy in segment.energy)
+        energy, zcr = segment.finish(include_tail=not has_full_frames)
+        energy_thresholds.append(np.mean(energy) + 3 * np.std(energy))
+        zcr_thresholds.append(np.mean(zcr) + 3 * np.std(zcr))
+
+    for block in blocks:
+        frames.feed(block)
+        while len(block):
+            take = min(len(block), segment_length_samples - segment_filled)
+            segment.feed(block[:take])
+            segment_filled += take
+            block = block[take:]
+            if segment_filled == segment_length_samples:
+                close_segment(segment)
+                segment = _FrameFeatureStream(frame_length_samples)
+                segment_filled = 0
+    if segment_filled:
+        close_segment(segment)
+
+    energy, zcr = frames.finish(include_tail=True)
+    return {
+        "energy": energy,
+        "zcr": zcr,
+        "energy_thresholds": energy_thresholds,
+        "zcr_thresholds": zcr_thresholds,
+        "n_samples": n_samples,
+    }
+
+
+def stream_chunk_boundaries(
+    input_file,
+    sr,
+    min_chunk_length_samples,
+    max_chunk_length_samples,
+    frame_length_samples,
+    overlap_samples,
+    block_seconds=STREAM_BLOCK_SECONDS,
+):
+    """Streaming equivalent of ``analyze_chunks(librosa.load(input_file, sr=sr)[0], ...)``."""
+    n_samples = streamed_length(input_file, sr)
+    analysis = stream_frame_analysis(
+        iter_audio_blocks(input_file, sr, block_seconds),
+        n_samples,
+        frame_length_samples,
+    )
+    chunks = boundaries_from_analysis(
+        analysis,
+        min_chunk_length_samples,
+        max_chunk_length_samples,
+        frame_length_samples,
+        overlap_samples,
+    )
+    return chunks, n_samples
+
+
+def iter_chunk_audio(blocks, chunks):
+    """
+    Yield ``(index, samples)`` for each ``(start, end)`` chunk of a block stream.
+
+    A chunk is yielded as soon as the stream has passed its end; only the
+    samples still needed by the next pending chunk are kept buffered.
+    """
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_start = 0
+    pending = 0
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        buffer_end = buffer_start + len(buffer)
+        while pending < len(chunks) and chunks[pending][1] <= buffer_end:
+            start, end = chunks[pending]
+            yield pending, buffer[start - buffer_start : end - buffer_start]
+            pending += 1
+        keep_from = chunks[pending][0] if pending < len(chunks) else buffer_end
+        drop = min(len(buffer), max(0, keep_from - buffer_start))
+        buffer = buffer[drop:]
+        buffer_start += drop
+
+    # Chunks padded by the overlap may end past the last sample.
+    for index in range(pending, len(chunks)):
+        start, end = chunks[index]
+        yield index, buffer[start - buffer_start : end - buffer_start]
+
+
+def chunking_cache_key(project_id, content_hash, parameters):
+    """Identity of one chunking run: same key, same boundaries and chunk files."""
+    payload = json.dumps(
+        [str(project_id), content_hash, parameters, CHUNKER_VERSION], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _feature_cache_path(content_hash, sr, frame_length_samples):
+    return os.path.join(
+        CHUNK_FEATURE_CACHE_DIR,
+        f"{content_hash}_{sr}_{frame_length_samples}_v{CHUNKER_VERSION}.npz",
+    )
+
+
+def load_cached_frame_analysis(content_hash, sr, frame_length_samples):
+    """Return a cached ``analyze_frames`` result, or None on a miss."""
+    path = _feature_cache_path(content_hash, sr, frame_length_samples)
+    try:
+        with np.load(path) as cached:
+            analysis = {name: cached[name] for name in cached.files}
+    except (OSError, ValueError):
+        return None
+    analysis["n_samples"] = int(analysis["n_samples"])
+    return analysis
+
+
+def save_cached_frame_analysis(content_hash, sr, frame_length_samples, analysis):
+    path = _feature_cache_path(content_hash, sr, frame_length_samples)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so concurrent workers never read a partial file.
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **analysis)
+    os.replace(tmp_path, path)
+
+
 def save_chunk(y, sr, start_end_tuple, index, output_dir, file_prefix, output_format):
+    """Write one chunk to disk and return the fields of its AudioChunk row."""
     start, end = start_end_tuple
     chunk = y[start:end]
     chunk_audio_path = os.path.join(
@@ -137,11 +598,71 @@ def save_chunk(y, sr, start_end_tuple, index, output_dir, file_prefix, output_fo
     )
     sf.write(chunk_audio_path, chunk, sr)
 
-    AudioFileChunk.objects.create(
-        chunk_file=os.path.relpath(chunk_audio_path, settings.MEDIA_ROOT),
-        duration=librosa.get_duration(y=chunk, sr=sr),
-    )
-    return chunk_audio_path
+    return {
+        "chunk_file": os.path.relpath(chunk_audio_path, settings.MEDIA_ROOT),
+        "duration": librosa.get_duration(y=chunk, sr=sr),
+    }
+
+
+def virtual_chunk_record(input_file, sr, start_end_tuple, n_samples):
+    """Fields of an AudioChunk that references a range of ``input_file``."""
+    start, end = start_end_tuple
+    num_samples = min(end, n_samples) - start
+    return {
+        "chunk_file": "",
+        "source_file": os.path.relpath(input_file, settings.MEDIA_ROOT),
+        "sample_rate": sr,
+        "start_sample": start,
+        "num_samples": num_samples,
+        "duration": num_samples / sr,
+    }
+
+
+# Seconds of context around a virtual chunk that is read and resampled with it
+READ_RESAMPLE_PAD = 0.1
+
+
+def read_chunk_audio(chunk):
+    """
+    Materialize a virtual chunk: read only its range of the source file.
+
+    Returns mono float32 samples at ``chunk.sample_rate``: exactly the
+    samples a file chunk cut from ``librosa.load(source,
+    sr=chunk.sample_rate)`` holds when the source is at that rate, and the
+    same to within float rounding (about 1e-7) when it has to be resampled.
+    """
+    path = os.path.join(settings.MEDIA_ROOT, chunk.source_file)
+    sr, start, end = chunk.sample_rate, chunk.start_sample, chunk.start_sample + chunk.num_samples
+    with sf.SoundFile(path) as f:
+        source_rate = f.samplerate
+        if source_rate == sr:
+            f.seek(start)
+            first = start
+            block = f.read(chunk.num_samples, dtype="float32", always_2d=True)
+        else:
+            # Resample a padded window that starts on a sample both rates
+            # share, so its output samples line up with the whole file's and
+            # the resampler's edge effects fall in the padding.
+            pad = int(READ_RESAMPLE_PAD * sr)
+            step = sr // gcd(source_rate, sr)
+            first = max(start - pad, 0) // step * step
+            source_first = first * source_rate // sr
+            source_last = -(-(end + pad) * source_rate // sr)
+            f.seek(source_first)
+            block = f.read(source_last - source_first, dtype="float32", always_2d=True)
+    mono = block[:, 0] if block.shape[1] == 1 else np.mean(block.T, axis=0)
+    if source_rate != sr:
+        mono = soxr.resample(mono, source_rate, sr)
+    return mono[start - first : end - first]
+
+
+def save_chunk_records(project, chunk_records, batch_size=CHUNK_BULK_CREATE_BATCH_SIZE):
+    """Insert the AudioChunk rows of one file in a single transaction."""
+    with transaction.atomic():
+        return AudioChunk.objects.bulk_create(
+            [AudioChunk(project=project, **record) for record in chunk_records],
+            batch_size=batch_size,
+        )
 
 
 def split_and_save_chunks(
@@ -152,55 +673,446 @@ def split_and_save_chunks(
     frame_length_ms=30,
     sr=16000,
     overlap_ms=2000,
+    streaming=False,
+    block_seconds=STREAM_BLOCK_SECONDS,
+    batch_size=CHUNK_BULK_CREATE_BATCH_SIZE,
+    writer_threads=CHUNK_WRITER_THREADS,
+    use_cache=True,
+    virtual=False,
 ):
-    input_file = audio_obj.audio_file.path
+    """
+    Split a processed file into chunk files and AudioChunk rows.
+
+    With ``virtual`` no audio is written: each chunk row records its sample
+    range of the processed file and is read on demand (``read_chunk_audio``).
+
+    With ``use_cache`` a file whose content and parameters were already
+    chunked is a no-op, and a parameter change reuses the cached frame
+    features so only the boundary pass and the chunk writes are redone.
+    Returns the number of chunks.
+    """
+    input_file = audio_obj.processed_file.path
     output_dir = os.path.join(settings.MEDIA_ROOT, "audio_chunks")
     os.makedirs(output_dir, exist_ok=True)
-    file_prefix = os.path.splitext(os.path.basename(input_file))[0]
 
-    y, _ = librosa.load(input_file, sr=sr)
-    overlap_samples = samples_per_ms(sr, overlap_ms)
-    frame_length_samples = samples_per_ms(sr, frame_length_ms)
-    min_chunk_length_samples = samples_per_ms(
-        sr, adjust_to_frame_length(min_chunk_length_ms, frame_length_ms)
-    )
-    max_chunk_length_samples = samples_per_ms(
-        sr, adjust_to_frame_length(max_chunk_length_ms, frame_length_ms)
+    (
+        min_chunk_length_samples,
+        max_chunk_length_samples,
+        frame_length_samples,
+        overlap_samples,
+    ) = boundary_parameters(
+        sr, min_chunk_length_ms, max_chunk_length_ms, frame_length_ms, overlap_ms
     )
-    chunks = analyze_chunks(
-        y,
-        sr,
+    parameters = {
+        "output_format": output_format,
+        "min_chunk_length_ms": min_chunk_length_ms,
+        "max_chunk_length_ms": max_chunk_length_ms,
+        "frame_length_ms": frame_length_ms,
+        "sr": sr,
+        "overlap_ms": overlap_ms,
+        "virtual": virtual,
+    }
+
+    content_hash = cached_content_hash(input_file)
+    cache_key = chunking_cache_key(audio_obj.project_id, content_hash, parameters)
+    if use_cache:
+        cached = ChunkingResult.objects.filter(cache_key=cache_key).first()
+        if cached is not None:
+            # Chunks deleted since (e.g. rejected ones) are not recreated.
+            return len(cached.chunk_ids)
+
+    # Chunk file names carry the run key so a new parameter set never
+    # overwrites the files of an earlier chunk set.
+    file_prefix = f"{os.path.splitext(os.path.basename(input_file))[0]}_{cache_key[:8]}"
+
+    y = None
+    analysis = None
+    if use_cache:
+        analysis = load_cached_frame_analysis(content_hash, sr, frame_length_samples)
+    if analysis is None:
+        if streaming:
+            analysis = stream_frame_analysis(
+                iter_audio_blocks(input_file, sr, block_seconds),
+                streamed_length(input_file, sr),
+                frame_length_samples,
+            )
+        else:
+            y = load_pcm(input_file, sr)
+            analysis = analyze_frames(y, frame_length_samples)
+        if use_cache:
+            save_cached_frame_analysis(content_hash, sr, frame_length_samples, analysis)
+    chunks = boundaries_from_analysis(
+        analysis,
         min_chunk_length_samples,
         max_chunk_length_samples,
         frame_length_samples,
         overlap_samples,
     )
 
-    chunk_paths = []
-    with ThreadPoolExecutor() as executor:
+    # Writer threads only touch the filesystem; rows are inserted afterwards
+    # from this thread so no extra DB connections are opened.
+    chunk_records = []
+    if virtual:
+        chunk_records = [
+            virtual_chunk_record(input_file, sr, chunk, analysis["n_samples"])
+            for chunk in chunks
+        ]
+    elif streaming:
+        # Peak memory is one block plus the longest chunk, whatever the duration.
+        blocks = iter_audio_blocks(input_file, sr, block_seconds)
+        for i, samples in iter_chunk_audio(blocks, chunks):
+            chunk_records.append(
+                save_chunk(
+                    samples,
+                    sr,
+                    (0, len(samples)),
+                    i,
+                    output_dir,
+                    file_prefix,
+                    output_format,
+                )
+            )
+    else:
+        if y is None:
+            y = load_pcm(input_file, sr)
+        with ThreadPoolExecutor(max_workers=writer_threads) as executor:
+            futures = [
+                executor.submit(
+                    save_chunk, y, sr, chunk, i, output_dir, file_prefix, output_format
+                )
+                for i, chunk in enumerate(chunks)
+            ]
+            for future in futures:
+                chunk_records.append(future.result())
+
+    with transaction.atomic():
+        saved = save_chunk_records(audio_obj.project, chunk_records, batch_size)
+        if use_cache:
+            ChunkingResult.objects.update_or_create(
+                cache_key=cache_key,
+                defaults={
+                    "project": audio_obj.project,
+                    "content_hash": content_hash,
+                    "parameters": parameters,
+                    "algorithm_version": CHUNKER_VERSION,
+                    "boundaries": [list(chunk) for chunk in chunks],
+                    "chunk_ids": [str(chunk.unique_id) for chunk in saved],
+                },
+            )
+    return len(chunk_records)
+
+
+def chunk_processed_audio_file(unique_id, **chunk_options):
+    """
+    Chunk one ProcessedAudioFile by primary key and report the outcome.
+
+    Errors are returned rather than raised so a corrupt file only fails its
+    own entry in a batch.
+    """
+    started = time.monotonic()
+    result = {"unique_id": str(unique_id)}
+    try:
+        audio_obj = ProcessedAudioFile.objects.select_related("project").get(
+            pk=unique_id
+        )
+        result["file"] = audio_obj.processed_file.name
+        result["chunks"] = split_and_save_chunks(audio_obj, **chunk_options)
+        result["status"] = "success"
+    except Exception as e:
+        result["status"] = "error"
+        result["message"] = str(e) or repr(e)
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def _init_chunk_worker():
+    """Set up Django in a pool worker; it opens its own DB connection on first query."""
+    import django
+
+    django.setup()
+
+
+def process_all_cleaned_audio(
+    workers=None, project=None, limit=None, on_result=None, **chunk_options
+):
+    """
+    Chunk every ProcessedAudioFile (optionally one project's, up to ``limit``)
+    across a pool of ``workers`` processes.
+
+    ``on_result`` is called in the parent with each file's result as soon as
+    it finishes. If a worker process dies (e.g. a decoder crash), the files
+    it may have been handling are reported as failed and the remaining files
+    continue on a fresh pool.
+    """
+    queryset = ProcessedAudioFile.objects.order_by("created_at")
+    if project is not None:
+        queryset = queryset.filter(project=project)
+    if limit:
+        queryset = queryset[:limit]
+    pending = [str(pk) for pk in queryset.values_list("unique_id", flat=True)]
+    pending.reverse()
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+
+    def record(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    # Forked workers must not share the parent's database sockets.
+    connections.close_all()
+
+    while pending:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_chunk_worker
+        ) as executor:
+            in_flight = {}
+            broken = False
+            while (pending or in_flight) and not broken:
+                while pending and len(in_flight) < workers * 2:
+                    unique_id = pending.pop()
+                    future = executor.submit(
+                        chunk_processed_audio_file, unique_id, **chunk_options
+                    )
+                    in_flight[future] = unique_id
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unique_id = in_flight.pop(future)
+                    try:
+                        record(future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        record(
+                            {
+                                "unique_id": unique_id,
+                                "status": "error",
+                                "message": "Worker process terminated abruptly",
+                            }
+                        )
+            for unique_id in in_flight.values():
+                record(
+                    {
+                        "unique_id": unique_id,
+                        "status": "error",
+                        "message": "Worker process terminated abruptly",
+                    }
+                )
+
+    return results
+
+
+SWEEP_HISTOGRAM_EDGES_S = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 15, 20, 30)
+
+
+def _sweep_stats(chunks, is_silent, frame_length_samples, edges):
+    """Additive per-file counts for one configuration, in samples and frames."""
+    lengths = np.array([end - start for start, end in chunks], dtype=np.int64)
+    # Mark every frame that overlaps a chunk, then count the speech ones.
+    coverage = np.zeros(len(is_silent) + 1, dtype=np.int64)
+    for start, end in chunks:
+        coverage[start // frame_length_samples] += 1
+        coverage[min(len(is_silent), -(-end // frame_length_samples))] -= 1
+    covered = np.cumsum(coverage[:-1]) > 0
+    speech = ~is_silent
+    return {
+        "chunks": len(chunks),
+        "chunk_samples": int(lengths.sum()),
+        "histogram": np.histogram(lengths, bins=edges)[0].tolist(),
+        "speech_frames": int(speech.sum()),
+        "covered_speech_frames": int((speech & covered).sum()),
+    }
+
+
+def sweep_file(
+    input_file,
+    configs,
+    sr=16000,
+    histogram_edges_s=SWEEP_HISTOGRAM_EDGES_S,
+    use_cache=False,
+):
+    """
+    Evaluate chunking configurations on one file without writing audio or rows.
+
+    Each config is a dict of ``min_chunk_length_ms``, ``max_chunk_length_ms``,
+    ``frame_length_ms`` and ``overlap_ms``. The file is decoded at most once
+    and frame features are computed once per distinct frame length (or read
+    from the feature cache), so extra configs only cost a boundary pass.
+    ``use_cache`` reads and fills PCM_CACHE_DIR and CHUNK_FEATURE_CACHE_DIR,
+    which speeds up a later real run but writes to disk; it is off by
+    default so a dry run leaves no files behind.
+    Returns one dict of additive counts per config, in order.
+    """
+    edges = np.append(np.asarray(histogram_edges_s, dtype=float) * sr, np.inf)
+    content_hash = cached_content_hash(input_file) if use_cache else None
+    y = None
+    silence_by_frame_length = {}
+    results = []
+    for config in configs:
+        (
+            min_chunk_length_samples,
+            max_chunk_length_samples,
+            frame_length_samples,
+            overlap_samples,
+        ) = boundary_parameters(sr, **config)
+
+        if frame_length_samples not in silence_by_frame_length:
+            analysis = None
+            if use_cache:
+                analysis = load_cached_frame_analysis(
+                    content_hash, sr, frame_length_samples
+                )
+            if analysis is None:
+                if y is None:
+                    y = (
+                        load_pcm(input_file, sr)
+                        if use_cache
+                        else librosa.load(input_file, sr=sr)[0]
+                    )
+                analysis = analyze_frames(y, frame_length_samples)
+                if use_cache:
+                    save_cached_frame_analysis(
+                        content_hash, sr, frame_length_samples, analysis
+                    )
+            is_silent = silent_frames(
+                analysis["energy"],
+                analysis["zcr"],
+                frame_length_samples,
+                analysis["n_samples"] // 5,
+                analysis["energy_thresholds"],
+                analysis["zcr_thresholds"],
+            )
+            silence_by_frame_length[frame_length_samples] = (
+                analysis["n_samples"],
+                is_silent,
+            )
+
+        n_samples, is_silent = silence_by_frame_length[frame_length_samples]
+        chunks = find_chunk_boundaries(
+            is_silent,
+            n_samples,
+            min_chunk_length_samples,
+            max_chunk_length_samples,
+            frame_length_samples,
+            overlap_samples,
+        )
+        stats = _sweep_stats(chunks, is_silent, frame_length_samples, edges)
+        stats["audio_samples"] = n_samples
+        results.append(stats)
+    return results
+
+
+def _sweep_processed_audio_file(unique_id, path, configs, **sweep_options):
+    """Sweep one file for a pool worker; errors are returned, not raised."""
+    try:
+        return {
+            "unique_id": unique_id,
+            "status": "success",
+            "stats": sweep_file(path, configs, **sweep_options),
+        }
+    except Exception as e:
+        return {"unique_id": unique_id, "status": "error", "message": str(e) or repr(e)}
+
+
+def sweep_processed_audio(
+    configs,
+    project=None,
+    limit=None,
+    workers=None,
+    on_result=None,
+    sr=16000,
+    histogram_edges_s=SWEEP_HISTOGRAM_EDGES_S,
+    use_cache=False,
+):
+    """
+    Dry-run ``configs`` over every ProcessedAudioFile (optionally one
+    project's, up to ``limit``) and summarise each config across the files:
+    chunk count, chunk duration histogram and percentage of speech frames
+    that fall inside a chunk. ``use_cache`` is passed on to ``sweep_file``.
+    """
+    queryset = ProcessedAudioFile.objects.order_by("created_at")
+    if project is not None:
+        queryset = queryset.filter(project=project)
+    if limit:
+        queryset = queryset[:limit]
+    files = [
+        (str(pk), os.path.join(settings.MEDIA_ROOT, name))
+        for pk, name in queryset.values_list("unique_id", "processed_file")
+    ]
+
+    totals = [
+        {
+            "chunks": 0,
+            "chunk_samples": 0,
+            "histogram": [0] * len(histogram_edges_s),
+            "speech_frames": 0,
+            "covered_speech_frames": 0,
+            "audio_samples": 0,
+        }
+        for _ in configs
+    ]
+    failed = []
+
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1, initializer=_init_chunk_worker
+    ) as executor:
         futures = [
             executor.submit(
-                save_chunk, y, sr, chunk, i, output_dir, file_prefix, output_format
+                _sweep_processed_audio_file,
+                unique_id,
+                path,
+                configs,
+                sr=sr,
+                histogram_edges_s=histogram_edges_s,
+                use_cache=use_cache,
             )
-            for i, chunk in enumerate(chunks)
+            for unique_id, path in files
         ]
-        for future in futures:
-            chunk_paths.append(future.result())
-
-    # Save to ChunkedAudio model
-    # for chunk_path in chunk_paths:
-    #     AudioFileChunk.objects.create(
-    #         chunk_file=os.path.relpath(chunk_path, settings.MEDIA_ROOT),
-    #         defaults={
-    #             "file_size": os.path.getsize(chunk_path),
-    #             "duration": librosa.get_duration(y=chunk, sr=sr),
-    #         },
-    #     )
-
-    return len(chunk_paths)
-
-
-def process_all_cleaned_audio():
-    CleanedAudioFiles = CleanedAudioFile.objects.all()
-    for audio_file in CleanedAudioFiles:
-        split_and_save_chunks(audio_file)
+        for future in as_completed(futures):
+            result = future.result()
+            if on_result:
+                on_result(result)
+            if result["status"] != "success":
+                failed.append(result)
+                continue
+            for total, stats in zip(totals, result["stats"]):
+                for key, value in stats.items():
+                    if key == "histogram":
+                        total[key] = [a + b for a, b in zip(total[key], value)]
+                    else:
+                        total[key] += value
+
+    summaries = []
+    for config, total in zip(configs, totals):
+        edges = list(histogram_edges_s) + [None]
+        summaries.append(
+            {
+                "parameters": config,
+                "chunks": total["chunks"],
+                "chunk_seconds": round(total["chunk_samples"] / sr, 3),
+                "mean_chunk_seconds": (
+                    round(total["chunk_samples"] / sr / total["chunks"], 3)
+                    if total["chunks"]
+                    else None
+                ),
+                "duration_histogram": [
+                    {"from_s": edges[i], "to_s": edges[i + 1], "chunks": count}
+                    for i, count in enumerate(total["histogram"])
+                ],
+                "speech_coverage_pct": (
+                    round(
+                        100 * total["covered_speech_frames"] / total["speech_frames"],
+                        2,
+                    )
+                    if total["speech_frames"]
+                    else None
+                ),
+                "audio_seconds": round(total["audio_samples"] / sr, 3),
+            }
+        )
+    return {
+        "files": len(files) - len(failed),
+        "failed": failed,
+        "configs": summaries,
+    }
@@ -1,7 +1,10 @@
-import json
+import io
 import os
+import json
 import logging
-import subprocess
+import uuid
+from datetime import timedelta
+import soundfile as sf
 from rest_framework import generics, permissions, status, serializers
 from .models import (
     Project,
@@ -11,6 +14,7 @@ from .models import (
     CaseRecord,
     AudioChunk,
     EvaluationResults,
+    ProcessingTask,
 )
 from .serializers import (
     AudioFileSerializer,
@@ -24,15 +28,30 @@ from .serializers import (
     EvaluationResultsSerializer,
     EvaluationResultsLeaderBoardSerializer,
     EvaluationResultsSummarySerializer,
+    ProcessingTaskSerializer,
+    ProcessingTaskStatusSerializer,
     ProjectSerializer
 )
+from .audio_metadata import probe_audio
+from .dispatch import enqueue_many, preprocess_payload, queue_depth
+from .pagination import KeysetPagination
+from .tracking import apply_status_updates, stage_timings
+from .utils import read_chunk_audio
 from rest_framework.response import Response
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db.models import (
+    Exists,
+    Max,
     Subquery,
     OuterRef,
     Count,
@@ -46,6 +65,13 @@ from rest_framework.parsers import MultiPartParser, FormParser
 
 logger = logging.getLogger(__name__)
 
+
+def build_chunk_url(request, unique_id, chunk_file):
+    """Absolute URL of a chunk's audio; virtual chunks are served by AudioChunkAudioView."""
+    if chunk_file:
+        return request.build_absolute_uri(f"/shared/{chunk_file}")
+    return request.build_absolute_uri(reverse("audiochunk-audio", args=[unique_id]))
+
 class BaseListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -208,7 +234,9 @@ class ProcessedAudioFileToggleApprovedView(generics.UpdateAPIView):
         processed_audio = self.get_object()
         processed_audio.is_approved = not processed_audio.is_approved
         processed_audio.updated_by = request.user
-        processed_audio.save()
+        # Commit the approval together with its diarization request
+        with transaction.atomic():
+            processed_audio.save()
         return Response(
             {"status": "updated", "is_approved": processed_audio.is_approved},
             status=status.HTTP_200_OK,
@@ -373,6 +401,31 @@ class AudioChunkDetailView(BaseRetrieveUpdateDestroyView):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
+class AudioChunkAudioView(BaseGenericAPIView):
+    """
+    Serve a chunk's audio. File chunks are streamed from disk; virtual chunks
+    are materialized from their sample range of the source file.
+    """
+    queryset = AudioChunk.objects.all()
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        chunk = self.get_object()
+        if not chunk.is_virtual:
+            return FileResponse(chunk.chunk_file.open("rb"), content_type="audio/wav")
+
+        try:
+            samples = read_chunk_audio(chunk)
+        except Exception as e:
+            logger.error(f"Error reading virtual chunk {chunk.unique_id}: {e}")
+            return Response(
+                {"error": "Failed to read chunk audio"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, chunk.sample_rate, format="WAV")
+        return HttpResponse(buffer.getvalue(), content_type="audio/wav")
+
 # ✅ EvaluationResults Views
 class EvaluationResultsListCreateView(BaseListCreateView):
     queryset = EvaluationResults.objects.all()
@@ -406,51 +459,74 @@ class EvaluationResultsDetailView(BaseRetrieveUpdateDestroyView):
         serializer.save(updated_by=self.request.user)
 
 # ✅ ProcessingTask Views
-# class ProcessingTaskListCreateView(BaseListCreateView):
-#     queryset = ProcessingTask.objects.all()
-#     serializer_class = ProcessingTaskSerializer
-#     permission_classes = [permissions.IsAuthenticated]
+class ProcessingTaskListCreateView(BaseListCreateView):
+    queryset = ProcessingTask.objects.all()
+    serializer_class = ProcessingTaskSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-#     def get_queryset(self):
-#         queryset = super().get_queryset()
-        
-#         # Filter by project
-#         project_id = self.request.query_params.get('project_id')
-#         if project_id:
-#             queryset = queryset.filter(project__unique_id=project_id)
-            
-#         # Filter by status
-#         status_filter = self.request.query_params.get('status')
-#         if status_filter:
-#             queryset = queryset.filter(status=status_filter)
-            
-#         # Filter by task type
-#         task_type = self.request.query_params.get('task_type')
-#         if task_type:
-#             queryset = queryset.filter(task_type=task_type)
-            
-#         # Filter by audio ID
-#         audio_id = self.request.query_params.get('audio_id')
-#         if audio_id:
-#             queryset = queryset.filter(audio_id=audio_id)
-            
-#         return queryset.order_by('-created_at')
+    def get_queryset(self):
+        queryset = super().get_queryset()
 
-#     def perform_create(self, serializer):
-#         # Ensure a project is provided
-#         project_id = self.request.data.get('project')
-#         if not project_id:
-#             raise serializers.ValidationError({"project": "Project is required"})
-        
-#         serializer.save(created_by=self.request.user, updated_by=self.request.user)
+        # Filter by status
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+
+        # Filter by task type
+        task_type = self.request.query_params.get('task_type')
+        if task_type:
+            queryset = queryset.filter(task_type=task_type)
 
-# class ProcessingTaskDetailView(BaseRetrieveUpdateDestroyView):
-#     queryset = ProcessingTask.objects.all()
-#     serializer_class = ProcessingTaskSerializer
-#     permission_classes = [permissions.IsAuthenticated]
+        # Filter by audio ID
+        audio_id = self.request.query_params.get('audio_id')
+        if audio_id:
+            queryset = queryset.filter(audio_id=audio_id)
 
-#     def perform_update(self, serializer):
-#         serializer.save(updated_by=self.request.user)
+        return queryset
+
+class ProcessingTaskDetailView(BaseRetrieveUpdateDestroyView):
+    queryset = ProcessingTask.objects.all()
+    serializer_class = ProcessingTaskSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+# Bulk status reports from the GPU server: {"tasks": [{"task_id", "status", ...}]}
+class ProcessingTaskStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ProcessingTaskStatusSerializer(data=request.data.get('tasks'), many=True)
+        serializer.is_valid(raise_exception=True)
+        updated, unknown = apply_status_updates(
+            serializer.validated_data, getattr(request, 'project', None)
+        )
+        return Response(
+            {"updated": updated, "unknown": [str(task_id) for task_id in unknown]},
+            status=status.HTTP_200_OK,
+        )
+
+# Queue depth and time spent per stage, per project
+class ProcessingTaskStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            hours = float(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({"error": "hours must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        since = timezone.now() - timedelta(hours=hours)
+        # Scoped to the project header when present
+        projects = stage_timings(getattr(request, 'project', None), since)
+        names = dict(Project.objects.filter(pk__in=projects).values_list('pk', 'name'))
+        return Response(
+            {
+                "since": since,
+                "projects": [
+                    {"project_id": project_id, "name": names.get(project_id), "stages": stages}
+                    for project_id, stages in projects.items()
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
 
 # Audio Chunk Evaluation View
 class AudioChunkEvaluateView(BaseGenericAPIView):
@@ -524,6 +600,8 @@ class AudioChunkEvaluateView(BaseGenericAPIView):
 class EvaluationResultsSummaryView(BaseListAPIView):
     serializer_class = EvaluationResultsSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    # One row per chunk: page on the chunk id
+    keyset = ("audiofilechunk",)
 
     def get_queryset(self):
         queryset = EvaluationResultsSummarySerializer.get_queryset(project=getattr(self.request, 'project', None))
@@ -538,13 +616,20 @@ class EvaluationResultsSummaryView(BaseListAPIView):
         return queryset
 
 class EvaluationChunkCategoryView(BaseGenericAPIView):
+    """
+    Chunks still needing evaluation: ``not_evaluated`` and ``one_evaluation``
+    (flagged ``evaluated_by_user`` when the caller did that evaluation), a
+    page of each per request, in one query per category.
+
+    Each category pages on its own cursor, ``?not_evaluated_cursor=`` and
+    ``?one_evaluation_cursor=``, whose links are in ``next`` and
+    ``previous``.
+    """
     serializer_class = EvaluationChunkCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = AudioChunk.objects.all()  # Define the base queryset
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-        
         # Get the filtered queryset from the base class
         # This already handles the project filtering from request.project
         base_queryset = self.get_queryset()
@@ -558,112 +643,154 @@ class EvaluationChunkCategoryView(BaseGenericAPIView):
         chunks = base_queryset.annotate(
             evaluation_count=Subquery(evaluation_counts, output_field=IntegerField())
         )
+        # Only chunks with exactly 1 evaluation are listed (not 2), since
+        # 2 evaluations in total make a chunk eligible for transcription
+        categories = {
+            "not_evaluated": chunks.filter(evaluation_count__isnull=True).values(),
+            "one_evaluation": chunks.filter(evaluation_count=1)
+            .annotate(
+                evaluated_by_user=Exists(
+                    EvaluationResults.objects.filter(
+                        audiofilechunk=OuterRef('unique_id'), created_by=request.user
+                    )
+                )
+            )
+            .values(),
+        }
 
-        # Categorize and fetch full chunk details
-        not_evaluated_chunks = list(chunks.filter(evaluation_count__isnull=True).values())
-        one_evaluation_chunks = list(chunks.filter(evaluation_count=1).values())
-        # Modified to focus on chunks with exactly 1 evaluation (not 2)
-        # since we now need only 2 evaluations total for transcription
-
-        # Helper function to build full URL
-        def get_full_url(chunk):
-            chunk_obj = AudioChunk.objects.get(unique_id=chunk['unique_id'])
-            return request.build_absolute_uri(f"/shared/{chunk_obj.chunk_file}")
-
-        # Collect unique_ids for categorized chunks (excluding not_evaluated)
-        evaluated_chunk_ids = [chunk["unique_id"] for chunk in one_evaluation_chunks]
-
-        # Fetch evaluations done by the current user for those chunks
-        user_evaluations = EvaluationResults.objects.filter(
-            audiofilechunk__in=evaluated_chunk_ids, created_by=user
-        ).values_list("audiofilechunk", flat=True)
-
-        # Convert to a set for fast lookup
-        user_evaluated_set = set(user_evaluations)
-
-        # Append evaluated_by_user boolean to the required categories
-        for chunk in one_evaluation_chunks:
-            chunk["evaluated_by_user"] = chunk["unique_id"] in user_evaluated_set
-        
-        # Append full URL for chunk_file
-        for chunk in not_evaluated_chunks:
-            chunk['file_url'] = get_full_url(chunk)
-
-        for chunk in one_evaluation_chunks:
-            chunk['file_url'] = get_full_url(chunk)
+        response = {"next": {}, "previous": {}}
+        for category, queryset in categories.items():
+            paginator = KeysetPagination()
+            paginator.cursor_query_param = f"{category}_cursor"
+            page = paginator.paginate_queryset(queryset, request, self)
+            # URLs come from the row values: no lookup per chunk
+            for chunk in page:
+                chunk['file_url'] = build_chunk_url(request, chunk['unique_id'], chunk['chunk_file'])
+            response[category] = page
+            response["next"][category] = paginator.next
+            response["previous"][category] = paginator.previous
 
-        return Response({
-            "not_evaluated": not_evaluated_chunks,
-            "one_evaluation": one_evaluation_chunks,
-            # Removed "two_evaluations" category since we now only need 2 total evaluations
-            # for transcription eligibility, so we don't need a separate "two evaluations" bucket
-        })
+        return Response(response)
 
 # Chunks for Transcription View
 class ChunksForTranscriptionView(APIView):
+    """
+    Chunks ready for transcription: evaluated at least twice with no issue
+    flagged, in the order they became eligible (``eligible_at``: the latest
+    time one of their evaluations was written, since AudioChunkEvaluateView
+    updates evaluations in place).
+
+    One grouped query joins the chunks to their evaluations. ``?since=``
+    (ISO 8601) keeps only chunks that became eligible after it. The result
+    is paged with ``next``/``previous`` links, or streamed as NDJSON, one
+    chunk per line, for ``?stream=ndjson`` or ``Accept: application/x-ndjson``.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    keyset = ("eligible_at", "unique_id")
+    fields = (
+        "unique_id", "project", "chunk_file", "duration", "feature_text", "gender",
+        "locale", "source_file", "sample_rate", "start_sample", "num_samples",
+        "created_at", "updated_at",
+    )
 
     def get(self, request, *args, **kwargs):
-        # Get project_id from request if provided
+        # Get project_id from request if provided, else the project header
         project_id = request.query_params.get('project_id')
-        base_queryset = AudioChunk.objects.all()
-        
+        project = getattr(request, 'project', None)
         if project_id:
             try:
                 project = Project.objects.get(unique_id=project_id)
-                base_queryset = base_queryset.filter(project=project)
             except Project.DoesNotExist:
                 return Response({"error": f"Project with ID {project_id} not found"}, status=status.HTTP_404_NOT_FOUND)
-        
-        total_choices = 6  # Total number of boolean fields
 
-        # Subquery to count evaluations and calculate total boolean flags (true values)
-        evaluation_summary = (
-            EvaluationResults.objects.filter(audiofilechunk=OuterRef("unique_id"))
-            .values("audiofilechunk")
-            .annotate(
-                evaluation_count=Count("unique_id"),
-                # Sum of all boolean fields - used to determine if ANY issue was flagged
-                total_boolean_sum=Sum("not_clear", output_field=IntegerField())
-                + Sum("speaker_overlap", output_field=IntegerField())
-                + Sum("dual_speaker", output_field=IntegerField())
-                + Sum("interruptive_background_noise", output_field=IntegerField())
-                + Sum("silence", output_field=IntegerField())
-                + Sum("incomplete_word", output_field=IntegerField()),
+        since = request.query_params.get('since')
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                return Response({"error": "since must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        chunks = self.get_chunks(project, since)
+        rows = self.rows(request)
+        if (
+            request.query_params.get('stream') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', '')
+        ):
+            lines = (
+                json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+                for row in rows(chunks.order_by(*self.keyset).iterator(chunk_size=2000))
             )
-            .values("evaluation_count", "total_boolean_sum")
-        )
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
 
-        # Query chunks and annotate with evaluation count & total boolean sum
-        chunks = base_queryset.annotate(
-            evaluation_count=Subquery(evaluation_summary.values("evaluation_count")),
-            total_boolean_sum=Subquery(evaluation_summary.values("total_boolean_sum")),
-        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(chunks, request, self)
+        return Response({
+            "chunks_for_transcription": list(rows(page)),
+            "next": paginator.next,
+            "previous": paginator.previous,
+        })
 
-        # NEW LOGIC:
-        # 1. Chunks with evaluation_count ≥ 2 (instead of 3)
-        # 2. Chunks with total_boolean_sum = 0 (no issues flagged)
-        chunks_for_transcription = chunks.filter(
+    def get_chunks(self, project=None, since=None):
+        """Eligible chunks as ``.values()`` rows, aggregated over one join."""
+        chunks = AudioChunk.objects.all()
+        if project is not None:
+            chunks = chunks.filter(project=project)
+        chunks = chunks.annotate(
+            evaluation_count=Count("evaluation_results"),
+            # Sum of all boolean fields - used to determine if ANY issue was flagged
+            total_boolean_sum=Sum("evaluation_results__not_clear", output_field=IntegerField())
+            + Sum("evaluation_results__speaker_overlap", output_field=IntegerField())
+            + Sum("evaluation_results__dual_speaker", output_field=IntegerField())
+            + Sum("evaluation_results__interruptive_background_noise", output_field=IntegerField())
+            + Sum("evaluation_results__silence", output_field=IntegerField())
+            + Sum("evaluation_results__incomplete_word", output_field=IntegerField()),
+            eligible_at=Max("evaluation_results__updated_at"),
+        ).filter(
             evaluation_count__gte=2,  # Changed from 3 to 2
-            total_boolean_sum=0       # Only include chunks with no issues flagged
+            total_boolean_sum=0,  # Only include chunks with no issues flagged
+        )
+        if since:
+            chunks = chunks.filter(eligible_at__gt=since)
+        return chunks.values(
+            *self.fields,
+            "evaluation_count",
+            "eligible_at",
+            "created_by__whatsapp_number",
+            "updated_by__whatsapp_number",
         )
-        
-        # Helper function to get full URL
-        def get_full_url(chunk):
-            return request.build_absolute_uri(f"/shared/{chunk.chunk_file}")
-        
-        # Serialize chunks
-        resultingChunks = AudioChunkSerializer(
-            chunks_for_transcription, many=True
-        ).data
-        
-        # Append full URL for chunk_file
-        for chunk in resultingChunks:
-            chunk['file_url'] = get_full_url(AudioChunk.objects.get(unique_id=chunk['unique_id']))
 
-        return Response({
-            "chunks_for_transcription": resultingChunks
-        })
+    def rows(self, request):
+        """Turn query rows into API records, URLs built from two prefixes."""
+        media_url = settings.MEDIA_URL
+        shared_url = request.build_absolute_uri("/shared/")
+        # The virtual chunk URL with a placeholder for the chunk id
+        placeholder = uuid.UUID(int=0)
+        audio_url = request.build_absolute_uri(reverse("audiochunk-audio", args=[placeholder]))
+
+        def convert(chunks):
+            for chunk in chunks:
+                chunk["created_by"] = chunk.pop("created_by__whatsapp_number")
+                chunk["updated_by"] = chunk.pop("updated_by__whatsapp_number")
+                chunk_file = chunk["chunk_file"]
+                if chunk_file:
+                    chunk["chunk_file"] = f"{media_url}{chunk_file}"
+                    chunk["file_url"] = f"{shared_url}{chunk_file}"
+                else:
+                    chunk["chunk_file"] = None
+                    chunk["file_url"] = audio_url.replace(str(placeholder), str(chunk["unique_id"]))
+                yield chunk
+
+        return convert
+
+# GPU queue depth per stage
+class GpuQueueView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        # Scoped to the project header when present
+        project = getattr(request, 'project', None)
+        return Response({"stages": queue_depth(project)}, status=status.HTTP_200_OK)
 
 # Chunk Statistics View
 class ChunkStatisticsView(BaseGenericAPIView):
@@ -809,6 +936,7 @@ class AudioFilesBulkUploadView(BaseGenericAPIView):
             
             # Process all files
             results = []
+            uploaded = {}
             for audio_file in files:
                 filename = audio_file.name
                 
@@ -840,50 +968,26 @@ class AudioFilesBulkUploadView(BaseGenericAPIView):
                     })
                     continue
                 
-                # Generate a unique audio_id
+                # Generate a unique audio_id; a later file with the same name wins
                 audio_id = os.path.splitext(filename)[0]
-                
-                # Create or update AudioFile record
-                try:
-                    audio_file_obj, created = AudioFile.objects.get_or_create(
-                        audio_id=audio_id,
-                        project=project,  # Add project to filter criteria for get_or_create
-                        defaults={
-                            'audio_file': file_path,
-                            'file_size': file_size,
-                            'duration': duration,
-                            'is_processed': False,
-                            'created_by': request.user,
-                            'updated_by': request.user
-                        }
-                    )
-                    
-                    if not created:
-                        # Update existing record
-                        audio_file_obj.audio_file = file_path
-                        audio_file_obj.file_size = file_size
-                        audio_file_obj.duration = duration
-                        audio_file_obj.updated_by = request.user
-                        audio_file_obj.save()
-                    
-                    results.append({
-                        "filename": filename,
-                        "status": "success",
-                        "audio_id": audio_file_obj.audio_id,
-                        "id": str(audio_file_obj.unique_id),
-                        "duration": duration,
-                        "file_size": file_size,
-                        "file_path": audio_file_obj.full_path,
-                        "created": created
-                    })
-                    
-                except Exception as e:
-                    results.append({
-                        "filename": filename,
-                        "status": "error",
-                        "message": str(e)
-                    })
-            
+                uploaded[audio_id] = {
+                    "filename": filename,
+                    "file_path": file_path,
+                    "duration": duration,
+                    "file_size": file_size,
+                }
+
+            # Create or update all AudioFile records and queue their
+            # preprocessing in one transaction: the signal-per-save path
+            # would cost a few queries per file.
+            try:
+                results.extend(self.save_audio_files(project, uploaded, request.user))
+            except Exception as e:
+                results.extend(
+                    {"filename": item["filename"], "status": "error", "message": str(e)}
+                    for item in uploaded.values()
+                )
+
             # Return summary
             successful = len([r for r in results if r["status"] == "success"])
             failed = len([r for r in results if r["status"] == "error"])
@@ -905,27 +1009,74 @@ class AudioFilesBulkUploadView(BaseGenericAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def save_audio_files(self, project, uploaded, user):
+        """
+        Upsert the AudioFiles of one upload ({audio_id: metadata}) and queue
+        preprocessing for those not yet processed, with a constant number of
+        queries.
+        """
+        existing = {
+            audio_file.audio_id: audio_file
+            for audio_file in AudioFile.objects.filter(
+                project=project, audio_id__in=list(uploaded)
+            )
+        }
+        saved = {}
+        to_create = []
+        to_update = []
+        now = timezone.now()
+        for audio_id, item in uploaded.items():
+            audio_file = existing.get(audio_id)
+            if audio_file is None:
+                audio_file = AudioFile(
+                    project=project,
+                    audio_id=audio_id,
+                    is_processed=False,
+                    created_by=user,
+                )
+                to_create.append(audio_file)
+            else:
+                to_update.append(audio_file)
+            saved[audio_id] = audio_file
+            audio_file.audio_file = item["file_path"]
+            audio_file.file_size = item["file_size"]
+            audio_file.duration = item["duration"]
+            audio_file.updated_by = user
+            # bulk_update does not apply auto_now.
+            audio_file.updated_at = now
+
+        with transaction.atomic():
+            AudioFile.objects.bulk_create(to_create)
+            AudioFile.objects.bulk_update(
+                to_update,
+                ["audio_file", "file_size", "duration", "updated_by", "updated_at"],
+            )
+            # bulk_create/bulk_update send no post_save, so queue here.
+            enqueue_many(
+                ("preprocess", project.pk, audio_file.pk, preprocess_payload(audio_file))
+                for audio_file in to_create + to_update
+                if not audio_file.is_processed
+            )
+
+        return [
+            {
+                "filename": item["filename"],
+                "status": "success",
+                "audio_id": audio_id,
+                "id": str(saved[audio_id].unique_id),
+                "duration": item["duration"],
+                "file_size": item["file_size"],
+                "file_path": saved[audio_id].full_path,
+                "created": audio_id not in existing,
+            }
+            for audio_id, item in uploaded.items()
+        ]
+
     def get_audio_metadata(self, filepath):
-        """Extract metadata using ffprobe"""
+        """Extract duration from the audio header and the size from the filesystem"""
         try:
-            result = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration,size",
-                    "-of",
-                    "json",
-                    filepath,
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-            metadata = json.loads(result.stdout)
-            duration = float(metadata["format"]["duration"])
-            file_size = int(metadata["format"]["size"])
+            duration = probe_audio(filepath)["duration"]
+            file_size = os.path.getsize(filepath)
             return duration, file_size
         except Exception as e:
             logger.error(f"Error extracting metadata for {filepath}: {e}")